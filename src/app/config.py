@@ -1,4 +1,137 @@
-from os import environ as env
+from os import cpu_count, environ as env, path
 from tempfile import gettempdir
 
 TEMP_DIR = env.get('TEMP_DIR', gettempdir())
+# Каталог для входных файлов SIM, по умолчанию - tmpfs в оперативной памяти
+WORKSPACE_DIR = env.get(
+    'WORKSPACE_DIR',
+    '/dev/shm' if path.isdir('/dev/shm') else TEMP_DIR
+)
+
+# Максимальное число кандидатов, передаваемых в один запуск SIM
+SIM_SHARD_SIZE = int(env.get('SIM_SHARD_SIZE', 250))
+# Максимальное число кандидатов в одном запуске SIM при потоковой проверке
+# (/check/stream/): SIM выводит результаты только по завершении запуска,
+# поэтому проценты передаются клиенту по мере завершения небольших запусков
+SIM_STREAM_SHARD_SIZE = int(env.get('SIM_STREAM_SHARD_SIZE', 16))
+# Максимальное число одновременно выполняемых процессов SIM
+SIM_CONCURRENCY = int(env.get('SIM_CONCURRENCY', 4))
+# Время (в секундах), по истечении которого процесс SIM принудительно
+# завершается, а его кандидаты считаются непроверенными
+SIM_TIMEOUT = float(env.get('SIM_TIMEOUT', 20))
+
+# Каталог общего для всех воркеров хранилища входных файлов SIM,
+# адресуемых по содержимому. Пустое значение отключает хранилище.
+SIM_STORE_DIR = env.get('SIM_STORE_DIR', '')
+# Максимальный размер хранилища входных файлов SIM (в байтах)
+SIM_STORE_MAX_SIZE = int(env.get('SIM_STORE_MAX_SIZE', 256 * 1024 * 1024))
+
+# Максимальный размер (в байтах) кеша разобранных Python-программ
+PYCODE_AST_CACHE_SIZE = int(
+    env.get('PYCODE_AST_CACHE_SIZE', 64 * 1024 * 1024)
+)
+
+# Детекторы плагиата, используемые по умолчанию для C++ и Java: sim или gst
+CPP_ENGINE = env.get('CPP_ENGINE', 'sim')
+JAVA_ENGINE = env.get('JAVA_ENGINE', 'sim')
+# Детектор плагиата, используемый по умолчанию для Python: pycode или winnow
+PYTHON_ENGINE = env.get('PYTHON_ENGINE', 'pycode')
+# Минимальная длина (в токенах) совпадающего фрагмента для детектора gst
+GST_MIN_MATCH = int(env.get('GST_MIN_MATCH', 5))
+# Максимальный размер (в байтах) кеша токенов программ для детектора gst
+GST_TOKENS_CACHE_SIZE = int(
+    env.get('GST_TOKENS_CACHE_SIZE', 32 * 1024 * 1024)
+)
+# Длина k-граммы токенов и размер окна для детектора winnow
+WINNOW_K = int(env.get('WINNOW_K', 5))
+WINNOW_WINDOW = int(env.get('WINNOW_WINDOW', 4))
+# Максимальный размер (в байтах) кеша отпечатков Python-программ
+WINNOW_CACHE_SIZE = int(env.get('WINNOW_CACHE_SIZE', 64 * 1024 * 1024))
+# Максимальный размер (в байтах) кеша разобранных SQL-запросов
+SQL_QUERY_CACHE_SIZE = int(env.get('SQL_QUERY_CACHE_SIZE', 32 * 1024 * 1024))
+
+# Число процессов общего пула, в котором проверяются кандидаты
+# (pycode, winnow, gst, sqlplag). Значение меньше 2 отключает пул.
+POOL_SIZE = int(env.get('POOL_SIZE', cpu_count() or 1))
+# Минимальное число кандидатов, при котором используется пул процессов
+POOL_MIN_CANDIDATES = int(env.get('POOL_MIN_CANDIDATES', 64))
+# Число групп кандидатов на один процесс пула
+POOL_CHUNKS_PER_WORKER = int(env.get('POOL_CHUNKS_PER_WORKER', 4))
+# Запускать процессы пула при запуске приложения, если детекторы загружены
+# заранее (PRELOAD_ENGINES), а не при первой проверке
+POOL_WARM_UP = env.get('POOL_WARM_UP', '1') == '1'
+# Импортировать детекторы в главном процессе gunicorn до запуска воркеров
+# (gunicorn.conf.py), чтобы воркеры разделяли память модулей
+PRELOAD_ENGINES = env.get('PRELOAD_ENGINES', '0') == '1'
+
+# Предварительный отбор кандидатов по сходству n-грамм токенов:
+# точному детектору передаются PREFILTER_TOP_K наиболее похожих кандидатов
+# и все кандидаты со сходством не ниже PREFILTER_FLOOR. Отбор может пропустить
+# кандидата с наибольшим процентом, поэтому по умолчанию он отключен
+PREFILTER_ENABLED = env.get('PREFILTER_ENABLED', '0') == '1'
+PREFILTER_TOP_K = int(env.get('PREFILTER_TOP_K', 100))
+PREFILTER_FLOOR = float(env.get('PREFILTER_FLOOR', 0.2))
+# Длина n-граммы токенов
+PREFILTER_NGRAM = int(env.get('PREFILTER_NGRAM', 4))
+# Доля запросов, для которых проверяются все кандидаты,
+# чтобы оценить полноту предварительного отбора
+PREFILTER_AUDIT_RATE = float(env.get('PREFILTER_AUDIT_RATE', 0.01))
+
+# Попарная проверка решений (/pairs/): пары для точного детектора отбираются
+# по MinHash-подписям n-грамм токенов (LSH), подпись делится на PAIRS_LSH_BANDS
+# полос по PAIRS_LSH_ROWS значений. Пары с процентом плагиата не ниже
+# PAIRS_THRESHOLD возвращаются в ответе
+PAIRS_LSH_BANDS = int(env.get('PAIRS_LSH_BANDS', 20))
+PAIRS_LSH_ROWS = int(env.get('PAIRS_LSH_ROWS', 5))
+PAIRS_THRESHOLD = float(env.get('PAIRS_THRESHOLD', 0.8))
+
+# Минимальное число кандидатов, при котором проверка прекращается, как только
+# верхние оценки оставшихся кандидатов не превосходят лучший результат
+PRUNING_MIN_CANDIDATES = int(env.get('PRUNING_MIN_CANDIDATES', 16))
+# Число кандидатов в первой группе такой проверки
+PRUNING_BATCH_SIZE = int(env.get('PRUNING_BATCH_SIZE', 8))
+
+# Кандидат, совпадающий с эталоном после удаления комментариев и пробелов,
+# получает процент плагиата 1.0 без запуска детектора
+EXACT_MATCH_ENABLED = env.get('EXACT_MATCH_ENABLED', '1') == '1'
+# Сравнивать код с точностью до переименования идентификаторов
+EXACT_MATCH_RENAME_IDENTIFIERS = (
+    env.get('EXACT_MATCH_RENAME_IDENTIFIERS', '0') == '1'
+)
+
+# Максимальный размер (в байтах) кеша процентов плагиата пар
+# (эталон, кандидат). Значение 0 отключает кеш.
+SCORE_CACHE_SIZE = int(env.get('SCORE_CACHE_SIZE', 32 * 1024 * 1024))
+# Файл базы SQLite с процентами плагиата, общей для всех воркеров
+# и сохраняющейся между перезапусками. Пустое значение отключает базу.
+SCORE_STORE_PATH = env.get('SCORE_STORE_PATH', '')
+# Максимальное число записей в базе процентов плагиата
+SCORE_STORE_MAX_ENTRIES = int(env.get('SCORE_STORE_MAX_ENTRIES', 1_000_000))
+# Время хранения (в секундах) записи в базе процентов плагиата
+SCORE_STORE_TTL = float(env.get('SCORE_STORE_TTL', 30 * 24 * 60 * 60))
+
+# Одинаковые запросы, выполняемые одновременно, объединяются:
+# проверка выполняется один раз, а ее результат получают все запросы.
+# Между воркерами запросы объединяются через базу SCORE_STORE_PATH.
+SINGLE_FLIGHT_ENABLED = env.get('SINGLE_FLIGHT_ENABLED', '1') == '1'
+# Время (в секундах), после которого незавершенная проверка другого
+# воркера считается прерванной и выполняется заново
+SINGLE_FLIGHT_TIMEOUT = float(env.get('SINGLE_FLIGHT_TIMEOUT', 60))
+# Время (в секундах) хранения результата проверки для ожидающих воркеров
+SINGLE_FLIGHT_RESULT_TTL = float(env.get('SINGLE_FLIGHT_RESULT_TTL', 5))
+
+# Асинхронные проверки (/jobs/): файл базы SQLite с заданиями и их
+# результатами, общей для всех воркеров
+JOB_STORE_PATH = env.get(
+    'JOB_STORE_PATH',
+    path.join(TEMP_DIR, 'antiplag-jobs.sqlite3')
+)
+# Число потоков воркера, выполняющих задания
+JOB_WORKERS = int(env.get('JOB_WORKERS', 2))
+# Время хранения (в секундах) заданий и их результатов
+JOB_TTL = float(env.get('JOB_TTL', 24 * 60 * 60))
+# Время (в секундах), после которого задание, не обновлявшееся воркером
+# (например, воркер был перезапущен), считается завершенным с ошибкой
+JOB_TIMEOUT = float(env.get('JOB_TIMEOUT', 60 * 60))
+# Время ожидания (в секундах) ответа на запрос к callback_url задания
+JOB_CALLBACK_TIMEOUT = float(env.get('JOB_CALLBACK_TIMEOUT', 10))
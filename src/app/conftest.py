@@ -0,0 +1,10 @@
+import pytest
+
+from app.services.base import score_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_score_cache():
+    score_cache.clear()
+    yield
+    score_cache.clear()
@@ -1,25 +1,69 @@
+import gc
+import json
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.templating import Jinja2Templates
 
 from app.schema import (
+    BatchCheckRequest,
     CheckRequest,
     CheckResponse,
+    JobCheckRequest,
+    JobResponse,
+    PairsRequest,
+    PairsResponse,
     format_validation_errors,
 )
+from app.services import messages
 from app.services.exceptions import ServiceException
-from app.services.main import AntiplagService
+from app.services.enums import JobStatus
+from app.services.jobs import JobRunner
+from app.services.main import AntiplagService, create_registry
+from app.services.metrics import metrics
+from app.services.singleflight import check_flight, get_request_key
 
 APP_DIR = Path(__file__).parent
 templates = Jinja2Templates(directory=APP_DIR / 'templates')
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+
+    """ Детекторы реестра запускаются при запуске приложения
+    (в каждом воркере) и останавливаются при его завершении,
+    после асинхронных проверок. """
+
+    registry = app.state.registry
+    registry.startup()
+    yield
+    app.state.jobs.shutdown()
+    registry.shutdown()
+
+
+def preload(app: FastAPI):
+
+    """ Импортирует все детекторы и переносит созданные объекты
+    в постоянное поколение сборщика мусора. Вызывается в главном
+    процессе gunicorn до запуска воркеров: сборщик мусора воркеров
+    не обходит эти объекты и не копирует разделяемые с главным
+    процессом страницы памяти. """
+
+    app.state.registry.load_all()
+    gc.freeze()
+
+
 def create_app() -> FastAPI:
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
+    # Реестр создается один раз, детекторы загружаются при первой
+    # проверке на их языке или заранее (preload)
+    app.state.registry = create_registry()
+    metrics.register('engines', app.state.registry.get_stats)
+    app.state.jobs = JobRunner(registry=app.state.registry)
 
     static_dir = APP_DIR / 'static'
     if static_dir.is_dir():
@@ -59,10 +103,79 @@ def create_app() -> FastAPI:
         )
 
     @app.post('/check/', response_model=CheckResponse)
-    def check(body: CheckRequest) -> CheckResponse:
-        result = AntiplagService().check(data=body.to_check_input())
+    def check(body: CheckRequest, request: Request) -> CheckResponse:
+        data = body.to_check_input()
+        service = AntiplagService(registry=request.app.state.registry)
+        # Одинаковые одновременные запросы проверяются один раз
+        result = check_flight.do(
+            key=get_request_key(data),
+            func=lambda: service.check(data=data)
+        )
         return CheckResponse(**result)
 
+    @app.post('/check/stream/')
+    def check_stream(
+        body: CheckRequest,
+        request: Request
+    ) -> StreamingResponse:
+        data = body.to_check_input()
+        service = AntiplagService(registry=request.app.state.registry)
+        # Строка NDJSON отправляется, как только найден процент
+        # плагиата очередного кандидата
+        return StreamingResponse(
+            (
+                json.dumps(event, default=str) + '\n'
+                for event in service.check_stream(data=data)
+            ),
+            media_type='application/x-ndjson',
+        )
+
+    @app.post('/check/batch/', response_model=list[CheckResponse])
+    def check_batch(
+        body: BatchCheckRequest,
+        request: Request
+    ) -> list[CheckResponse]:
+        data = body.to_batch_check_input()
+        service = AntiplagService(registry=request.app.state.registry)
+        results = check_flight.do(
+            key=get_request_key(data),
+            func=lambda: service.check_batch(data=data)
+        )
+        return [CheckResponse(**result) for result in results]
+
+    @app.post('/pairs/', response_model=PairsResponse)
+    def check_pairs(body: PairsRequest, request: Request) -> PairsResponse:
+        data = body.to_pairs_input()
+        service = AntiplagService(registry=request.app.state.registry)
+        result = check_flight.do(
+            key=get_request_key(data),
+            func=lambda: service.check_pairs(data=data)
+        )
+        return PairsResponse(**result)
+
+    @app.post('/jobs/check/', status_code=202)
+    def create_check_job(body: JobCheckRequest, request: Request) -> dict:
+        # Проверка выполняется в фоновом потоке, ответ не ждет ее
+        job_id = request.app.state.jobs.submit(
+            data=body.to_check_input(),
+            callback_url=body.callback_url
+        )
+        return {'id': job_id, 'status': JobStatus.QUEUED}
+
+    @app.get('/jobs/{job_id}', response_model=JobResponse)
+    def get_job(job_id: str, request: Request):
+        job = request.app.state.jobs.get(job_id)
+        if job is None:
+            return JSONResponse(
+                status_code=404,
+                content={'error': messages.MSG_7, 'details': job_id},
+            )
+        return JobResponse(**job)
+
+    @app.get('/metrics/')
+    def get_metrics() -> dict:
+        return metrics.get_data()
+
     return app
 
 
@@ -1,8 +1,10 @@
+from urllib.parse import urlsplit
+
 from fastapi.exceptions import RequestValidationError
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
 
-from app.services.entities import CheckInput
-from app.services.enums import Lang
+from app.services.entities import BatchCheckInput, CheckInput, PairsInput
+from app.services.enums import Engine, Lang
 
 
 class CandidateModel(BaseModel):
@@ -10,10 +12,15 @@ class CandidateModel(BaseModel):
     code: str
 
 
-class CheckRequest(BaseModel):
+class PrefilterModel(BaseModel):
+    enabled: bool | None = None
+    top_k: int | None = Field(default=None, ge=1)
+    floor: float | None = Field(default=None, ge=0, le=1)
+
+
+class EngineRequest(BaseModel):
     lang: str
-    ref_code: str
-    candidates: list[CandidateModel]
+    engine: str | None = None
 
     @field_validator('lang')
     @classmethod
@@ -22,14 +29,65 @@ class CheckRequest(BaseModel):
             raise ValueError('Must be one of: cpp, java, python, sql.')
         return value
 
-    def to_check_input(self) -> CheckInput:
-        return CheckInput(
-            lang=self.lang,
-            ref_code=self.ref_code,
-            candidates=[
+    @field_validator('engine')
+    @classmethod
+    def validate_engine(
+        cls,
+        value: str | None,
+        info: ValidationInfo
+    ) -> str | None:
+        if value is None:
+            return value
+        if value not in Engine.VALUES:
+            raise ValueError(f'Must be one of: {", ".join(Engine.VALUES)}.')
+        lang = info.data.get('lang')
+        engines = Engine.BY_LANG.get(lang, ())
+        if lang is not None and value not in engines:
+            raise ValueError(
+                f'Not allowed for {lang}, must be one of: '
+                f'{", ".join(engines)}.'
+            )
+        return value
+
+
+class BaseCheckRequest(EngineRequest):
+    candidates: list[CandidateModel]
+    prefilter: PrefilterModel | None = None
+    threshold: float | None = Field(default=None, ge=0, le=1)
+
+    def get_options(self) -> dict:
+        options = {
+            'lang': self.lang,
+            'candidates': [
                 {'uuid': candidate.uuid, 'code': candidate.code}
                 for candidate in self.candidates
             ],
+        }
+        if self.engine is not None:
+            options['engine'] = self.engine
+        if self.threshold is not None:
+            options['threshold'] = self.threshold
+        if self.prefilter is not None:
+            options['prefilter'] = self.prefilter.model_dump(
+                exclude_none=True
+            )
+        return options
+
+
+class CheckRequest(BaseCheckRequest):
+    ref_code: str
+
+    def to_check_input(self) -> CheckInput:
+        return CheckInput(ref_code=self.ref_code, **self.get_options())
+
+
+class BatchCheckRequest(BaseCheckRequest):
+    ref_codes: list[str] = Field(min_length=1)
+
+    def to_batch_check_input(self) -> BatchCheckInput:
+        return BatchCheckInput(
+            ref_codes=self.ref_codes,
+            **self.get_options()
         )
 
 
@@ -38,6 +96,61 @@ class CheckResponse(BaseModel):
     percent: float
 
 
+class JobCheckRequest(CheckRequest):
+    callback_url: str | None = None
+
+    @field_validator('callback_url')
+    @classmethod
+    def validate_callback_url(cls, value: str | None) -> str | None:
+        if value is not None and urlsplit(value).scheme not in (
+            'http',
+            'https',
+        ):
+            raise ValueError('Must be an http or https URL.')
+        return value
+
+
+class PairsRequest(EngineRequest):
+    submissions: list[CandidateModel]
+    threshold: float | None = Field(default=None, ge=0, le=1)
+
+    @field_validator('submissions')
+    @classmethod
+    def validate_submissions(
+        cls,
+        value: list[CandidateModel]
+    ) -> list[CandidateModel]:
+        uuids = [submission.uuid for submission in value]
+        if len(set(uuids)) < len(uuids):
+            raise ValueError('Uuids must be unique.')
+        return value
+
+    def to_pairs_input(self) -> PairsInput:
+        pairs_input = PairsInput(
+            lang=self.lang,
+            submissions=[
+                {'uuid': submission.uuid, 'code': submission.code}
+                for submission in self.submissions
+            ],
+        )
+        if self.engine is not None:
+            pairs_input['engine'] = self.engine
+        if self.threshold is not None:
+            pairs_input['threshold'] = self.threshold
+        return pairs_input
+
+
+class EdgeModel(BaseModel):
+    first: str
+    second: str
+    percent: float
+
+
+class PairsResponse(BaseModel):
+    edges: list[EdgeModel]
+    clusters: list[list[str]]
+
+
 class BadRequestResponse(BaseModel):
     error: str
     details: dict[str, list[str]]
@@ -48,6 +161,16 @@ class ServiceErrorResponse(BaseModel):
     details: str | None
 
 
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    progress: float
+    result: CheckResponse | None = None
+    error: ServiceErrorResponse | None = None
+    created: float
+    updated: float
+
+
 def format_validation_errors(exc: RequestValidationError) -> dict[str, list[str]]:
     details: dict[str, list[str]] = {}
     for error in exc.errors():
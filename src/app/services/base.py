@@ -1,18 +1,259 @@
+import heapq
+import multiprocessing
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple, Type
 
+from app.config import (
+    POOL_CHUNKS_PER_WORKER,
+    POOL_MIN_CANDIDATES,
+    POOL_SIZE,
+    POOL_WARM_UP,
+    PRUNING_BATCH_SIZE,
+    PRUNING_MIN_CANDIDATES,
+    SCORE_CACHE_SIZE,
+)
+from app.services.cache import LRUCache, get_hash
+from app.services.progress import report_progress
+from app.services.store import get_score_store
 from app.services.entities import (
+    Candidate,
     CheckInput,
     CheckResult
 )
 from app.services import exceptions
 
+# Размер одной записи кеша процентов плагиата в байтах (оценка):
+# ключ из пяти строк, в том числе двух хешей sha256, и значение
+SCORE_ENTRY_SIZE = 512
+
+score_cache = LRUCache(name='scores', max_size=SCORE_CACHE_SIZE)
+
+ScoreKey = Tuple[str, str, str, str, str]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+
+    """ Возвращает общий для всех детекторов пул процессов. Пул создается
+    при первом обращении и живет до завершения воркера, поэтому процессы
+    и их кеши переиспользуются между запросами. """
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=POOL_SIZE,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def reset_process_pool(wait: bool = False):
+
+    """ Останавливает общий пул процессов. Следующее обращение
+    к get_process_pool создаст новый пул. Если wait, то уже начатые
+    и ожидающие проверки выполняются до конца, иначе ожидающие
+    проверки отменяются. """
+
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=not wait)
+
+
+def _warm_up_worker():
+
+    """ Импортирует все детекторы в процессе пула. """
+
+    from app.services.main import create_registry
+    create_registry().load_all()
+
+
+def warm_up_process_pool():
+
+    """ Запускает процессы общего пула и импортирует в них детекторы,
+    чтобы первая проверка в пуле не ждала их запуска. Пул запускается
+    только один раз. Отключается при POOL_WARM_UP = False. """
+
+    if not POOL_WARM_UP or POOL_SIZE < 2 or _pool is not None:
+        return
+    pool = get_process_pool()
+    wait([pool.submit(_warm_up_worker) for _ in range(POOL_SIZE)])
+
+
+def _check_chunk(
+    service_cls: Type['AntiplagPoolService'],
+    data: CheckInput,
+    context: Dict[str, Any]
+) -> Dict[str, float]:
+    return service_cls()._check_candidates(data, **context)
+
 
 class AntiplagBaseService(ABC):
 
+    # Имя и версия детектора входят в ключ кеша процентов плагиата.
+    # Версию нужно менять при любом изменении способа вычисления процента
+    engine: str = ''
+    version: str = ''
+
     @abstractmethod
     def check_plagiarism(self, data: CheckInput) -> CheckResult:
         pass
 
+    def check_plagiarism_many(
+        self,
+        data_list: List[CheckInput]
+    ) -> List[CheckResult]:
+
+        """ Проверяет несколько эталонов с общими кандидатами
+        и возвращает результаты в том же порядке. Детекторы кешируют
+        разобранный код кандидатов (токены, AST, запросы SQL), поэтому
+        кандидаты разбираются один раз для всех эталонов. Детекторы,
+        которым этого недостаточно, переопределяют этот метод. """
+
+        return [self.check_plagiarism(data) for data in data_list]
+
+    def startup(self):
+
+        """ Вызывается при запуске приложения. """
+
+    def shutdown(self):
+
+        """ Вызывается при завершении приложения. """
+
+    def _is_threshold_reached(self, data: CheckInput, percent: float) -> bool:
+
+        """ Проверяет, достиг ли процент плагиата порога из запроса.
+        После этого остальных кандидатов можно не проверять. """
+
+        threshold = data.get('threshold')
+        return threshold is not None and percent >= threshold
+
+    def get_version(self, lang: str) -> str:
+
+        """ Возвращает версию детектора для языка lang. """
+
+        return self.version
+
+    def _get_score_keys(self, data: CheckInput) -> Dict[str, ScoreKey]:
+
+        """ Возвращает ключи кеша процентов плагиата для каждого uuid:
+        язык, детектор, его версия, sha256 эталона и кандидата. """
+
+        lang: str = data['lang']
+        prefix = (
+            lang,
+            self.engine,
+            self.get_version(lang),
+            get_hash(data['ref_code'])
+        )
+        return {
+            candidate['uuid']: (*prefix, get_hash(candidate['code']))
+            for candidate in data['candidates']
+        }
+
+    def _get_cached_scores(
+        self,
+        data: CheckInput,
+        keys: Dict[str, ScoreKey]
+    ) -> Tuple[Dict[str, float], CheckInput]:
+
+        """ Возвращает найденные в кеше проценты плагиата и данные
+        запроса с кандидатами, которых в кеше нет. Если включена
+        общая база процентов, кандидаты, не найденные в кеше воркера,
+        ищутся в ней одним запросом. """
+
+        cached = {}
+        missing = []
+        for candidate in data['candidates']:
+            percent = score_cache.get(keys[candidate['uuid']])
+            if percent is None:
+                missing.append(candidate)
+            else:
+                cached[candidate['uuid']] = percent
+
+        store = get_score_store()
+        if store is not None and missing:
+            store_keys = {
+                candidate['uuid']: get_hash(*keys[candidate['uuid']])
+                for candidate in missing
+            }
+            stored = store.get_many(set(store_keys.values()))
+            still_missing = []
+            for candidate in missing:
+                percent = stored.get(store_keys[candidate['uuid']])
+                if percent is None:
+                    still_missing.append(candidate)
+                    continue
+                cached[candidate['uuid']] = percent
+                score_cache.set(
+                    keys[candidate['uuid']],
+                    percent,
+                    size=SCORE_ENTRY_SIZE
+                )
+            missing = still_missing
+        report_progress(scores=cached)
+        return cached, {**data, 'candidates': missing}
+
+    def _set_cached_scores(
+        self,
+        scores: Dict[str, float],
+        keys: Dict[str, ScoreKey]
+    ):
+        for uuid, percent in scores.items():
+            score_cache.set(keys[uuid], percent, size=SCORE_ENTRY_SIZE)
+        store = get_score_store()
+        if store is not None:
+            store.set_many({
+                get_hash(*keys[uuid]): percent
+                for uuid, percent in scores.items()
+            })
+
+    def _get_ordered_scores(
+        self,
+        data: CheckInput,
+        scores: Dict[str, float]
+    ) -> Dict[str, float]:
+
+        """ Упорядочивает проценты плагиата так же, как кандидатов
+        в запросе. Непроверенные кандидаты пропускаются. """
+
+        return {
+            candidate['uuid']: scores[candidate['uuid']]
+            for candidate in data['candidates']
+            if candidate['uuid'] in scores
+        }
+
+    def get_scores_many(
+        self,
+        data_list: List[CheckInput]
+    ) -> List[Dict[str, float]]:
+
+        """ Возвращает для каждого эталона проценты плагиата всех его
+        кандидатов (в порядке следования кандидатов). Порог из запроса
+        не учитывается. Каждый кандидат проверяется отдельным вызовом
+        check_plagiarism, поэтому детекторы переопределяют этот метод. """
+
+        results = []
+        for data in data_list:
+            options = {
+                key: value for key, value in data.items()
+                if key != 'threshold'
+            }
+            results.append({
+                candidate['uuid']: self.check_plagiarism(
+                    {**options, 'candidates': [candidate]}
+                )['percent']
+                for candidate in data['candidates']
+            })
+        return results
+
     def _get_candidate_with_max_plag(self, plag_dict: dict) -> CheckResult:
 
         """ Возвращает кандидата с максимальным процентом заимствований. """
@@ -28,3 +269,328 @@ class AntiplagBaseService(ABC):
                 uuid=uuid,
                 percent=max_value
             )
+
+
+class AntiplagPoolService(AntiplagBaseService):
+
+    """ Базовый класс детекторов, которые проверяют кандидатов
+    по одному в текущем процессе (_check_candidates). Такие детекторы
+    проверяют кандидатов в общем пуле процессов (_execute), отсекают
+    кандидатов по верхней оценке (_execute_bounded) и проверяют
+    несколько эталонов параллельно (get_scores_many). """
+
+    @abstractmethod
+    def _check_candidates(
+        self,
+        data: CheckInput,
+        **context: Any
+    ) -> Dict[str, float]:
+
+        """ Последовательно проверяет кандидатов из data и возвращает
+        процент плагиата для каждого uuid. Проверка прекращается, как
+        только достигнут порог из запроса (_is_threshold_reached).
+        В context передаются уже вычисленные данные об эталоне. """
+
+    def _get_upper_bounds(
+        self,
+        data: CheckInput,
+        **context: Any
+    ) -> Optional[List[float]]:
+
+        """ Возвращает для каждого кандидата из data верхнюю оценку
+        процента плагиата, которая вычисляется значительно быстрее
+        точного значения, или None, если детектор не умеет ее вычислять.
+        Оценка не должна быть меньше результата _check_candidates. """
+
+        return None
+
+    def _get_candidate_cost(self, candidate: Candidate) -> int:
+
+        """ Оценивает трудоемкость проверки кандидата. """
+
+        return len(candidate['code'])
+
+    def _get_chunks(
+        self,
+        candidates: List[Candidate],
+        chunks_count: int
+    ) -> List[List[Candidate]]:
+
+        """ Распределяет кандидатов по группам примерно равной
+        трудоемкости: самые трудоемкие кандидаты распределяются первыми,
+        каждый - в наименее загруженную группу. Группы возвращаются
+        в порядке убывания трудоемкости. """
+
+        heap = [(0, index, []) for index in range(chunks_count)]
+        for candidate in sorted(
+            candidates,
+            key=self._get_candidate_cost,
+            reverse=True
+        ):
+            cost, index, chunk = heapq.heappop(heap)
+            chunk.append(candidate)
+            heapq.heappush(
+                heap,
+                (cost + self._get_candidate_cost(candidate), index, chunk)
+            )
+        return [chunk for _, _, chunk in sorted(heap, reverse=True) if chunk]
+
+    def _execute(
+        self,
+        data: CheckInput,
+        **context: Any
+    ) -> Dict[str, float]:
+
+        """ Проверяет кандидатов и возвращает процент плагиата для
+        каждого uuid (в порядке следования кандидатов). Проценты,
+        найденные в кеше, не вычисляются повторно, а вычисленные
+        проценты сохраняются в кеш. """
+
+        keys = self._get_score_keys(data)
+        scores, missing_data = self._get_cached_scores(data, keys)
+        if missing_data['candidates'] and not any(
+            self._is_threshold_reached(data, percent)
+            for percent in scores.values()
+        ):
+            computed = self._execute_parallel(missing_data, **context)
+            self._set_cached_scores(computed, keys)
+            scores.update(computed)
+        return self._get_ordered_scores(data, scores)
+
+    def _execute_parallel(
+        self,
+        data: CheckInput,
+        **context: Any
+    ) -> Dict[str, float]:
+
+        """ Проверяет кандидатов без обращения к кешу.
+
+        Если кандидатов не меньше POOL_MIN_CANDIDATES, они разбиваются
+        на группы, которые проверяются параллельно в общем пуле процессов.
+        Небольшие списки, а также все списки при POOL_SIZE < 2
+        проверяются в текущем процессе. Аргументы context передаются
+        в _check_candidates и должны сериализоваться pickle.
+
+        Если в запросе задан порог (threshold), то после получения
+        результата группы, в которой он достигнут, остальные группы
+        отменяются, а результат содержит только проверенных кандидатов. """
+
+        candidates: List[Candidate] = data['candidates']
+        report_progress(total=len(candidates))
+        if POOL_SIZE < 2 or len(candidates) < POOL_MIN_CANDIDATES:
+            return self._check_candidates(data, **context)
+
+        chunks = self._get_chunks(
+            candidates=candidates,
+            chunks_count=min(
+                len(candidates),
+                POOL_SIZE * max(POOL_CHUNKS_PER_WORKER, 1)
+            )
+        )
+        try:
+            pool = get_process_pool()
+            futures = {
+                pool.submit(
+                    _check_chunk,
+                    type(self),
+                    {**data, 'candidates': chunk},
+                    context
+                ): chunk
+                for chunk in chunks
+            }
+            plag_percent_by_uuids = {}
+            for future in as_completed(futures):
+                chunk_result = future.result()
+                plag_percent_by_uuids.update(chunk_result)
+                report_progress(
+                    done=len(futures[future]),
+                    scores=chunk_result
+                )
+                if any(
+                    self._is_threshold_reached(data, percent)
+                    for percent in chunk_result.values()
+                ):
+                    # Порог достигнут: еще не начатые группы отменяются
+                    for other_future in futures:
+                        other_future.cancel()
+                    break
+        except BrokenProcessPool:
+            # Процесс пула аварийно завершился:
+            # пул пересоздается при следующей проверке
+            reset_process_pool()
+            return self._check_candidates(data, **context)
+        return self._get_ordered_scores(data, plag_percent_by_uuids)
+
+    def _execute_bounded(
+        self,
+        data: CheckInput,
+        **context: Any
+    ) -> Dict[str, float]:
+
+        """ Проверяет кандидатов, пропуская тех, кто заведомо не может
+        превзойти лучший уже найденный процент плагиата (метод ветвей
+        и границ). Результат содержит только проверенных кандидатов,
+        но наибольший процент в нем тот же, что и при полной проверке.
+
+        Кандидаты проверяются в порядке убывания верхней оценки группами
+        (первая - PRUNING_BATCH_SIZE кандидатов, каждая следующая вдвое
+        больше), пока оценка очередного кандидата не меньше лучшего
+        результата или пока не достигнут порог из запроса. Из равных
+        результатов выбирается первый по порядку кандидат, поэтому
+        кандидат с оценкой, равной лучшему результату, проверяется,
+        только если он стоит в запросе раньше лучшего. Списки короче
+        PRUNING_MIN_CANDIDATES и детекторы без верхней оценки
+        проверяются без отсечения. Кеш процентов используется так же,
+        как в _execute: найденные в нем проценты учитываются в лучшем
+        результате до начала проверки. """
+
+        keys = self._get_score_keys(data)
+        plag_percent_by_uuids, missing_data = self._get_cached_scores(
+            data,
+            keys
+        )
+        best = max(plag_percent_by_uuids.values(), default=None)
+        candidates: List[Candidate] = missing_data['candidates']
+        if not candidates or (
+            best is not None and self._is_threshold_reached(data, best)
+        ):
+            return self._get_ordered_scores(data, plag_percent_by_uuids)
+
+        bounds = None
+        if len(candidates) >= PRUNING_MIN_CANDIDATES:
+            bounds = self._get_upper_bounds(missing_data, **context)
+        if bounds is None:
+            computed = self._execute_parallel(missing_data, **context)
+            self._set_cached_scores(computed, keys)
+            plag_percent_by_uuids.update(computed)
+            return self._get_ordered_scores(data, plag_percent_by_uuids)
+
+        # Положение кандидатов в запросе, по которому выбирается
+        # лучший из кандидатов с равными процентами
+        positions = {
+            candidate['uuid']: index
+            for index, candidate in enumerate(data['candidates'])
+        }
+
+        def get_best_position() -> int:
+            return min(
+                positions[uuid]
+                for uuid, percent in plag_percent_by_uuids.items()
+                if percent == best
+            )
+
+        def can_win(index: int) -> bool:
+            if best is None or bounds[index] > best:
+                return True
+            return (
+                bounds[index] == best
+                and positions[candidates[index]['uuid']] < best_position
+            )
+
+        best_position = get_best_position() if best is not None else 0
+        order = sorted(
+            range(len(candidates)),
+            key=bounds.__getitem__,
+            reverse=True
+        )
+        position = 0
+        batch_size = max(PRUNING_BATCH_SIZE, 1)
+        while position < len(order):
+            if best is not None and bounds[order[position]] < best:
+                break
+            batch = [
+                candidates[index]
+                for index in order[position:position + batch_size]
+                if can_win(index)
+            ]
+            position += batch_size
+            batch_size *= 2
+            if not batch:
+                continue
+            computed = self._execute_parallel(
+                {**data, 'candidates': batch},
+                **context
+            )
+            self._set_cached_scores(computed, keys)
+            plag_percent_by_uuids.update(computed)
+            if plag_percent_by_uuids:
+                best = max(plag_percent_by_uuids.values())
+                best_position = get_best_position()
+                if self._is_threshold_reached(data, best):
+                    break
+        return self._get_ordered_scores(data, plag_percent_by_uuids)
+
+    def _get_context(self, data: CheckInput) -> Dict[str, Any]:
+
+        """ Возвращает данные об эталоне, передаваемые
+        в _check_candidates при вызове из get_scores_many. """
+
+        return {}
+
+    def get_scores_many(
+        self,
+        data_list: List[CheckInput]
+    ) -> List[Dict[str, float]]:
+
+        """ Возвращает для каждого эталона проценты плагиата всех его
+        кандидатов (в порядке следования кандидатов). Порог из запроса
+        не учитывается.
+
+        Эталоны обычно имеют немного кандидатов, поэтому в общем пуле
+        процессов параллельно проверяются разные эталоны, если
+        непроверенных кандидатов всего не меньше POOL_MIN_CANDIDATES.
+        Кеш процентов используется так же, как в _execute. """
+
+        data_list = [
+            {key: value for key, value in data.items() if key != 'threshold'}
+            for data in data_list
+        ]
+        results = []
+        pending = {}
+        for index, data in enumerate(data_list):
+            keys = self._get_score_keys(data)
+            scores, missing_data = self._get_cached_scores(data, keys)
+            results.append(scores)
+            if missing_data['candidates']:
+                pending[index] = (missing_data, keys, scores)
+
+        def add_scores(index: int, computed: Dict[str, float]):
+            _, keys, scores = pending.pop(index)
+            self._set_cached_scores(computed, keys)
+            scores.update(computed)
+
+        missing_count = sum(
+            len(missing_data['candidates'])
+            for missing_data, _, _ in pending.values()
+        )
+        if POOL_SIZE >= 2 and missing_count >= POOL_MIN_CANDIDATES:
+            try:
+                pool = get_process_pool()
+                futures = {
+                    pool.submit(
+                        _check_chunk,
+                        type(self),
+                        missing_data,
+                        self._get_context(missing_data)
+                    ): index
+                    for index, (missing_data, _, _) in pending.items()
+                }
+                for future in as_completed(futures):
+                    add_scores(futures[future], future.result())
+            except BrokenProcessPool:
+                # Процесс пула аварийно завершился: оставшиеся
+                # эталоны проверяются в текущем процессе
+                reset_process_pool()
+        for index, (missing_data, _, _) in list(pending.items()):
+            add_scores(
+                index,
+                self._check_candidates(
+                    missing_data,
+                    **self._get_context(missing_data)
+                )
+            )
+
+        return [
+            self._get_ordered_scores(data, scores)
+            for data, scores in zip(data_list, results)
+        ]
@@ -0,0 +1,88 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from app.services.metrics import metrics
+
+
+def get_hash(*parts: str) -> str:
+
+    """ Возвращает sha256 от частей строки,
+    разделенных нулевым символом. """
+
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+class LRUCache:
+
+    """ Потокобезопасный кеш, ограниченный суммарным размером записей
+    (в байтах). При превышении размера вытесняются записи, к которым
+    дольше всего не обращались. Счетчики попаданий, промахов и
+    вытеснений доступны в метриках сервиса под именем cache.<name>. """
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int,
+        get_size: Callable[[Any], int] = sys.getsizeof
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.get_size = get_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        metrics.register(f'cache.{name}', self.get_stats)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value, _ = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, size: Optional[int] = None):
+        if size is None:
+            size = self.get_size(value)
+        if size > self.max_size:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._data[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'size': self.size,
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / requests if requests else 0,
+            }
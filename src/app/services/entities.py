@@ -1,5 +1,7 @@
 from typing import (
+    Any,
     List,
+    NotRequired,
     Optional,
     TypedDict,
 )
@@ -13,6 +15,15 @@ class Candidate(TypedDict):
     code: str
 
 
+class PrefilterOptions(TypedDict):
+
+    """ Параметры предварительного отбора кандидатов """
+
+    enabled: NotRequired[bool]
+    top_k: NotRequired[int]
+    floor: NotRequired[float]
+
+
 class CheckInput(TypedDict):
 
     """ Описывает формат запрашиваемых данных """
@@ -20,6 +31,22 @@ class CheckInput(TypedDict):
     lang: str
     ref_code: str
     candidates: List[Candidate]
+    engine: NotRequired[str]
+    prefilter: NotRequired[PrefilterOptions]
+    threshold: NotRequired[float]
+
+
+class BatchCheckInput(TypedDict):
+
+    """ Описывает формат данных для проверки нескольких эталонов
+    с общим списком кандидатов """
+
+    lang: str
+    ref_codes: List[str]
+    candidates: List[Candidate]
+    engine: NotRequired[str]
+    prefilter: NotRequired[PrefilterOptions]
+    threshold: NotRequired[float]
 
 
 class CheckResult(TypedDict):
@@ -28,3 +55,42 @@ class CheckResult(TypedDict):
 
     uuid: Optional[str]
     percent: float
+
+
+class CheckEvent(TypedDict):
+
+    """ Описывает событие потоковой проверки: процент плагиата
+    кандидата (score), результат (result) или ошибку (error) """
+
+    type: str
+    uuid: NotRequired[Optional[str]]
+    percent: NotRequired[float]
+    error: NotRequired[str]
+    details: NotRequired[Any]
+
+
+class PairsInput(TypedDict):
+
+    """ Описывает формат данных для попарной проверки решений """
+
+    lang: str
+    submissions: List[Candidate]
+    engine: NotRequired[str]
+    threshold: NotRequired[float]
+
+
+class Edge(TypedDict):
+
+    """ Описывает пару похожих решений """
+
+    first: str
+    second: str
+    percent: float
+
+
+class PairsResult(TypedDict):
+
+    """ Описывает формат результата попарной проверки решений """
+
+    edges: List[Edge]
+    clusters: List[List[str]]
@@ -1,19 +1,61 @@
-
-
-class Lang:
-
-    """ Содержит языковые константы. """
-
-    CPP = 'cpp'
-    PYTHON = 'python'
-    JAVA = 'java'
-    SQL = 'sql'
-
-    CHOICES = (
-        (CPP, CPP),
-        (PYTHON, PYTHON),
-        (JAVA, JAVA),
-        (SQL, SQL)
-    )
-
-    VALUES = (CPP, JAVA, PYTHON, SQL)
+
+
+class Lang:
+
+    """ Содержит языковые константы. """
+
+    CPP = 'cpp'
+    PYTHON = 'python'
+    JAVA = 'java'
+    SQL = 'sql'
+
+    CHOICES = (
+        (CPP, CPP),
+        (PYTHON, PYTHON),
+        (JAVA, JAVA),
+        (SQL, SQL)
+    )
+
+    VALUES = (CPP, JAVA, PYTHON, SQL)
+
+
+class Engine:
+
+    """ Содержит константы детекторов плагиата. """
+
+    SIM = 'sim'
+    GST = 'gst'
+    PYCODE = 'pycode'
+    WINNOW = 'winnow'
+    SQLPLAG = 'sqlplag'
+
+    VALUES = (SIM, GST, PYCODE, WINNOW, SQLPLAG)
+
+    # Детекторы, поддерживающие каждый из языков
+    BY_LANG = {
+        Lang.CPP: (SIM, GST),
+        Lang.JAVA: (SIM, GST),
+        Lang.PYTHON: (PYCODE, WINNOW),
+        Lang.SQL: (SQLPLAG,),
+    }
+
+
+class JobStatus:
+
+    """ Содержит константы состояний асинхронных проверок. """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    VALUES = (QUEUED, RUNNING, DONE, FAILED)
+
+
+class CheckEventType:
+
+    """ Содержит константы типов событий потоковой проверки. """
+
+    SCORE = 'score'
+    RESULT = 'result'
+    ERROR = 'error'
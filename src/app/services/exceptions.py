@@ -34,3 +34,13 @@ class ParsingOutputException(ServiceException):
 class UnsupportedQueryException(ServiceException):
 
     default_message = messages.MSG_5
+
+
+class EngineException(ServiceException):
+
+    default_message = messages.MSG_6
+
+
+class TimeoutException(ServiceException):
+
+    default_message = messages.MSG_10
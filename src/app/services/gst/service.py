@@ -0,0 +1,123 @@
+import sys
+from collections import Counter
+from typing import Dict, List
+
+from app.config import GST_MIN_MATCH, GST_TOKENS_CACHE_SIZE
+from app.services.cache import LRUCache, get_hash
+from app.services.enums import Engine
+from app.services.entities import (
+    Candidate,
+    CheckInput,
+    CheckResult
+)
+from app.services.base import AntiplagPoolService
+from app.services.progress import report_progress
+from app.services.gst.tiling import greedy_string_tiling
+from app.services.gst.tokenizer import get_token_ids
+
+
+def get_tokens_size(tokens: List[int]) -> int:
+    return sys.getsizeof(tokens) + 28 * len(tokens)
+
+
+tokens_cache = LRUCache(
+    name='gst_tokens',
+    max_size=GST_TOKENS_CACHE_SIZE,
+    get_size=get_tokens_size
+)
+
+
+class GstService(AntiplagPoolService):
+
+    """ Детектор плагиата для C++ и Java, работающий внутри процесса,
+    без запуска внешнего детектора SIM. """
+
+    engine = Engine.GST
+    version = f'1:{GST_MIN_MATCH}'
+
+    def _get_tokens(self, code: str, lang: str) -> List[int]:
+
+        """ Возвращает идентификаторы токенов программы. Токены
+        кешируются по хешу исходного кода, поэтому код, встречающийся
+        в разных запросах или у разных эталонов, разбирается один раз.
+        Идентификаторы токенов общие только в пределах процесса,
+        поэтому и кеш у каждого процесса свой. """
+
+        key = get_hash(lang, code)
+        tokens = tokens_cache.get(key)
+        if tokens is None:
+            tokens = get_token_ids(code=code, lang=lang)
+            tokens_cache.set(key, tokens)
+        return tokens
+
+    def _get_percent_from_tokens(
+        self,
+        reference_tokens: List[int],
+        candidate_tokens: List[int]
+    ) -> float:
+
+        """ Возвращает долю токенов, покрытых общими фрагментами, от
+        длины меньшего из файлов. Как и в SIM, из двух направлений
+        сравнения берется наибольший процент, а значение
+        округляется до целого числа процентов. """
+
+        shortest = min(len(reference_tokens), len(candidate_tokens))
+        if not shortest:
+            return 0
+        tiled = greedy_string_tiling(
+            pattern_tokens=reference_tokens,
+            text_tokens=candidate_tokens,
+            min_match=GST_MIN_MATCH
+        )
+        return int(tiled * 100 / shortest)/100
+
+    def check_plagiarism(self, data: CheckInput) -> CheckResult:
+
+        """ Проверка на плагиат исходного кода задач на языках C++ и Java
+        жадным покрытием строк токенов (Greedy String Tiling). """
+
+        return self._get_candidate_with_max_plag(self._execute_bounded(data))
+
+    def _get_upper_bounds(self, data: CheckInput) -> List[float]:
+
+        """ Каждая плитка покрывает одинаковые токены обоих файлов,
+        поэтому число покрытых токенов не превосходит размера
+        пересечения мультимножеств токенов. """
+
+        lang: str = data['lang']
+        reference_tokens = self._get_tokens(code=data['ref_code'], lang=lang)
+        reference_counts = Counter(reference_tokens)
+        bounds = []
+        for candidate in data['candidates']:
+            candidate_tokens = self._get_tokens(
+                code=candidate['code'],
+                lang=lang
+            )
+            shortest = min(len(reference_tokens), len(candidate_tokens))
+            if not shortest:
+                bounds.append(0)
+                continue
+            common = reference_counts & Counter(candidate_tokens)
+            bounds.append(int(sum(common.values()) * 100 / shortest)/100)
+        return bounds
+
+    def _check_candidates(self, data: CheckInput) -> Dict[str, float]:
+        lang: str = data['lang']
+        candidates: List[Candidate] = data['candidates']
+
+        reference_tokens = self._get_tokens(code=data['ref_code'], lang=lang)
+        plag_percent_by_uuids = {}
+        for candidate in candidates:
+            candidate_tokens = self._get_tokens(
+                code=candidate['code'],
+                lang=lang
+            )
+            plag_percent = self._get_percent_from_tokens(
+                reference_tokens=reference_tokens,
+                candidate_tokens=candidate_tokens
+            )
+            plag_percent_by_uuids[candidate['uuid']] = plag_percent
+            report_progress(done=1, scores={candidate['uuid']: plag_percent})
+            if self._is_threshold_reached(data, plag_percent):
+                break
+        return plag_percent_by_uuids
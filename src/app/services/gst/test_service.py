@@ -0,0 +1,204 @@
+from app.services.gst.service import GstService, tokens_cache
+from app.services.enums import Lang
+from app.services.entities import (
+    CheckInput,
+    CheckResult,
+    Candidate,
+)
+from app.services.gst.tokenizer import get_token_ids
+
+
+def test_get_percent_from_tokens__identical_code__max_plagiarism():
+
+    # arrange
+    code = (
+        '#include <iostream>\n'
+        'int main() {\n'
+        '    int a, b, c;\n'
+        '    std::cin >> a >> b >> c;\n'
+        '    std::cout << a + b + c << \'\\n\';\n'
+        '    return 0;\n'
+        '}\n'
+    )
+    tokens = get_token_ids(code=code, lang=Lang.CPP)
+    service = GstService()
+
+    # act
+    result = service._get_percent_from_tokens(
+        reference_tokens=tokens,
+        candidate_tokens=tokens
+    )
+
+    # assert
+    assert result == 1.0
+
+
+def test_get_percent_from_tokens__renamed_identifiers__max_plagiarism():
+
+    # arrange
+    reference_code = (
+        'public class Ref {\n'
+        '    public static int sum(int a, int b) {\n'
+        '        int result = a + b;\n'
+        '        return result;\n'
+        '    }\n'
+        '}\n'
+    )
+    candidate_code = (
+        'public class Cand {\n'
+        '    // складывает числа\n'
+        '    public static int add(int x, int y) {\n'
+        '        int total = x + y;\n'
+        '        return total;\n'
+        '    }\n'
+        '}\n'
+    )
+    service = GstService()
+
+    # act
+    result = service._get_percent_from_tokens(
+        reference_tokens=get_token_ids(code=reference_code, lang=Lang.JAVA),
+        candidate_tokens=get_token_ids(code=candidate_code, lang=Lang.JAVA)
+    )
+
+    # assert
+    assert result == 1.0
+
+
+def test_get_percent_from_tokens__different_code__min_plagiarism():
+
+    # arrange
+    reference_code = (
+        'import java.util.Scanner;\n'
+        '\n'
+        'public class Ref {\n'
+        '    public static void main(String[] args) {\n'
+        '        Scanner sc = new Scanner(System.in);\n'
+        '        int a = sc.nextInt();\n'
+        '        int b = sc.nextInt();\n'
+        '        int c = sc.nextInt();\n'
+        '        System.out.println(a + b + c);\n'
+        '    }\n'
+        '}\n'
+    )
+    candidate_code = (
+        'public class CandDiff {\n'
+        '    private int value;\n'
+        '\n'
+        '    public CandDiff(int value) {\n'
+        '        this.value = value;\n'
+        '    }\n'
+        '\n'
+        '    public int getValue() {\n'
+        '        return value;\n'
+        '    }\n'
+        '}\n'
+    )
+    service = GstService()
+
+    # act
+    result = service._get_percent_from_tokens(
+        reference_tokens=get_token_ids(code=reference_code, lang=Lang.JAVA),
+        candidate_tokens=get_token_ids(code=candidate_code, lang=Lang.JAVA)
+    )
+
+    # assert
+    assert result < 0.2
+
+
+def test_get_percent_from_tokens__empty_code__zero():
+
+    # arrange
+    service = GstService()
+
+    # act
+    result = service._get_percent_from_tokens(
+        reference_tokens=[],
+        candidate_tokens=[1, 2, 3]
+    )
+
+    # assert
+    assert result == 0
+
+
+def test_check_plagiarism__multiple_candidates__ok(mocker):
+
+    # arrange
+    check_input = CheckInput(
+        lang=Lang.CPP,
+        ref_code='int main() { return 0; }',
+        candidates=[
+            Candidate(uuid='candidate-1', code='int main() { return 1; }'),
+            Candidate(uuid='candidate-2', code='void f() {}'),
+        ]
+    )
+    check_result = CheckResult(uuid='candidate-1', percent=1.0)
+    get_percent_mock = mocker.patch(
+        'app.services.gst.service.GstService._get_percent_from_tokens',
+        side_effect=[1.0, 0.1]
+    )
+    get_candidate_with_max_plag_mock = mocker.patch(
+        'app.services.base.AntiplagBaseService._get_candidate_with_max_plag',
+        return_value=check_result
+    )
+    service = GstService()
+
+    # act
+    result = service.check_plagiarism(data=check_input)
+
+    # assert
+    assert get_percent_mock.call_count == 2
+    get_candidate_with_max_plag_mock.assert_called_once_with(
+        {'candidate-1': 1.0, 'candidate-2': 0.1}
+    )
+    assert result == check_result
+
+
+def test_get_upper_bounds__not_less_than_percent():
+
+    # arrange
+    ref_code = (
+        'int sum(int a, int b) { int s = 0; '
+        'for (int i = a; i < b; ++i) s += i; return s; }'
+    )
+    candidates = [
+        Candidate(uuid='candidate-1', code=ref_code),
+        Candidate(uuid='candidate-2', code=ref_code.replace('+=', '-=')),
+        Candidate(uuid='candidate-3', code='int main() { return 0; }'),
+        Candidate(uuid='candidate-4', code=''),
+    ]
+    check_input = CheckInput(
+        lang=Lang.CPP,
+        ref_code=ref_code,
+        candidates=candidates
+    )
+    service = GstService()
+
+    # act
+    bounds = service._get_upper_bounds(check_input)
+
+    # assert
+    percents = service._check_candidates(check_input)
+    assert bounds[0] == 1.0
+    assert bounds[3] == 0
+    for candidate, bound in zip(candidates, bounds):
+        assert bound >= percents[candidate['uuid']]
+
+
+def test_get_tokens__same_code__tokenized_once(mocker):
+
+    # arrange
+    tokens_cache.clear()
+    get_token_ids_mock = mocker.patch(
+        'app.services.gst.service.get_token_ids',
+        return_value=[1, 2, 3]
+    )
+    service = GstService()
+    service._get_tokens(code='int a;', lang=Lang.CPP)
+
+    # act
+    result = service._get_tokens(code='int a;', lang=Lang.CPP)
+
+    # assert
+    get_token_ids_mock.assert_called_once_with(code='int a;', lang=Lang.CPP)
+    assert result == [1, 2, 3]
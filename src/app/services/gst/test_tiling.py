@@ -0,0 +1,66 @@
+from app.services.gst.tiling import greedy_string_tiling
+
+
+def test_greedy_string_tiling__identical__all_tiled():
+
+    # arrange
+    tokens = [1, 2, 3, 4, 5, 6, 7, 8]
+
+    # act
+    result = greedy_string_tiling(tokens, list(tokens), min_match=3)
+
+    # assert
+    assert result == 8
+
+
+def test_greedy_string_tiling__swapped_blocks__all_tiled():
+
+    # arrange
+    pattern_tokens = [1, 2, 3, 4, 9, 5, 6, 7, 8]
+    text_tokens = [5, 6, 7, 8, 0, 1, 2, 3, 4]
+
+    # act
+    result = greedy_string_tiling(pattern_tokens, text_tokens, min_match=3)
+
+    # assert
+    assert result == 8
+
+
+def test_greedy_string_tiling__short_matches__ignored():
+
+    # arrange
+    pattern_tokens = [1, 2, 3, 4, 5, 6]
+    text_tokens = [1, 2, 0, 3, 4, 0, 5, 6]
+
+    # act
+    result = greedy_string_tiling(pattern_tokens, text_tokens, min_match=3)
+
+    # assert
+    assert result == 0
+
+
+def test_greedy_string_tiling__long_match__found():
+
+    # arrange
+    common = list(range(100))
+    pattern_tokens = [500, 501] + common + [502]
+    text_tokens = [600] + common + [601, 602, 603]
+
+    # act
+    result = greedy_string_tiling(pattern_tokens, text_tokens, min_match=5)
+
+    # assert
+    assert result == 100
+
+
+def test_greedy_string_tiling__repeated_tokens__tiles_not_overlapped():
+
+    # arrange
+    pattern_tokens = [7] * 10 + [1, 2, 3] + [7] * 40
+    text_tokens = [7] * 25 + [1, 2, 3]
+
+    # act
+    result = greedy_string_tiling(pattern_tokens, text_tokens, min_match=3)
+
+    # assert
+    assert result == 28
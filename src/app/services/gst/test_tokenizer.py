@@ -0,0 +1,56 @@
+from app.services.enums import Lang
+from app.services.gst.tokenizer import get_token_ids, tokenize
+
+
+def test_tokenize__cpp__identifiers_and_literals_normalized():
+
+    # arrange
+    code = (
+        '#include <iostream>\n'
+        'int main() {\n'
+        '    // comment\n'
+        '    std::cout << "text" << \'c\' << 1.5e+3; /* comment */\n'
+        '    return 0;\n'
+        '}\n'
+    )
+
+    # act
+    result = tokenize(code=code, lang=Lang.CPP)
+
+    # assert
+    assert result == [
+        'int', 'ID', '(', ')', '{',
+        'ID', '::', 'ID', '<<', 'STR', '<<', 'CHR', '<<', 'NUM', ';',
+        'return', 'NUM', ';',
+        '}',
+    ]
+
+
+def test_tokenize__java__keywords_kept():
+
+    # arrange
+    code = 'public class A { private int value = 10; }'
+
+    # act
+    result = tokenize(code=code, lang=Lang.JAVA)
+
+    # assert
+    assert result == [
+        'public', 'class', 'ID', '{',
+        'private', 'int', 'ID', '=', 'NUM', ';',
+        '}',
+    ]
+
+
+def test_get_token_ids__renamed_identifiers__same_ids():
+
+    # arrange
+    code = 'int total = a + b;'
+    renamed_code = 'int sum = first + second;'
+
+    # act
+    result = get_token_ids(code=code, lang=Lang.CPP)
+    renamed_result = get_token_ids(code=renamed_code, lang=Lang.CPP)
+
+    # assert
+    assert result == renamed_result
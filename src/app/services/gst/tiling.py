@@ -0,0 +1,238 @@
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+HASH_BASE = np.uint64(1_000_003)
+
+# Начальная длина искомых совпадений. Длинные совпадения находятся
+# сразу, после чего длина поиска уменьшается до минимальной.
+INITIAL_SEARCH_LENGTH = 20
+# Число токенов, на которое совпадения продлеваются за один шаг
+EXTEND_STEP = 32
+
+Match = Tuple[int, int, int]
+
+
+def _get_power(length: int) -> np.uint64:
+    return np.uint64(pow(int(HASH_BASE), length, 1 << 64))
+
+
+class _Sequence:
+
+    """ Последовательность токенов с отметками о вхождении в плитки. """
+
+    def __init__(self, tokens: Sequence[int]):
+        self.tokens = tokens
+        self.marks = bytearray(len(tokens))
+        self.values = np.asarray(tokens, dtype=np.uint64)
+        self._hashes: Dict[int, np.ndarray] = {1: self.values}
+
+    def _get_hashes(self, length: int) -> np.ndarray:
+
+        """ Возвращает полиномиальные хеши всех окон заданной длины.
+        Хеши окон длины 2^k вычисляются удвоением и кешируются,
+        а хеш окна произвольной длины составляется из них, поэтому
+        требуется O(log length) операций над массивами. Переполнение
+        uint64 ожидаемо: хеш вычисляется по модулю 2^64, а совпадение
+        хешей проверяется сравнением токенов. """
+
+        count = len(self.values) - length + 1
+        if count <= 0:
+            return np.empty(0, dtype=np.uint64)
+        hashes = None
+        offset = 0
+        for bit in reversed(range(length.bit_length())):
+            size = 1 << bit
+            if not length & size:
+                continue
+            piece = self._get_doubled_hashes(size)[offset:offset + count]
+            if hashes is None:
+                hashes = piece
+            else:
+                hashes = hashes * _get_power(size) + piece
+            offset += size
+        return hashes
+
+    def _get_doubled_hashes(self, size: int) -> np.ndarray:
+        hashes = self._hashes.get(size)
+        if hashes is None:
+            half = self._get_doubled_hashes(size // 2)
+            hashes = half[:-(size // 2)] * _get_power(size // 2)
+            hashes += half[size // 2:]
+            self._hashes[size] = hashes
+        return hashes
+
+    def get_windows(self, length: int) -> Tuple[np.ndarray, np.ndarray]:
+
+        """ Возвращает хеши и позиции всех окон заданной длины,
+        не содержащих отмеченных токенов. """
+
+        hashes = self._get_hashes(length)
+        prefix_marks = np.zeros(len(self.marks) + 1, dtype=np.int64)
+        np.cumsum(
+            np.frombuffer(self.marks, dtype=np.uint8),
+            out=prefix_marks[1:]
+        )
+        starts = np.flatnonzero(
+            prefix_marks[length:] == prefix_marks[:len(hashes)]
+        )
+        return hashes[starts], starts
+
+
+def _get_free(marks: bytearray, padding: int) -> np.ndarray:
+
+    """ Возвращает признаки неотмеченных токенов, дополненные
+    padding ложными значениями за концом последовательности. """
+
+    free = np.zeros(len(marks) + padding, dtype=bool)
+    free[:len(marks)] = np.frombuffer(marks, dtype=np.uint8) == 0
+    return free
+
+
+def _get_match_sizes(
+    pattern: _Sequence,
+    text: _Sequence,
+    p_starts: np.ndarray,
+    t_starts: np.ndarray,
+    length: int
+) -> np.ndarray:
+
+    """ Возвращает длины совпадений, начинающихся в парах позиций
+    с равными хешами окон длины length: 0, если окна различаются
+    (коллизия хешей), иначе длину совпадения, продолженного
+    по неотмеченным токенам. Все пары продлеваются одновременно
+    на EXTEND_STEP токенов за шаг. """
+
+    p_values, t_values = pattern.values, text.values
+    window = np.arange(length)
+    sizes = np.where(
+        (
+            p_values[p_starts[:, None] + window]
+            == t_values[t_starts[:, None] + window]
+        ).all(axis=1),
+        length,
+        0
+    )
+    p_free = _get_free(pattern.marks, EXTEND_STEP)
+    t_free = _get_free(text.marks, EXTEND_STEP)
+    p_last, t_last = len(p_values) - 1, len(t_values) - 1
+    steps = np.arange(EXTEND_STEP)
+    active = np.flatnonzero(sizes)
+    size = length
+    while len(active):
+        p_next = p_starts[active, None] + (size + steps)
+        t_next = t_starts[active, None] + (size + steps)
+        grows = (
+            (
+                p_values[np.minimum(p_next, p_last)]
+                == t_values[np.minimum(t_next, t_last)]
+            )
+            & p_free[p_next]
+            & t_free[t_next]
+        )
+        runs = np.where(
+            grows.all(axis=1),
+            EXTEND_STEP,
+            grows.argmin(axis=1)
+        )
+        sizes[active] = size + runs
+        active = active[runs == EXTEND_STEP]
+        size += EXTEND_STEP
+    return sizes
+
+
+def _scan_patterns(
+    pattern: _Sequence,
+    text: _Sequence,
+    length: int
+) -> Tuple[int, List[Match]]:
+
+    """ Находит все максимальные совпадения длиной не менее length
+    среди неотмеченных токенов (этап scanpattern алгоритма RKR-GST).
+    Окна текста сортируются по хешу, окна образца с общими хешами
+    находятся бинарным поиском, и пары окон перебираются в порядке
+    позиций образца, а затем текста. """
+
+    p_hashes, p_starts = pattern.get_windows(length)
+    t_hashes, t_starts = text.get_windows(length)
+    order = np.argsort(t_hashes, kind='stable')
+    t_hashes, t_starts = t_hashes[order], t_starts[order]
+    lefts = np.searchsorted(t_hashes, p_hashes, side='left')
+    counts = np.searchsorted(t_hashes, p_hashes, side='right') - lefts
+    firsts = np.cumsum(counts) - counts
+    p_pairs = np.repeat(p_starts, counts)
+    t_pairs = t_starts[
+        np.arange(len(p_pairs)) + np.repeat(lefts - firsts, counts)
+    ]
+    sizes = _get_match_sizes(pattern, text, p_pairs, t_pairs, length)
+
+    longest = np.flatnonzero(sizes > 2 * length)
+    if len(longest):
+        return int(sizes[longest[0]]), []
+    found = np.flatnonzero(sizes)
+    if not len(found):
+        return 0, []
+    matches = list(zip(
+        sizes[found].tolist(),
+        p_pairs[found].tolist(),
+        t_pairs[found].tolist()
+    ))
+    return int(sizes[found].max()), matches
+
+
+def _mark_strings(
+    pattern: _Sequence,
+    text: _Sequence,
+    matches: List[Match]
+) -> int:
+
+    """ Отмечает найденные совпадения как плитки, начиная с самых
+    длинных, и возвращает число покрытых токенов (этап markstrings). """
+
+    tiled = 0
+    for size, p_start, t_start in sorted(matches, reverse=True):
+        p_end, t_end = p_start + size, t_start + size
+        if (
+            any(pattern.marks[p_start:p_end])
+            or any(text.marks[t_start:t_end])
+        ):
+            continue
+        pattern.marks[p_start:p_end] = b'\x01' * size
+        text.marks[t_start:t_end] = b'\x01' * size
+        tiled += size
+    return tiled
+
+
+def greedy_string_tiling(
+    pattern_tokens: Sequence[int],
+    text_tokens: Sequence[int],
+    min_match: int
+) -> int:
+
+    """ Покрывает две последовательности токенов непересекающимися
+    общими подстроками (плитками) длиной не менее min_match и
+    возвращает число токенов, покрытых плитками.
+
+    Реализует алгоритм Running Karp-Rabin Greedy String Tiling:
+    окна токенов сравниваются по скользящим полиномиальным хешам,
+    длина поиска уменьшается от INITIAL_SEARCH_LENGTH до min_match. """
+
+    shortest = min(len(pattern_tokens), len(text_tokens))
+    if shortest < min_match:
+        return 0
+    pattern = _Sequence(pattern_tokens)
+    text = _Sequence(text_tokens)
+    length = max(min_match, min(INITIAL_SEARCH_LENGTH, shortest))
+    tiled = 0
+    while True:
+        max_match, matches = _scan_patterns(pattern, text, length)
+        if max_match > 2 * length:
+            length = max_match
+            continue
+        new_tiled = _mark_strings(pattern, text, matches)
+        tiled += new_tiled
+        if length > min_match:
+            length = max(min_match, length // 2)
+        elif not new_tiled:
+            break
+    return tiled
@@ -0,0 +1,104 @@
+import re
+from typing import Dict, List
+
+from app.services.enums import Lang
+
+CPP_KEYWORDS = frozenset((
+    'alignas', 'alignof', 'asm', 'auto', 'bool', 'break', 'case', 'catch',
+    'char', 'class', 'const', 'constexpr', 'const_cast', 'continue',
+    'decltype', 'default', 'delete', 'do', 'double', 'dynamic_cast', 'else',
+    'enum', 'explicit', 'export', 'extern', 'false', 'float', 'for',
+    'friend', 'goto', 'if', 'inline', 'int', 'long', 'mutable', 'namespace',
+    'new', 'noexcept', 'nullptr', 'operator', 'private', 'protected',
+    'public', 'register', 'reinterpret_cast', 'return', 'short', 'signed',
+    'sizeof', 'static', 'static_assert', 'static_cast', 'struct', 'switch',
+    'template', 'this', 'throw', 'true', 'try', 'typedef', 'typeid',
+    'typename', 'union', 'unsigned', 'using', 'virtual', 'void', 'volatile',
+    'while',
+))
+
+JAVA_KEYWORDS = frozenset((
+    'abstract', 'assert', 'boolean', 'break', 'byte', 'case', 'catch',
+    'char', 'class', 'const', 'continue', 'default', 'do', 'double', 'else',
+    'enum', 'extends', 'false', 'final', 'finally', 'float', 'for', 'goto',
+    'if', 'implements', 'import', 'instanceof', 'int', 'interface', 'long',
+    'native', 'new', 'null', 'package', 'private', 'protected', 'public',
+    'return', 'short', 'static', 'strictfp', 'super', 'switch',
+    'synchronized', 'this', 'throw', 'throws', 'transient', 'true', 'try',
+    'var', 'void', 'volatile', 'while',
+))
+
+KEYWORDS = {
+    Lang.CPP: CPP_KEYWORDS,
+    Lang.JAVA: JAVA_KEYWORDS,
+}
+
+# Нормализованные токены: все идентификаторы и литералы одного вида
+# заменяются одним и тем же токеном
+IDENTIFIER = 'ID'
+NUMBER = 'NUM'
+STRING = 'STR'
+CHAR = 'CHR'
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<skip>
+        \s+
+        | //[^\n]*
+        | /\*.*?(?:\*/|\Z)
+        | \#[^\n]*
+    )
+    | (?P<string>"(?:\\.|[^"\\\n])*"?)
+    | (?P<char>'(?:\\.|[^'\\\n])*'?)
+    | (?P<number>(?:\d|\.\d)(?:[eEpP][+-]|[\w.'])*)
+    | (?P<word>[A-Za-z_$][\w$]*)
+    | (?P<operator>
+        >>>=|<<=|>>=|>>>|->\*|\.\.\.|::|->|\+\+|--|<<|>>|<=|>=|==|!=
+        | &&|\|\||\+=|-=|\*=|/=|%=|&=|\|=|\^=|\.\*|[^\s\w]
+    )
+''', flags=re.VERBOSE | re.DOTALL)
+
+_token_ids: Dict[str, int] = {}
+
+
+def get_token_id(token: str) -> int:
+
+    """ Возвращает числовой идентификатор токена. Идентификаторы
+    общие для всех запросов процесса, поэтому последовательности
+    токенов разных файлов можно сравнивать напрямую. """
+
+    token_id = _token_ids.get(token)
+    if token_id is None:
+        token_id = _token_ids.setdefault(token, len(_token_ids))
+    return token_id
+
+
+def tokenize(code: str, lang: str) -> List[str]:
+
+    """ Разбивает исходный код на C++ или Java на нормализованные токены.
+
+    Пробелы, комментарии и директивы препроцессора отбрасываются,
+    ключевые слова и операторы сохраняются как есть, а идентификаторы
+    и литералы заменяются токенами своего вида. """
+
+    keywords = KEYWORDS[lang]
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(code):
+        kind = match.lastgroup
+        if kind == 'skip':
+            continue
+        value = match.group()
+        if kind == 'word':
+            tokens.append(value if value in keywords else IDENTIFIER)
+        elif kind == 'number':
+            tokens.append(NUMBER)
+        elif kind == 'string':
+            tokens.append(STRING)
+        elif kind == 'char':
+            tokens.append(CHAR)
+        else:
+            tokens.append(value)
+    return tokens
+
+
+def get_token_ids(code: str, lang: str) -> List[int]:
+    return [get_token_id(token) for token in tokenize(code, lang)]
@@ -0,0 +1,168 @@
+import json
+import sqlite3
+import threading
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from app.config import JOB_CALLBACK_TIMEOUT, JOB_WORKERS
+from app.services import messages
+from app.services.entities import CheckInput
+from app.services.exceptions import ServiceException
+from app.services.main import AntiplagService
+from app.services.metrics import metrics
+from app.services.progress import Progress, track_progress
+from app.services.registry import EngineRegistry
+from app.services.store import JobStore, get_job_store
+
+
+class JobRunner:
+
+    """ Выполняет асинхронные проверки в фоновых потоках воркера.
+
+    Задание сохраняется в общем хранилище (get_job_store) и ставится
+    в очередь, а запрос сразу получает его идентификатор: проверка
+    не занимает воркер HTTP-запросов и не прерывается по таймауту
+    gunicorn. Состояние, долю проверенных кандидатов и результат
+    задания можно получить из любого воркера. По завершении задания
+    состояние отправляется POST-запросом на callback_url, если он
+    указан. """
+
+    def __init__(
+        self,
+        registry: EngineRegistry,
+        workers: int = JOB_WORKERS,
+        store: Optional[JobStore] = None
+    ):
+        self.registry = registry
+        self.workers = max(workers, 1)
+        self._store = store
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: Dict[Future, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> JobStore:
+        return self._store or get_job_store()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+
+        """ Потоки создаются при первом задании. """
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix='antiplag-job'
+                )
+            return self._executor
+
+    def submit(
+        self,
+        data: CheckInput,
+        callback_url: Optional[str] = None
+    ) -> str:
+
+        """ Ставит проверку в очередь и возвращает идентификатор
+        задания. """
+
+        job_id = uuid4().hex
+        self.store.create(job_id)
+        future = self._get_executor().submit(
+            self._run,
+            job_id,
+            data,
+            callback_url
+        )
+        with self._lock:
+            self._futures[future] = job_id
+        future.add_done_callback(self._forget)
+        metrics.increment('jobs.submitted')
+        return job_id
+
+    def _forget(self, future: Future):
+        with self._lock:
+            self._futures.pop(future, None)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def _run(
+        self,
+        job_id: str,
+        data: CheckInput,
+        callback_url: Optional[str]
+    ):
+        store = self.store
+        try:
+            store.start(job_id)
+            progress = Progress(
+                on_change=lambda fraction: self._set_progress(
+                    job_id,
+                    fraction
+                )
+            )
+            with track_progress(progress):
+                result = AntiplagService(registry=self.registry).check(
+                    data=data
+                )
+        except ServiceException as ex:
+            metrics.increment('jobs.failed')
+            store.fail(job_id, {'error': ex.message, 'details': ex.details})
+        except Exception as ex:
+            metrics.increment('jobs.failed')
+            store.fail(job_id, {'error': messages.MSG_9, 'details': str(ex)})
+        else:
+            metrics.increment('jobs.done')
+            store.finish(job_id, result)
+        if callback_url:
+            self._send_callback(callback_url, store.get(job_id))
+
+    def _set_progress(self, job_id: str, fraction: float):
+
+        """ Ошибка записи доли проверенных кандидатов
+        не прерывает проверку. """
+
+        try:
+            self.store.set_progress(job_id, fraction)
+        except sqlite3.Error:
+            metrics.increment('jobs.errors')
+
+    def _send_callback(self, url: str, job: Optional[Dict[str, Any]]):
+
+        """ Отправляет состояние завершенного задания в формате JSON.
+        Ошибки запроса подсчитываются в метрике jobs.callback_errors. """
+
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(job, default=str).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(
+                request,
+                timeout=JOB_CALLBACK_TIMEOUT
+            ):
+                pass
+        except Exception:
+            metrics.increment('jobs.callback_errors')
+
+    def shutdown(self):
+
+        """ Отменяет задания в очереди и дожидается завершения
+        выполняемых. Отмененные задания завершаются с ошибкой. """
+
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures = dict(self._futures)
+        if executor is None:
+            return
+        for future, job_id in futures.items():
+            if future.cancel():
+                self.store.fail(
+                    job_id,
+                    {'error': messages.MSG_8, 'details': None}
+                )
+        executor.shutdown(wait=True)
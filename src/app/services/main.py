@@ -1,27 +1,367 @@
-from app.services.enums import Lang
-from app.services.entities import CheckInput
-from app.services import exceptions
-from app.services.sim.service import SimService
-from app.services.pycode.service import PycodeSimilarService
-from app.services.sql.service import SqlPlagService
-
-
-class AntiplagService:
-
-    service_cls_map = {
-        Lang.CPP: SimService,
-        Lang.JAVA: SimService,
-        Lang.PYTHON: PycodeSimilarService,
-        Lang.SQL: SqlPlagService,
-    }
-
-    def check(self, data: CheckInput):
-
-        """ Проверка исходного кода задач на наличие в нем плагиата. """
-
-        lang: str = data['lang']
-        try:
-            service_cls = self.service_cls_map[lang]
-        except KeyError:
-            raise exceptions.LanguageException()
-        return service_cls().check_plagiarism(data)
+import threading
+from queue import Queue
+from typing import Dict, Iterator, List, Optional
+
+from itertools import combinations, product
+
+from app.config import (
+    CPP_ENGINE,
+    EXACT_MATCH_ENABLED,
+    EXACT_MATCH_RENAME_IDENTIFIERS,
+    JAVA_ENGINE,
+    PAIRS_THRESHOLD,
+    PYTHON_ENGINE,
+)
+from app.services import messages
+from app.services.enums import CheckEventType, Engine, Lang
+from app.services.entities import (
+    BatchCheckInput,
+    Candidate,
+    CheckEvent,
+    CheckInput,
+    CheckResult,
+    Edge,
+    PairsInput,
+    PairsResult,
+)
+from app.services.exceptions import ServiceException
+from app.services.metrics import metrics
+from app.services.normalize import get_content_hash, get_normalized_hash
+from app.services.pairs import find_similar_pairs, get_clusters
+from app.services.prefilter import (
+    get_candidate_shingles,
+    get_prefilter_options,
+    prefilter_stats,
+    select_candidates,
+)
+from app.services.progress import (
+    Progress,
+    report_copies,
+    report_progress,
+    track_progress,
+)
+from app.services.registry import EngineRegistry
+
+# Детекторы импортируются при первой проверке на их языке
+ENGINE_PATHS = {
+    Engine.SIM: 'app.services.sim.service:SimService',
+    Engine.GST: 'app.services.gst.service:GstService',
+    Engine.PYCODE: 'app.services.pycode.service:PycodeSimilarService',
+    Engine.WINNOW: 'app.services.pycode.service:WinnowService',
+    Engine.SQLPLAG: 'app.services.sql.service:SqlPlagService',
+}
+
+
+def create_registry() -> EngineRegistry:
+
+    """ Создает реестр встроенных детекторов плагиата. Детекторы
+    по умолчанию для C++, Java и Python задаются в конфигурации. """
+
+    registry = EngineRegistry()
+    for lang, engines in Engine.BY_LANG.items():
+        for engine in engines:
+            registry.register_lazy(lang, engine, ENGINE_PATHS[engine])
+    registry.set_default_engine(Lang.CPP, CPP_ENGINE)
+    registry.set_default_engine(Lang.JAVA, JAVA_ENGINE)
+    registry.set_default_engine(Lang.PYTHON, PYTHON_ENGINE)
+    return registry
+
+
+class AntiplagService:
+
+    def __init__(self, registry: Optional[EngineRegistry] = None):
+        self.registry = (
+            registry if registry is not None else create_registry()
+        )
+
+    def _group_candidates(
+        self,
+        data: CheckInput
+    ) -> Dict[str, List[Candidate]]:
+
+        """ Группирует кандидатов по хешу нормализованного кода.
+        Группы и кандидаты в них следуют в порядке первого появления
+        в запросе. """
+
+        groups: Dict[str, List[Candidate]] = {}
+        for candidate in data['candidates']:
+            content_hash = get_content_hash(
+                code=candidate['code'],
+                lang=data['lang']
+            )
+            groups.setdefault(content_hash, []).append(candidate)
+        return groups
+
+    def _find_exact_copy(
+        self,
+        data: CheckInput,
+        candidate_hashes: Optional[Dict[str, str]] = None
+    ) -> Optional[Candidate]:
+
+        """ Возвращает первого кандидата, код которого совпадает
+        с эталоном после нормализации (normalize_code), или None.
+        Хеши кода кандидатов сохраняются в candidate_hashes, чтобы
+        не вычислять их заново для других эталонов.
+
+        Для sql поиск не выполняется: детектор sqlplag сам сравнивает
+        канонический вид запросов до их разбора, но прежде проверяет
+        тип эталонного запроса. """
+
+        lang = data['lang']
+        if not EXACT_MATCH_ENABLED or lang == Lang.SQL:
+            return None
+        ref_hash = get_normalized_hash(
+            code=data['ref_code'],
+            lang=lang,
+            rename_identifiers=EXACT_MATCH_RENAME_IDENTIFIERS
+        )
+        if candidate_hashes is None:
+            candidate_hashes = {}
+        for candidate in data['candidates']:
+            candidate_hash = candidate_hashes.get(candidate['code'])
+            if candidate_hash is None:
+                candidate_hash = candidate_hashes[candidate['code']] = (
+                    get_normalized_hash(
+                        code=candidate['code'],
+                        lang=lang,
+                        rename_identifiers=EXACT_MATCH_RENAME_IDENTIFIERS
+                    )
+                )
+            if candidate_hash == ref_hash:
+                return candidate
+        return None
+
+    def check(self, data: CheckInput) -> CheckResult:
+
+        """ Проверка исходного кода задач на наличие в нем плагиата. """
+
+        options = {
+            key: value for key, value in data.items() if key != 'ref_code'
+        }
+        return self.check_batch(
+            data=BatchCheckInput(**options, ref_codes=[data['ref_code']])
+        )[0]
+
+    def check_stream(self, data: CheckInput) -> Iterator[CheckEvent]:
+
+        """ Проверка с передачей процентов плагиата по мере их
+        нахождения. Возвращает событие score для каждого проверенного
+        кандидата (в порядке завершения проверки) и последним - событие
+        result с тем же результатом, что и check, или событие error.
+
+        Проверка выполняется в отдельном потоке. Если события перестали
+        читать, проверка все равно завершается, а найденные проценты
+        сохраняются в кеш. """
+
+        events: Queue = Queue()
+        seen = set()
+
+        def add_scores(scores: Dict[str, float]):
+            for uuid, percent in scores.items():
+                if uuid not in seen:
+                    seen.add(uuid)
+                    events.put(CheckEvent(
+                        type=CheckEventType.SCORE,
+                        uuid=uuid,
+                        percent=percent
+                    ))
+
+        def run():
+            try:
+                with track_progress(Progress(on_scores=add_scores)):
+                    result = self.check(data=data)
+            except ServiceException as ex:
+                events.put(CheckEvent(
+                    type=CheckEventType.ERROR,
+                    error=ex.message,
+                    details=ex.details
+                ))
+            except Exception as ex:
+                events.put(CheckEvent(
+                    type=CheckEventType.ERROR,
+                    error=messages.MSG_9,
+                    details=str(ex)
+                ))
+            else:
+                events.put(CheckEvent(type=CheckEventType.RESULT, **result))
+
+        threading.Thread(target=run, name='antiplag-stream').start()
+        while True:
+            event = events.get()
+            yield event
+            if event['type'] != CheckEventType.SCORE:
+                return
+
+    def check_batch(self, data: BatchCheckInput) -> List[CheckResult]:
+
+        """ Проверка нескольких эталонов с общим списком кандидатов.
+        Результаты возвращаются в порядке эталонов.
+
+        Подготовка кандидатов (группировка, хеши для поиска копий,
+        n-граммы для предварительного отбора) выполняется один раз
+        для всех эталонов, а детектору все эталоны передаются одним
+        вызовом check_plagiarism_many. """
+
+        service = self.registry.get_service(
+            lang=data['lang'],
+            engine=data.get('engine')
+        )
+        options = {
+            key: value for key, value in data.items() if key != 'ref_codes'
+        }
+
+        # Кандидаты с одинаковым нормализованным кодом проверяются один
+        # раз: группу представляет первый из них. Процент плагиата у всех
+        # кандидатов группы одинаковый, а из равных результатов выбирается
+        # первый по порядку кандидат, поэтому представитель группы
+        # и есть ответ для всей группы
+        groups = self._group_candidates(options)
+        if len(groups) < len(options['candidates']):
+            options['candidates'] = [group[0] for group in groups.values()]
+            report_copies({
+                group[0]['uuid']: [candidate['uuid'] for candidate in group]
+                for group in groups.values()
+                if len(group) > 1
+            })
+
+        candidate_hashes: Dict[str, str] = {}
+        shingles = None
+        if len(data['ref_codes']) > 1 and get_prefilter_options(options):
+            shingles = get_candidate_shingles(options)
+
+        results: List[Optional[CheckResult]] = []
+        inputs: Dict[int, CheckInput] = {}
+        audits: Dict[int, List[Candidate]] = {}
+        for index, ref_code in enumerate(data['ref_codes']):
+            ref_data = CheckInput(**options, ref_code=ref_code)
+
+            # Копия эталона - наибольший возможный результат,
+            # детектор для нее не запускается
+            exact_copy = self._find_exact_copy(ref_data, candidate_hashes)
+            if exact_copy is not None:
+                report_progress(scores={exact_copy['uuid']: 1.0})
+                results.append(
+                    CheckResult(uuid=exact_copy['uuid'], percent=1.0)
+                )
+                continue
+            results.append(None)
+
+            # Точному детектору передаются только кандидаты,
+            # прошедшие предварительный отбор
+            selected = select_candidates(ref_data, shingles)
+            if selected is not None:
+                prefilter_stats.add_request(
+                    candidates=len(ref_data['candidates']),
+                    selected=len(selected)
+                )
+                if prefilter_stats.should_audit():
+                    audits[index] = selected
+                else:
+                    ref_data = {**ref_data, 'candidates': selected}
+            inputs[index] = ref_data
+
+        if inputs:
+            checked = service.check_plagiarism_many(list(inputs.values()))
+            for index, result in zip(inputs, checked):
+                if index in audits:
+                    prefilter_stats.add_audit(
+                        result=result,
+                        selected=audits[index]
+                    )
+                results[index] = result
+        return results
+
+    def check_pairs(self, data: PairsInput) -> PairsResult:
+
+        """ Попарная проверка решений: возвращает пары решений
+        с процентом плагиата не ниже порога и группы решений,
+        связанных такими парами (компоненты связности).
+
+        Точному детектору передаются только пары, отобранные по
+        MinHash-подписям n-грамм токенов (find_similar_pairs). Из пары
+        эталоном считается решение, следующее позже в запросе, так же,
+        как новое решение проверяется на /check/ среди прежних.
+        Решения с одинаковым нормализованным кодом проверяются один
+        раз, и процент плагиата между ними равен 1.0. """
+
+        lang = data['lang']
+        service = self.registry.get_service(
+            lang=lang,
+            engine=data.get('engine')
+        )
+        threshold = data.get('threshold', PAIRS_THRESHOLD)
+        submissions = data['submissions']
+        groups_by_hash: Dict[str, List[int]] = {}
+        for index, submission in enumerate(submissions):
+            content_hash = get_content_hash(
+                code=submission['code'],
+                lang=lang
+            )
+            groups_by_hash.setdefault(content_hash, []).append(index)
+        groups = list(groups_by_hash.values())
+        representatives = [submissions[group[0]] for group in groups]
+
+        pairs = find_similar_pairs(
+            [submission['code'] for submission in representatives],
+            lang
+        )
+        metrics.increment(
+            'pairs.total',
+            len(representatives) * (len(representatives) - 1) // 2
+        )
+        metrics.increment('pairs.candidates', len(pairs))
+
+        candidates_by_reference: Dict[int, List[int]] = {}
+        for first, second in pairs:
+            candidates_by_reference.setdefault(second, []).append(first)
+        scores_list = service.get_scores_many([
+            CheckInput(
+                lang=lang,
+                ref_code=representatives[reference]['code'],
+                candidates=[representatives[index] for index in indexes]
+            )
+            for reference, indexes in candidates_by_reference.items()
+        ])
+
+        group_edges = []
+        for (reference, indexes), scores in zip(
+            candidates_by_reference.items(),
+            scores_list
+        ):
+            for index in indexes:
+                percent = scores.get(representatives[index]['uuid'])
+                if percent is not None and percent >= threshold:
+                    group_edges.append((index, reference, percent))
+
+        # Ребра между группами распространяются на все решения групп
+        edges = []
+        for first, second, percent in group_edges:
+            edges.extend(
+                (min(pair), max(pair), percent)
+                for pair in product(groups[first], groups[second])
+            )
+        for group in groups:
+            edges.extend(
+                (first, second, 1.0)
+                for first, second in combinations(group, 2)
+            )
+        edges.sort()
+        metrics.increment('pairs.edges', len(edges))
+
+        return PairsResult(
+            edges=[
+                Edge(
+                    first=submissions[first]['uuid'],
+                    second=submissions[second]['uuid'],
+                    percent=percent
+                )
+                for first, second, percent in edges
+            ],
+            clusters=[
+                [submissions[index]['uuid'] for index in cluster]
+                for cluster in get_clusters(
+                    len(submissions),
+                    ((first, second) for first, second, _ in edges)
+                )
+            ]
+        )
@@ -2,3 +2,8 @@ MSG_2 = 'Unsupported programming language'
 MSG_3 = 'Error while getting candidate with max plagiarism'
 MSG_4 = 'Error while parsing plagiarism value'
 MSG_5 = 'Unsupported SQL query type'
+MSG_6 = 'Unsupported plagiarism detection engine'
+MSG_7 = 'Job not found'
+MSG_8 = 'Job was interrupted'
+MSG_9 = 'Internal error'
+MSG_10 = 'Plagiarism check timed out'
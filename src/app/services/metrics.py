@@ -0,0 +1,32 @@
+import threading
+from collections import defaultdict
+from typing import Callable, Dict
+
+
+class Metrics:
+
+    """ Собирает счетчики и показатели работы сервиса в пределах
+    процесса (воркера). Источники регистрируются под своим именем
+    и опрашиваются при каждом запросе данных. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(int)
+        self._sources: Dict[str, Callable[[], dict]] = {}
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def register(self, name: str, source: Callable[[], dict]):
+        self._sources[name] = source
+
+    def get_data(self) -> dict:
+        with self._lock:
+            data = {'counters': dict(self._counters)}
+        for name, source in self._sources.items():
+            data[name] = source()
+        return data
+
+
+metrics = Metrics()
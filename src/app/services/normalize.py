@@ -0,0 +1,205 @@
+import io
+import keyword
+import re
+import tokenize
+from typing import Callable, Dict, List
+
+from app.services.cache import get_hash
+from app.services.enums import Lang
+from app.services.gst.tokenizer import KEYWORDS, TOKEN_PATTERN
+from app.services.sql.canonical import (
+    get_canonical_form,
+    get_canonical_tokens,
+    get_query_type,
+    is_name,
+    render,
+)
+
+C_IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_$][\w$]*')
+
+PYTHON_SKIPPED_TOKENS = frozenset((
+    tokenize.COMMENT,
+    tokenize.NL,
+    tokenize.ENCODING,
+    tokenize.ENDMARKER,
+))
+PYTHON_STRUCTURE_TOKENS = {
+    tokenize.NEWLINE: '<NEWLINE>',
+    tokenize.INDENT: '<INDENT>',
+    tokenize.DEDENT: '<DEDENT>',
+}
+
+
+def _strip_lines(code: str) -> str:
+
+    """ Удаляет пробелы в начале и в конце строк и пустые строки. """
+
+    lines = (line.strip() for line in code.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def _strip_python_lines(code: str) -> str:
+
+    """ Удаляет пробелы в конце строк и пустые строки.
+    Отступы в Python значимы и сохраняются. """
+
+    lines = (line.rstrip() for line in code.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def _get_sql_form(code: str) -> str:
+
+    """ Возвращает канонический вид запроса вместе с его типом.
+    Тип sqlplag определяет по исходному коду (комментарий перед
+    запросом делает его тип неизвестным), поэтому канонического
+    вида, в котором комментариев нет, недостаточно. """
+
+    return f'{get_query_type(code)}\n{get_canonical_form(code)}'
+
+
+# Нормализация не меняет результат ни одного детектора языка:
+# SIM и GST сравнивают токены, pycode и winnow - AST,
+# sqlplag - канонический вид и тип запроса
+WHITESPACE_NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    Lang.CPP: _strip_lines,
+    Lang.JAVA: _strip_lines,
+    Lang.PYTHON: _strip_python_lines,
+    Lang.SQL: _get_sql_form,
+}
+
+
+def normalize_whitespace(code: str, lang: str) -> str:
+
+    """ Приводит исходный код к виду, не зависящему от незначимых
+    для языка пробелов и пустых строк. """
+
+    return WHITESPACE_NORMALIZERS[lang](code)
+
+
+def get_content_hash(code: str, lang: str) -> str:
+
+    """ Возвращает хеш исходного кода после normalize_whitespace.
+    У кандидатов с одинаковым хешем одинаковый процент плагиата. """
+
+    return get_hash(lang, normalize_whitespace(code=code, lang=lang))
+
+
+def _get_c_tokens(code: str, lang: str) -> List[str]:
+
+    """ Разбивает код на C++ или Java на токены без пробелов
+    и комментариев. Литералы сохраняются как есть, в директивах
+    препроцессора пробелы сводятся к одному. """
+
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(code):
+        value = match.group()
+        if match.lastgroup != 'skip':
+            tokens.append(value)
+        elif value.startswith('#'):
+            tokens.append(' '.join(value.split()))
+    return tokens
+
+
+def _get_python_tokens(code: str) -> List[str]:
+
+    """ Разбивает код на Python на токены без комментариев и пустых
+    строк. Переводы строк и отступы заменяются токенами структуры.
+    Код, который не удается разбить на токены, разбивается на строки
+    без незначимых пробелов. """
+
+    tokens = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type in PYTHON_SKIPPED_TOKENS:
+                continue
+            tokens.append(
+                PYTHON_STRUCTURE_TOKENS.get(token.type, token.string)
+            )
+    except (tokenize.TokenError, SyntaxError):
+        return _strip_python_lines(code).splitlines()
+    return tokens
+
+
+def _is_python_identifier(token: str) -> bool:
+    return token.isidentifier() and not keyword.iskeyword(token)
+
+
+TOKENIZERS: Dict[str, Callable[[str], List[str]]] = {
+    Lang.CPP: lambda code: _get_c_tokens(code, Lang.CPP),
+    Lang.JAVA: lambda code: _get_c_tokens(code, Lang.JAVA),
+    Lang.PYTHON: _get_python_tokens,
+    Lang.SQL: get_canonical_tokens,
+}
+
+IDENTIFIER_CHECKERS: Dict[str, Callable[[str], bool]] = {
+    Lang.CPP: lambda token: (
+        bool(C_IDENTIFIER_PATTERN.fullmatch(token))
+        and token not in KEYWORDS[Lang.CPP]
+    ),
+    Lang.JAVA: lambda token: (
+        bool(C_IDENTIFIER_PATTERN.fullmatch(token))
+        and token not in KEYWORDS[Lang.JAVA]
+    ),
+    Lang.PYTHON: _is_python_identifier,
+    Lang.SQL: is_name,
+}
+
+
+def get_normalized_tokens(
+    code: str,
+    lang: str,
+    rename_identifiers: bool = False
+) -> List[str]:
+
+    """ Возвращает токены исходного кода без комментариев и пробелов.
+    Если rename_identifiers, идентификаторы заменяются именами
+    по порядку первого появления (id1, id2, ...), и программы,
+    отличающиеся только именами, получают одинаковые токены. """
+
+    tokens = TOKENIZERS[lang](code)
+    if not rename_identifiers:
+        return tokens
+    is_identifier = IDENTIFIER_CHECKERS[lang]
+    names: Dict[str, str] = {}
+    return [
+        names.setdefault(token, f'id{len(names) + 1}')
+        if is_identifier(token) else token
+        for token in tokens
+    ]
+
+
+def normalize_code(
+    code: str,
+    lang: str,
+    rename_identifiers: bool = False
+) -> str:
+
+    """ Приводит исходный код к виду без комментариев и незначимых
+    пробелов (get_normalized_tokens), одинаковому у копий программы. """
+
+    tokens = get_normalized_tokens(
+        code=code,
+        lang=lang,
+        rename_identifiers=rename_identifiers
+    )
+    if lang == Lang.SQL:
+        return render(tokens)
+    return '\n'.join(tokens)
+
+
+def get_normalized_hash(
+    code: str,
+    lang: str,
+    rename_identifiers: bool = False
+) -> str:
+
+    """ Возвращает хеш исходного кода после normalize_code. """
+
+    return get_hash(
+        lang,
+        normalize_code(
+            code=code,
+            lang=lang,
+            rename_identifiers=rename_identifiers
+        )
+    )
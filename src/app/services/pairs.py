@@ -0,0 +1,121 @@
+from collections import defaultdict
+from typing import Iterable, List, Set, Tuple
+
+import numpy as np
+
+from app.config import PAIRS_LSH_BANDS, PAIRS_LSH_ROWS, PREFILTER_NGRAM
+from app.services.prefilter import get_shingles, get_tokens
+
+# Начальное значение генератора параметров хеш-функций MinHash:
+# подписи одной программы одинаковы во всех воркерах
+MINHASH_SEED = 2024
+
+
+def get_hash_params(count: int) -> Tuple[np.ndarray, np.ndarray]:
+
+    """ Возвращает параметры a и b count хеш-функций a * x + b
+    (по модулю 2^64). При нечетном a функция - перестановка
+    64-битных значений. """
+
+    generator = np.random.default_rng(MINHASH_SEED)
+    a = generator.integers(0, 2 ** 64, size=count, dtype=np.uint64)
+    b = generator.integers(0, 2 ** 64, size=count, dtype=np.uint64)
+    return a | np.uint64(1), b
+
+
+def get_signatures(
+    shingles: List[np.ndarray],
+    count: int
+) -> np.ndarray:
+
+    """ Возвращает MinHash-подписи длины count множеств n-грамм:
+    для каждой хеш-функции - наименьшее значение на множестве.
+    Доля совпадающих значений подписей двух программ - оценка
+    коэффициента Жаккара их множеств n-грамм. """
+
+    a, b = get_hash_params(count)
+    signatures = np.empty((len(shingles), count), dtype=np.uint64)
+    for index, values in enumerate(shingles):
+        # Переполнение uint64 ожидаемо: хеш вычисляется по модулю 2^64
+        signatures[index] = (np.multiply.outer(values, a) + b).min(axis=0)
+    return signatures
+
+
+def get_lsh_pairs(
+    signatures: np.ndarray,
+    bands: int,
+    rows: int
+) -> Set[Tuple[int, int]]:
+
+    """ Возвращает пары номеров подписей, совпадающих хотя бы
+    в одной из bands полос по rows значений (LSH). Пара с
+    коэффициентом Жаккара s попадает в результат с вероятностью
+    1 - (1 - s^rows)^bands. """
+
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        band_signatures = signatures[:, band * rows:(band + 1) * rows]
+        for index, values in enumerate(band_signatures):
+            buckets[values.tobytes()].append(index)
+        for bucket in buckets.values():
+            for position, first in enumerate(bucket):
+                for second in bucket[position + 1:]:
+                    pairs.add((first, second))
+    return pairs
+
+
+def find_similar_pairs(codes: List[str], lang: str) -> List[Tuple[int, int]]:
+
+    """ Возвращает отсортированные пары номеров (i < j) программ,
+    вероятно похожих по n-граммам токенов. Программы без n-грамм
+    (пустые после разбиения на токены) в пары не входят. """
+
+    shingles = [
+        get_shingles(get_tokens(code=code, lang=lang), PREFILTER_NGRAM)
+        for code in codes
+    ]
+    indexes = [index for index, values in enumerate(shingles) if len(values)]
+    if len(indexes) < 2:
+        return []
+    signatures = get_signatures(
+        [shingles[index] for index in indexes],
+        PAIRS_LSH_BANDS * PAIRS_LSH_ROWS
+    )
+    pairs = get_lsh_pairs(signatures, PAIRS_LSH_BANDS, PAIRS_LSH_ROWS)
+    return sorted((indexes[first], indexes[second]) for first, second in pairs)
+
+
+def get_clusters(
+    count: int,
+    edges: Iterable[Tuple[int, int]]
+) -> List[List[int]]:
+
+    """ Возвращает компоненты связности графа из count вершин
+    с ребрами edges, содержащие больше одной вершины. Вершины
+    в компонентах и компоненты упорядочены по номеру вершины. """
+
+    parents = list(range(count))
+
+    def find(index: int) -> int:
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for first, second in edges:
+        first_root, second_root = find(first), find(second)
+        if first_root != second_root:
+            parents[max(first_root, second_root)] = min(
+                first_root,
+                second_root
+            )
+
+    components = defaultdict(list)
+    for index in range(count):
+        components[find(index)].append(index)
+    return [
+        component
+        for component in components.values()
+        if len(component) > 1
+    ]
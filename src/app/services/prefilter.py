@@ -0,0 +1,246 @@
+import keyword
+import random
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import (
+    PREFILTER_AUDIT_RATE,
+    PREFILTER_ENABLED,
+    PREFILTER_FLOOR,
+    PREFILTER_NGRAM,
+    PREFILTER_TOP_K,
+)
+from app.services.enums import Lang
+from app.services.entities import Candidate, CheckInput, CheckResult
+from app.services.gst.tokenizer import get_token_ids
+from app.services.metrics import metrics
+from app.services.sql.canonical import tokenize as tokenize_sql
+
+SHINGLE_BASE = np.uint64(1_000_003)
+
+PYTHON_KEYWORDS = frozenset(keyword.kwlist)
+
+PYTHON_TOKEN_PATTERN = re.compile(r'''
+    (?P<skip>\s+|\#[^\n]*|\\\n)
+    | (?P<string>
+        [rRbBuUfF]{0,2}(?:\'\'\'.*?(?:\'\'\'|\Z)|""".*?(?:"""|\Z)
+        | '(?:\\.|[^'\\\n])*'? | "(?:\\.|[^"\\\n])*"?)
+    )
+    | (?P<word>[^\W\d]\w*)
+    | (?P<number>(?:\d|\.\d)[\w.]*)
+    | (?P<operator>
+        \*\*=|//=|>>=|<<=|->|:=|\*\*|//|<<|>>|<=|>=|==|!=
+        | \+=|-=|\*=|/=|%=|&=|\|=|\^=|@=|[^\s\w]
+    )
+''', flags=re.VERBOSE | re.DOTALL)
+
+
+def _get_label_id(label: str) -> int:
+    return zlib.crc32(label.encode())
+
+
+def _get_python_tokens(code: str) -> List[int]:
+
+    """ Разбивает код на Python на токены. Ключевые слова и операторы
+    сохраняются, идентификаторы и литералы заменяются токеном своего
+    вида. Код с синтаксическими ошибками тоже разбирается. """
+
+    tokens = []
+    for match in PYTHON_TOKEN_PATTERN.finditer(code):
+        kind = match.lastgroup
+        if kind == 'skip':
+            continue
+        value = match.group()
+        if kind == 'word':
+            label = value if value in PYTHON_KEYWORDS else 'ID'
+        elif kind in ('string', 'number'):
+            label = kind
+        else:
+            label = value
+        tokens.append(_get_label_id(label))
+    return tokens
+
+
+def get_tokens(code: str, lang: str) -> List[int]:
+
+    """ Возвращает последовательность нормализованных токенов
+    исходного кода с учетом языка. """
+
+    if lang in (Lang.CPP, Lang.JAVA):
+        return get_token_ids(code=code, lang=lang)
+    if lang == Lang.PYTHON:
+        return _get_python_tokens(code)
+    return [_get_label_id(token) for token in tokenize_sql(code)]
+
+
+def get_shingles(tokens: List[int], size: int) -> np.ndarray:
+
+    """ Возвращает отсортированный массив уникальных хешей всех
+    n-грамм токенов длины size. У программ короче size
+    единственная n-грамма - вся программа. """
+
+    size = min(size, len(tokens))
+    if not size:
+        return np.empty(0, dtype=np.uint64)
+    values = np.asarray(tokens, dtype=np.uint64)
+    count = len(values) - size + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        # Переполнение uint64 ожидаемо: хеш вычисляется по модулю 2^64
+        hashes = hashes * SHINGLE_BASE + values[offset:offset + count]
+    return np.unique(hashes)
+
+
+def get_similarities(
+    reference: np.ndarray,
+    candidates: List[np.ndarray]
+) -> np.ndarray:
+
+    """ Вычисляет коэффициент Жаккара между множеством n-грамм эталона
+    и множествами n-грамм всех кандидатов за один проход. """
+
+    if not candidates:
+        return np.zeros(0)
+    sizes = np.fromiter(
+        (len(shingles) for shingles in candidates),
+        dtype=np.int64,
+        count=len(candidates)
+    )
+    owners = np.repeat(np.arange(len(candidates)), sizes)
+    # Массивы кандидатов уникальны по отдельности, но не в объединении,
+    # поэтому assume_unique неприменим
+    found = np.isin(np.concatenate(candidates), reference)
+    common = np.bincount(owners, weights=found, minlength=len(candidates))
+    union = sizes + len(reference) - common
+    return np.divide(
+        common,
+        union,
+        out=np.zeros(len(candidates)),
+        where=union > 0
+    )
+
+
+class PrefilterStats:
+
+    """ Счетчики работы предварительного отбора кандидатов.
+
+    Полнота (recall) оценивается по выборке запросов: для доли
+    PREFILTER_AUDIT_RATE запросов проверяются все кандидаты, и
+    проверяется, прошел ли отбор кандидат с наибольшим процентом. """
+
+    def __init__(self, name: str):
+        self.requests = 0
+        self.candidates = 0
+        self.selected = 0
+        self.audits = 0
+        self.audit_hits = 0
+        self._lock = threading.Lock()
+        metrics.register(name, self.get_stats)
+
+    def add_request(self, candidates: int, selected: int):
+        with self._lock:
+            self.requests += 1
+            self.candidates += candidates
+            self.selected += selected
+
+    def add_audit(self, result: CheckResult, selected: List[Candidate]):
+        hit = result['uuid'] is None or any(
+            candidate['uuid'] == result['uuid'] for candidate in selected
+        )
+        with self._lock:
+            self.audits += 1
+            self.audit_hits += hit
+
+    def should_audit(self) -> bool:
+        return random.random() < PREFILTER_AUDIT_RATE
+
+    def get_stats(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'candidates': self.candidates,
+                'selected': self.selected,
+                'audits': self.audits,
+                'recall': (
+                    round(self.audit_hits / self.audits, 4)
+                    if self.audits else None
+                ),
+            }
+
+
+prefilter_stats = PrefilterStats(name='prefilter')
+
+
+def get_prefilter_options(data: CheckInput) -> Optional[Tuple[int, float]]:
+
+    """ Возвращает параметры отбора кандидатов top_k и floor
+    или None, если отбор отключен или не нужен (кандидатов
+    не больше top_k). Параметры берутся из data['prefilter'],
+    а при их отсутствии - из конфигурации. """
+
+    options = data.get('prefilter', {})
+    if not options.get('enabled', PREFILTER_ENABLED):
+        return None
+    top_k = options.get('top_k', PREFILTER_TOP_K)
+    if len(data['candidates']) <= top_k:
+        return None
+    return top_k, options.get('floor', PREFILTER_FLOOR)
+
+
+def get_candidate_shingles(data: CheckInput) -> List[np.ndarray]:
+
+    """ Возвращает множества n-грамм токенов всех кандидатов. """
+
+    return [
+        get_shingles(
+            get_tokens(code=candidate['code'], lang=data['lang']),
+            PREFILTER_NGRAM
+        )
+        for candidate in data['candidates']
+    ]
+
+
+def select_candidates(
+    data: CheckInput,
+    shingles: Optional[List[np.ndarray]] = None
+) -> Optional[List[Candidate]]:
+
+    """ Отбирает кандидатов для точной проверки по сходству n-грамм
+    токенов с эталоном: top_k наиболее похожих и все кандидаты
+    со сходством не ниже floor. Кандидаты, которых невозможно оценить
+    (пустые после разбиения на токены), отбираются всегда. Порядок
+    кандидатов сохраняется.
+
+    Возвращает None, если отбор отключен или не нужен
+    (get_prefilter_options). Множества n-грамм кандидатов
+    (get_candidate_shingles), общих для нескольких эталонов,
+    можно вычислить заранее и передать в shingles. """
+
+    options = get_prefilter_options(data)
+    if options is None:
+        return None
+    top_k, floor = options
+    candidates: List[Candidate] = data['candidates']
+
+    lang: str = data['lang']
+    reference = get_shingles(
+        get_tokens(code=data['ref_code'], lang=lang),
+        PREFILTER_NGRAM
+    )
+    if not len(reference):
+        return None
+    if shingles is None:
+        shingles = get_candidate_shingles(data)
+    scores = get_similarities(reference, shingles)
+    selected = scores >= floor
+    selected[np.argpartition(-scores, top_k - 1)[:top_k]] = True
+    selected |= np.fromiter(map(len, shingles), dtype=np.int64) == 0
+    return [
+        candidate
+        for candidate, is_selected in zip(candidates, selected)
+        if is_selected
+    ]
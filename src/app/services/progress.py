@@ -0,0 +1,111 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class Progress:
+
+    """ Ход проверки. Детекторы сообщают число кандидатов, которые
+    начали проверять (total) и уже проверили (done), и найденные
+    проценты плагиата (scores) через report_progress.
+
+    Функция on_change вызывается с долей проверенных кандидатов, когда
+    доля увеличилась не меньше чем на step, а функция on_scores -
+    с процентами плагиата, как только они найдены (в кеше или детектором).
+    Процент представителя группы одинаковых кандидатов (report_copies)
+    передается в on_scores для каждого кандидата группы. """
+
+    def __init__(
+        self,
+        on_change: Optional[Callable[[float], None]] = None,
+        step: float = 0.01,
+        on_scores: Optional[Callable[[Dict[str, float]], None]] = None
+    ):
+        self.total = 0
+        self.done = 0
+        self.on_change = on_change
+        self.step = step
+        self.on_scores = on_scores
+        self._copies: Dict[str, List[str]] = {}
+        self._reported = 0.0
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        total: int = 0,
+        done: int = 0,
+        scores: Optional[Dict[str, float]] = None
+    ):
+        if scores and self.on_scores is not None:
+            self.on_scores({
+                copy: percent
+                for uuid, percent in scores.items()
+                for copy in self._copies.get(uuid, (uuid,))
+            })
+        if self.on_change is None:
+            return
+        with self._lock:
+            self.total += total
+            self.done += done
+            fraction = min(self.done / self.total, 1.0) if self.total else 0
+            if fraction - self._reported < self.step:
+                return
+            self._reported = fraction
+        self.on_change(fraction)
+
+    def add_copies(self, copies: Dict[str, List[str]]):
+        self._copies.update(copies)
+
+
+_progress: ContextVar[Optional[Progress]] = ContextVar(
+    'progress',
+    default=None
+)
+
+
+@contextmanager
+def track_progress(progress: Progress) -> Iterator[Progress]:
+
+    """ Направляет report_progress в progress внутри контекста. """
+
+    token = _progress.set(progress)
+    try:
+        yield progress
+    finally:
+        _progress.reset(token)
+
+
+def report_progress(
+    total: int = 0,
+    done: int = 0,
+    scores: Optional[Dict[str, float]] = None
+):
+
+    """ Сообщает о начатых и завершенных проверках кандидатов
+    и найденных процентах плагиата, если текущая проверка
+    отслеживается (track_progress). """
+
+    progress = _progress.get()
+    if progress is not None:
+        progress.add(total=total, done=done, scores=scores)
+
+
+def is_tracking_scores() -> bool:
+
+    """ Проверяет, передаются ли найденные проценты плагиата
+    по мере их нахождения (Progress с on_scores). """
+
+    progress = _progress.get()
+    return progress is not None and progress.on_scores is not None
+
+
+def report_copies(copies: Dict[str, List[str]]):
+
+    """ Сообщает, что вместо каждой группы одинаковых кандидатов
+    проверяется только ее представитель: uuid представителя -
+    uuid всех кандидатов группы. """
+
+    progress = _progress.get()
+    if progress is not None:
+        progress.add_copies(copies)
@@ -1,78 +1,323 @@
-import pycode_similar as pycode
-import re
-from typing import List
-
-from app.services.entities import (
-    Candidate,
-    CheckInput,
-    CheckResult
-)
-from app.services import exceptions
-from app.services.base import AntiplagBaseService
-
-
-class PycodeSimilarService(AntiplagBaseService):
-
-    def _get_value_from_pycode_output(self, pycode_output: str) -> float:
-
-        """ Ивлекает из строки вычисленный процент плагиата
-        и возвращает его виде вещественного числа. """
-
-        try:
-            pycode_output_str = str(pycode_output)
-            values = re.findall(r'\d+\.\d+', pycode_output_str)
-            return float(values.pop())
-        except IndexError as ex:
-            raise exceptions.ParsingOutputException(details=str(ex))
-
-    def _get_percent_from_pycode_candidate(
-        self,
-        reference_code: str,
-        candidate_code: str
-    ) -> float:
-
-        """ Осуществляет проверку на наличие плагиата
-        в решении очередного кандидата для сравнения
-        (на языкe программирования Python) и
-        возвращает полученный процент плагиата.
-
-        Возвращает -1 если бекенд плагиата возвращает ошибку при очередного
-        кандидата. Это означает что проверить плагиат невозможно.
-        """
-
-        try:
-            pycode_result = pycode.detect(
-                (reference_code, candidate_code),
-                diff_method=pycode.UnifiedDiff,
-                keep_prints=True,
-                module_level=True
-            )
-            pycode_output_obj = pycode_result[0][1]
-            pycode_output = str(pycode_output_obj.pop())
-        except (SyntaxError, IndexError):
-            return -1
-        else:
-            pycheck_plag_percent = self._get_value_from_pycode_output(
-                pycode_output
-            )
-            return pycheck_plag_percent
-
-    def check_plagiarism(self, data: CheckInput) -> CheckResult:
-
-        """ Проверка на плагиат исходного кода задач на языках,
-        поддерживаемых детектором Pycode_similar (Python). """
-
-        ref_code: str = data['ref_code']
-        candidates: List[Candidate] = data['candidates']
-
-        plag_percent_by_uuids = {}
-
-        for candidate in candidates:
-            candidate_code = candidate['code']
-            candidate_uuid = candidate['uuid']
-            plag_percent = self._get_percent_from_pycode_candidate(
-                reference_code=ref_code,
-                candidate_code=candidate_code
-            )
-            plag_percent_by_uuids[candidate_uuid] = plag_percent
-        return self._get_candidate_with_max_plag(plag_percent_by_uuids)
+import ast
+import sys
+from importlib import metadata
+from collections import Counter
+from typing import Dict, FrozenSet, List, Optional
+
+import pycode_similar as pycode
+
+from app.config import (
+    PYCODE_AST_CACHE_SIZE,
+    WINNOW_CACHE_SIZE,
+    WINNOW_K,
+    WINNOW_WINDOW,
+)
+from app.services.cache import LRUCache, get_hash
+from app.services.enums import Engine
+from app.services.entities import (
+    Candidate,
+    CheckInput,
+    CheckResult
+)
+from app.services.base import AntiplagPoolService
+from app.services.progress import report_progress
+from app.services.pycode.winnowing import get_fingerprints
+
+# Размер памяти, занимаемой одним узлом AST, в байтах (оценка)
+AST_NODE_SIZE = 400
+
+
+def get_func_infos_size(func_infos: List[pycode.FuncInfo]) -> int:
+
+    """ Оценивает объем памяти, занимаемый разобранной программой:
+    узлы нормализованного AST и его строковое представление. """
+
+    size = 0
+    for func_info in func_infos:
+        size += getattr(func_info.func_node, 'nsubnodes', 0) * AST_NODE_SIZE
+        size += sum(len(line) for line in func_info.func_ast_lines)
+        size += sum(len(line) for line in func_info.func_code_lines)
+    return size
+
+
+def get_fingerprints_size(fingerprints: FrozenSet[int]) -> int:
+    return sys.getsizeof(fingerprints) + 32 * len(fingerprints)
+
+
+ast_cache = LRUCache(
+    name='pycode_ast',
+    max_size=PYCODE_AST_CACHE_SIZE,
+    get_size=get_func_infos_size
+)
+fingerprints_cache = LRUCache(
+    name='winnow_fingerprints',
+    max_size=WINNOW_CACHE_SIZE,
+    get_size=get_fingerprints_size
+)
+
+
+class PycodeSimilarService(AntiplagPoolService):
+
+    engine = Engine.PYCODE
+    version = f'1:{metadata.version("pycode-similar")}'
+
+    def _get_func_infos(self, code: str) -> List[pycode.FuncInfo]:
+
+        """ Возвращает нормализованные функции программы. Программы
+        кешируются по хешу исходного кода, поэтому код, встречающийся
+        в разных запросах, разбирается один раз.
+
+        Вызывает SyntaxError, если код не удалось разобрать. """
+
+        key = get_hash(code)
+        func_infos = ast_cache.get(key)
+        if func_infos is None:
+            func_infos = self._parse_func_infos(code)
+            ast_cache.set(key, func_infos)
+        return func_infos
+
+    def _parse_func_infos(self, code: str) -> List[pycode.FuncInfo]:
+
+        """ Разбирает и нормализует исходный код так же, как
+        pycode.detect(..., keep_prints=True, module_level=True),
+        и возвращает описания всех функций и уровня модуля. """
+
+        code_lines = code.splitlines(True)
+        func_collector = pycode.FuncNodeCollector(keep_prints=True)
+        func_collector.visit(ast.parse(code))
+        func_infos = [
+            pycode.FuncInfo(func_node, code_lines)
+            for func_node in func_collector.get_function_nodes()
+        ]
+        module_collector = pycode.ModuleNodeCollector(keep_prints=True)
+        module_collector.visit(ast.parse(code))
+        module_node = module_collector.get_module_node()
+        module_node.endlineno = len(code_lines)
+        func_infos.append(pycode.FuncInfo(module_node, code_lines))
+        return func_infos
+
+    def _get_func_diff_infos(
+        self,
+        reference_infos: List[pycode.FuncInfo],
+        candidate_infos: List[pycode.FuncInfo]
+    ) -> List[pycode.FuncDiffInfo]:
+
+        """ Сопоставляет каждой функции эталона наиболее похожую
+        функцию кандидата (как pycode.detect с diff_method=UnifiedDiff)
+        и возвращает результаты сравнения. """
+
+        diff_method = pycode.UnifiedDiff
+        func_diff_infos = []
+        for reference_info in reference_infos:
+            min_diff_value = int((1 << 31) - 1)
+            min_diff_info: Optional[pycode.FuncInfo] = None
+            for candidate_info in candidate_infos:
+                diff_value = diff_method.diff(reference_info, candidate_info)
+                if diff_value < min_diff_value:
+                    min_diff_value = diff_value
+                    min_diff_info = candidate_info
+                if diff_value == 0:
+                    break
+            func_diff_info = pycode.FuncDiffInfo()
+            func_diff_info.info_ref = reference_info
+            func_diff_info.info_candidate = min_diff_info
+            func_diff_info.total_count = diff_method.total(
+                reference_info,
+                min_diff_info
+            )
+            if min_diff_info:
+                func_diff_info.plagiarism_count = (
+                    func_diff_info.total_count - min_diff_value
+                )
+            func_diff_infos.append(func_diff_info)
+        return func_diff_infos
+
+    def _get_percent_from_pycode_candidate(
+        self,
+        reference_infos: Optional[List[pycode.FuncInfo]],
+        candidate_code: str
+    ) -> float:
+
+        """ Осуществляет проверку на наличие плагиата
+        в решении очередного кандидата для сравнения
+        (на языкe программирования Python) и
+        возвращает полученный процент плагиата.
+
+        Эталон передается уже разобранным, поэтому для каждого
+        кандидата разбирается только его собственный код. Результатом
+        считается наименьший процент плагиата среди функций эталона,
+        округленный до двух значащих цифр.
+
+        Возвращает -1 если бекенд плагиата возвращает ошибку при очередного
+        кандидата. Это означает что проверить плагиат невозможно.
+        """
+
+        if reference_infos is None:
+            return -1
+        try:
+            candidate_infos = self._get_func_infos(candidate_code)
+        except SyntaxError:
+            return -1
+        func_diff_infos = self._get_func_diff_infos(
+            reference_infos=reference_infos,
+            candidate_infos=candidate_infos
+        )
+        percent = min(
+            func_diff_info.plagiarism_percent
+            for func_diff_info in func_diff_infos
+        )
+        return float(format(percent, '.2'))
+
+    def check_plagiarism(self, data: CheckInput) -> CheckResult:
+
+        """ Проверка на плагиат исходного кода задач на языках,
+        поддерживаемых детектором Pycode_similar (Python). """
+
+        return self._get_candidate_with_max_plag(self._execute_bounded(data))
+
+    def _get_upper_bounds(self, data: CheckInput) -> List[float]:
+
+        """ Процент плагиата функции эталона - доля ее строк AST,
+        совпавших со строками наиболее похожей функции кандидата.
+        Совпавших строк не больше, чем общих строк без учета порядка,
+        поэтому оценка не требует построения diff. Разобранные
+        программы кешируются и используются при точной проверке. """
+
+        candidates: List[Candidate] = data['candidates']
+        try:
+            reference_infos = self._get_func_infos(data['ref_code'])
+        except SyntaxError:
+            return [-1] * len(candidates)
+        reference_counts = [
+            (Counter(info.func_ast_lines), len(info.func_ast_lines))
+            for info in reference_infos
+        ]
+        bounds = []
+        for candidate in candidates:
+            try:
+                candidate_infos = self._get_func_infos(candidate['code'])
+            except SyntaxError:
+                bounds.append(-1)
+                continue
+            candidate_counts = [
+                Counter(info.func_ast_lines) for info in candidate_infos
+            ]
+            percent = min(
+                max(
+                    sum((counts & other_counts).values()) / total
+                    for other_counts in candidate_counts
+                ) if total and candidate_counts else 0
+                for counts, total in reference_counts
+            )
+            bounds.append(float(format(percent, '.2')))
+        return bounds
+
+    def _check_candidates(self, data: CheckInput) -> Dict[str, float]:
+        ref_code: str = data['ref_code']
+        candidates: List[Candidate] = data['candidates']
+
+        try:
+            reference_infos = self._get_func_infos(ref_code)
+        except SyntaxError:
+            reference_infos = None
+
+        plag_percent_by_uuids = {}
+
+        for candidate in candidates:
+            candidate_code = candidate['code']
+            candidate_uuid = candidate['uuid']
+            plag_percent = self._get_percent_from_pycode_candidate(
+                reference_infos=reference_infos,
+                candidate_code=candidate_code
+            )
+            plag_percent_by_uuids[candidate_uuid] = plag_percent
+            report_progress(done=1, scores={candidate_uuid: plag_percent})
+            if self._is_threshold_reached(data, plag_percent):
+                break
+        return plag_percent_by_uuids
+
+
+class WinnowService(AntiplagPoolService):
+
+    """ Детектор плагиата для Python на основе отпечатков (winnowing).
+
+    Программа превращается в последовательность токенов нормализованного
+    AST, из k-грамм токенов выбираются отпечатки, а процент плагиата -
+    доля отпечатков эталона, найденных у кандидата. Отпечатки кешируются
+    по хешу кода, поэтому сравнение с уже встречавшимися кандидатами
+    сводится к пересечению множеств. """
+
+    engine = Engine.WINNOW
+    version = f'1:{WINNOW_K}:{WINNOW_WINDOW}'
+
+    def _get_fingerprints(self, code: str) -> FrozenSet[int]:
+
+        """ Возвращает отпечатки программы.
+
+        Вызывает SyntaxError, если код не удалось разобрать. """
+
+        key = get_hash(code)
+        fingerprints = fingerprints_cache.get(key)
+        if fingerprints is None:
+            fingerprints = get_fingerprints(
+                code=code,
+                k=WINNOW_K,
+                window=WINNOW_WINDOW
+            )
+            fingerprints_cache.set(key, fingerprints)
+        return fingerprints
+
+    def _get_percent_from_fingerprints(
+        self,
+        reference_fingerprints: FrozenSet[int],
+        candidate_fingerprints: FrozenSet[int]
+    ) -> float:
+        if not reference_fingerprints:
+            return 0
+        common = len(reference_fingerprints & candidate_fingerprints)
+        return round(common / len(reference_fingerprints), 2)
+
+    def _get_percent_from_winnow_candidate(
+        self,
+        reference_fingerprints: Optional[FrozenSet[int]],
+        candidate_code: str
+    ) -> float:
+
+        """ Возвращает процент плагиата кандидата или -1,
+        если код эталона или кандидата не удалось разобрать. """
+
+        if reference_fingerprints is None:
+            return -1
+        try:
+            candidate_fingerprints = self._get_fingerprints(candidate_code)
+        except SyntaxError:
+            return -1
+        return self._get_percent_from_fingerprints(
+            reference_fingerprints=reference_fingerprints,
+            candidate_fingerprints=candidate_fingerprints
+        )
+
+    def check_plagiarism(self, data: CheckInput) -> CheckResult:
+
+        """ Проверка на плагиат исходного кода задач на языке Python
+        сравнением отпечатков нормализованного AST. """
+
+        return self._get_candidate_with_max_plag(self._execute(data))
+
+    def _check_candidates(self, data: CheckInput) -> Dict[str, float]:
+        try:
+            reference_fingerprints = self._get_fingerprints(data['ref_code'])
+        except SyntaxError:
+            reference_fingerprints = None
+
+        plag_percent_by_uuids = {}
+        for candidate in data['candidates']:
+            plag_percent = self._get_percent_from_winnow_candidate(
+                reference_fingerprints=reference_fingerprints,
+                candidate_code=candidate['code']
+            )
+            plag_percent_by_uuids[candidate['uuid']] = plag_percent
+            report_progress(done=1, scores={candidate['uuid']: plag_percent})
+            if self._is_threshold_reached(data, plag_percent):
+                break
+        return plag_percent_by_uuids
@@ -1,45 +1,41 @@
 import pytest
-from app.services.main import PycodeSimilarService
+from app.services.pycode.service import PycodeSimilarService, WinnowService
 from app.services.enums import Lang
 from app.services.entities import (
     CheckInput,
     CheckResult,
     Candidate,
 )
-from app.services.exceptions import ParsingOutputException
-from app.services import messages
 
 
-def test_get_value_from_pycode_output__ok():
+def test_get_func_infos__functions_and_module_level__ok():
 
     # arrange
-    check_input = '35.42: ref __main__<1:0>, candidate __main__<1:0>'
-    check_result = 35.42
+    code = (
+        'def f(x):\n'
+        '    return x + 1\n'
+        'class A:\n'
+        '    def g(self):\n'
+        '        return 2\n'
+        'print(f(1))\n'
+    )
     service = PycodeSimilarService()
 
     # act
-    result = service._get_value_from_pycode_output(
-        pycode_output=check_input
-    )
+    result = service._get_func_infos(code)
 
     # assert
-    assert result == check_result
+    assert [info.func_name for info in result] == ['f', 'A.g', '__main__']
 
 
-def test_get_value_from_pycode_output__index_error__raise_exception():
+def test_get_func_infos__syntax_error__raise_exception():
 
     # arrange
-    check_input = 'ref __main__<1:0>, candidate __main__<1:0>'
     service = PycodeSimilarService()
 
     # act
-    with pytest.raises(ParsingOutputException) as ex:
-        service._get_value_from_pycode_output(
-            pycode_output=check_input
-        )
-
-    # assert
-    assert ex.value.message == messages.MSG_4
+    with pytest.raises(SyntaxError):
+        service._get_func_infos('def broken(:\n    pass')
 
 
 def test_get_percent_from_pycode__identical_code__max_plagiarism():
@@ -58,7 +54,7 @@ def test_get_percent_from_pycode__identical_code__max_plagiarism():
 
     # act
     result = service._get_percent_from_pycode_candidate(
-        reference_code=reference_code,
+        reference_infos=service._get_func_infos(reference_code),
         candidate_code=candidate_code
     )
 
@@ -89,7 +85,7 @@ def test_get_percent_from_pycode_candidate_diff_code__min_plag():
 
     # act
     result = service._get_percent_from_pycode_candidate(
-        reference_code=reference_code,
+        reference_infos=service._get_func_infos(reference_code),
         candidate_code=candidate_code
     )
 
@@ -118,7 +114,7 @@ def test_get_percent_from_pycode_candidate_same__partial_plag():
 
     # act
     result = service._get_percent_from_pycode_candidate(
-        reference_code=reference_code,
+        reference_infos=service._get_func_infos(reference_code),
         candidate_code=candidate_code
     )
 
@@ -146,6 +142,11 @@ def test_check_plagiarism__check_plagiarism__ok(mocker):
 
     pycode_plag_dict = {'9asd2': 50.9}
 
+    reference_infos = [mocker.Mock()]
+    get_func_infos_mock = mocker.patch(
+        'app.services.pycode.service.PycodeSimilarService._get_func_infos',
+        return_value=reference_infos
+    )
     get_percent_from_pycode_candidate_mock = mocker.patch(
         'app.services.pycode.service.PycodeSimilarService'
         '._get_percent_from_pycode_candidate',
@@ -163,8 +164,9 @@ def test_check_plagiarism__check_plagiarism__ok(mocker):
     result = service.check_plagiarism(data=check_input)
 
     # assert
+    get_func_infos_mock.assert_called_once_with('some code')
     get_percent_from_pycode_candidate_mock.assert_called_once_with(
-        reference_code='some code',
+        reference_infos=reference_infos,
         candidate_code='some code'
     )
     get_candidate_with_max_plag_mock.assert_called_once_with(
@@ -187,7 +189,7 @@ def test_get_percent_from_pycode__syntax_error__returns_minus_one():
 
     # act
     result = service._get_percent_from_pycode_candidate(
-        reference_code=reference_code,
+        reference_infos=service._get_func_infos(reference_code),
         candidate_code=invalid_candidate_code
     )
 
@@ -264,3 +266,224 @@ def test_check_plagiarism__multiple_candidates__ok(mocker):
         {'candidate-1': 0.3, 'candidate-2': 0.9}
     )
     assert result == check_result
+
+
+def test_get_percent_from_pycode__reference_syntax_error__returns_minus_one():
+
+    # arrange
+    service = PycodeSimilarService()
+
+    # act
+    result = service._get_percent_from_pycode_candidate(
+        reference_infos=None,
+        candidate_code='print(1)\n'
+    )
+
+    # assert
+    assert result == -1
+
+
+def test_check_plagiarism__reference_parsed_once(mocker):
+
+    # arrange
+    check_input = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='a = int(input())\nprint(a)\n',
+        candidates=[
+            Candidate(uuid='candidate-1', code='b = int(input())\nprint(b)\n'),
+            Candidate(uuid='candidate-2', code='print(1)\n'),
+            Candidate(uuid='candidate-3', code='x = 1\n'),
+        ]
+    )
+    service = PycodeSimilarService()
+    get_func_infos_spy = mocker.spy(service, '_get_func_infos')
+
+    # act
+    result = service.check_plagiarism(data=check_input)
+
+    # assert
+    parsed_codes = [
+        call.args[0] for call in get_func_infos_spy.call_args_list
+    ]
+    assert parsed_codes.count(check_input['ref_code']) == 1
+    assert len(parsed_codes) == 4
+    assert result == CheckResult(uuid='candidate-1', percent=1.0)
+
+
+def test_get_func_infos__same_code__parsed_once(mocker):
+
+    # arrange
+    code = 'def cached_function(x):\n    return x * 42\n'
+    service = PycodeSimilarService()
+    parse_func_infos_spy = mocker.spy(service, '_parse_func_infos')
+
+    # act
+    first_result = service._get_func_infos(code)
+    second_result = service._get_func_infos(code)
+
+    # assert
+    assert first_result is second_result
+    parse_func_infos_spy.assert_called_once_with(code)
+
+
+def test_winnow__identical_code__max_plagiarism():
+
+    # arrange
+    code = (
+        'a = int(input())\n'
+        'b = int(input())\n'
+        'c = int(input())\n'
+        'print(a + b + c)\n'
+    )
+    service = WinnowService()
+
+    # act
+    result = service._get_percent_from_winnow_candidate(
+        reference_fingerprints=service._get_fingerprints(code),
+        candidate_code=code
+    )
+
+    # assert
+    assert result == 1.0
+
+
+def test_winnow__different_code__min_plagiarism():
+
+    # arrange
+    reference_code = (
+        'a = int(input())\n'
+        'b = int(input())\n'
+        'c = int(input())\n'
+        'print(a + b + c)\n'
+    )
+    candidate_code = (
+        'def factorial(n):\n'
+        '    result = 1\n'
+        '    for i in range(2, n + 1):\n'
+        '        result *= i\n'
+        '    return result\n'
+        'print(factorial(int(input())))\n'
+    )
+    service = WinnowService()
+
+    # act
+    result = service._get_percent_from_winnow_candidate(
+        reference_fingerprints=service._get_fingerprints(reference_code),
+        candidate_code=candidate_code
+    )
+
+    # assert
+    assert result < 0.4
+
+
+def test_winnow__syntax_error__returns_minus_one():
+
+    # arrange
+    service = WinnowService()
+
+    # act
+    result = service._get_percent_from_winnow_candidate(
+        reference_fingerprints=service._get_fingerprints('print(1)\n'),
+        candidate_code='def broken(:\n    pass'
+    )
+
+    # assert
+    assert result == -1
+
+
+def test_winnow__check_plagiarism__ok():
+
+    # arrange
+    check_input = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code=(
+            'def total(a, b):\n'
+            '    return a + b\n'
+            'print(total(int(input()), int(input())))\n'
+        ),
+        candidates=[
+            Candidate(uuid='candidate-1', code='print("hello")\n'),
+            Candidate(
+                uuid='candidate-2',
+                code=(
+                    'def add(x, y):\n'
+                    '    return x + y\n'
+                    'print(add(int(input()), int(input())))\n'
+                )
+            ),
+            Candidate(uuid='candidate-3', code='def broken(:\n'),
+        ]
+    )
+    service = WinnowService()
+
+    # act
+    result = service.check_plagiarism(data=check_input)
+
+    # assert
+    assert result == CheckResult(uuid='candidate-2', percent=1.0)
+
+
+def test_get_upper_bounds__not_less_than_percent():
+
+    # arrange
+    reference_code = (
+        'def total(items):\n'
+        '    result = 0\n'
+        '    for item in items:\n'
+        '        result += item\n'
+        '    return result\n'
+        'print(total([1, 2, 3]))\n'
+    )
+    candidates = [
+        Candidate(uuid='candidate-1', code=reference_code),
+        Candidate(
+            uuid='candidate-2',
+            code=reference_code.replace('result += item', 'result -= 1')
+        ),
+        Candidate(uuid='candidate-3', code='print(sum([1, 2, 3]))\n'),
+        Candidate(uuid='candidate-4', code='def f(:\n'),
+    ]
+    check_input = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code=reference_code,
+        candidates=candidates
+    )
+    service = PycodeSimilarService()
+
+    # act
+    bounds = service._get_upper_bounds(check_input)
+
+    # assert
+    percents = service._check_candidates(check_input)
+    assert bounds[0] == 1.0
+    assert bounds[3] == -1
+    for candidate, bound in zip(candidates, bounds):
+        assert bound >= percents[candidate['uuid']]
+
+
+def test_check_candidates__threshold_reached__rest_skipped(mocker):
+
+    # arrange
+    check_input = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='print(1)',
+        candidates=[
+            Candidate(uuid='candidate-1', code='print(2)'),
+            Candidate(uuid='candidate-2', code='print(3)'),
+            Candidate(uuid='candidate-3', code='print(4)'),
+        ],
+        threshold=0.8
+    )
+    get_percent_mock = mocker.patch(
+        'app.services.pycode.service.PycodeSimilarService'
+        '._get_percent_from_pycode_candidate',
+        side_effect=[0.5, 0.8, 1.0]
+    )
+    service = PycodeSimilarService()
+
+    # act
+    result = service._check_candidates(check_input)
+
+    # assert
+    assert get_percent_mock.call_count == 2
+    assert result == {'candidate-1': 0.5, 'candidate-2': 0.8}
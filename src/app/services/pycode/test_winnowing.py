@@ -0,0 +1,90 @@
+import pytest
+
+from app.services.pycode.winnowing import (
+    get_fingerprints,
+    get_kgram_hashes,
+    get_tokens,
+    winnow,
+)
+
+
+def test_get_tokens__renamed_identifiers_and_docstring__same_tokens():
+
+    # arrange
+    code = (
+        'def total(a, b):\n'
+        '    return a + b\n'
+        'print(total(1, 2))\n'
+    )
+    renamed_code = (
+        'def add(x, y):\n'
+        '    """ Складывает числа. """\n'
+        '    return x + y\n'
+        'print(add(10, 20))\n'
+    )
+
+    # act
+    result = get_tokens(code)
+    renamed_result = get_tokens(renamed_code)
+
+    # assert
+    assert result == renamed_result
+
+
+def test_get_tokens__other_builtin__other_tokens():
+
+    # act
+    result = get_tokens('print(len(x))\n')
+    other_result = get_tokens('print(sum(x))\n')
+
+    # assert
+    assert result != other_result
+
+
+def test_get_tokens__syntax_error__raise_exception():
+
+    # act
+    with pytest.raises(SyntaxError):
+        get_tokens('def broken(:\n    pass')
+
+
+def test_get_kgram_hashes__ok():
+
+    # act
+    result = get_kgram_hashes([1, 2, 3, 1, 2, 3], k=3)
+
+    # assert
+    assert len(result) == 4
+    assert result[0] == result[3]
+    assert len(set(result)) == 3
+
+
+def test_get_kgram_hashes__short_sequence__single_hash():
+
+    # act
+    result = get_kgram_hashes([1, 2], k=5)
+
+    # assert
+    assert len(result) == 1
+
+
+def test_winnow__minimum_of_each_window():
+
+    # act
+    result = winnow([77, 74, 42, 17, 98, 50, 17, 98, 8, 88], window=4)
+
+    # assert
+    assert result == {17, 8}
+
+
+def test_get_fingerprints__identical_code__same_fingerprints():
+
+    # arrange
+    code = 'for i in range(10):\n    print(i * i)\n'
+
+    # act
+    result = get_fingerprints(code, k=5, window=4)
+
+    # assert
+    assert result
+    assert result == get_fingerprints(code, k=5, window=4)
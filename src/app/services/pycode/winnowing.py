@@ -0,0 +1,133 @@
+import ast
+import builtins
+import zlib
+from typing import Dict, FrozenSet, Iterator, List
+
+HASH_BASE = 1_000_003
+HASH_MODULUS = (1 << 61) - 1
+
+BUILTIN_NAMES = frozenset(dir(builtins))
+
+DOCSTRING_PARENTS = (
+    ast.Module,
+    ast.FunctionDef,
+    ast.AsyncFunctionDef,
+    ast.ClassDef,
+)
+
+SKIPPED_NODES = (
+    ast.expr_context,
+    ast.Import,
+    ast.ImportFrom,
+)
+
+
+def _is_docstring(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.Expr)
+        and isinstance(node.value, ast.Constant)
+        and isinstance(node.value.value, str)
+    )
+
+
+def _get_label(node: ast.AST) -> str:
+
+    """ Возвращает нормализованный токен узла AST: имена пользовательских
+    идентификаторов отбрасываются (имена встроенных функций сохраняются),
+    константы заменяются своим типом. """
+
+    label = type(node).__name__
+    if isinstance(node, ast.Name) and node.id in BUILTIN_NAMES:
+        return f'{label}:{node.id}'
+    if isinstance(node, ast.Constant):
+        return f'{label}:{type(node.value).__name__}'
+    return label
+
+
+def _iter_children(node: ast.AST) -> Iterator[ast.AST]:
+    skip_docstrings = isinstance(node, DOCSTRING_PARENTS)
+    for field in node._fields:
+        value = getattr(node, field, None)
+        if isinstance(value, list):
+            for item in value:
+                if not isinstance(item, ast.AST):
+                    continue
+                if isinstance(item, SKIPPED_NODES):
+                    continue
+                if skip_docstrings and _is_docstring(item):
+                    continue
+                yield item
+        elif isinstance(value, ast.AST):
+            if not isinstance(value, SKIPPED_NODES):
+                yield value
+
+
+def _iter_labels(tree: ast.AST) -> Iterator[str]:
+
+    """ Обходит AST в глубину и возвращает токены узлов, пропуская
+    строки документации, импорты и контекст (Load/Store). """
+
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        yield _get_label(node)
+        stack.extend(reversed(list(_iter_children(node))))
+
+
+_label_tokens: Dict[str, int] = {}
+
+
+def _get_token(label: str) -> int:
+    token = _label_tokens.get(label)
+    if token is None:
+        token = _label_tokens.setdefault(label, zlib.crc32(label.encode()))
+    return token
+
+
+def get_tokens(code: str) -> List[int]:
+
+    """ Возвращает нормализованную последовательность токенов программы
+    в виде чисел, не зависящих от процесса.
+
+    Вызывает SyntaxError, если код не удалось разобрать. """
+
+    return [_get_token(label) for label in _iter_labels(ast.parse(code))]
+
+
+def get_kgram_hashes(tokens: List[int], k: int) -> List[int]:
+
+    """ Возвращает скользящие полиномиальные хеши
+    всех k-грамм последовательности токенов. """
+
+    if len(tokens) < k:
+        k = len(tokens)
+    if not k:
+        return []
+    power = pow(HASH_BASE, k - 1, HASH_MODULUS)
+    current = 0
+    for token in tokens[:k]:
+        current = (current * HASH_BASE + token) % HASH_MODULUS
+    hashes = [current]
+    for index in range(k, len(tokens)):
+        current = (current - tokens[index - k] * power) % HASH_MODULUS
+        current = (current * HASH_BASE + tokens[index]) % HASH_MODULUS
+        hashes.append(current)
+    return hashes
+
+
+def winnow(hashes: List[int], window: int) -> FrozenSet[int]:
+
+    """ Выбирает отпечатки по алгоритму winnowing (MOSS): в каждом окне
+    из window подряд идущих хешей берется минимальный. """
+
+    if not hashes:
+        return frozenset()
+    window = min(window, len(hashes))
+    return frozenset(
+        min(hashes[start:start + window])
+        for start in range(len(hashes) - window + 1)
+    )
+
+
+def get_fingerprints(code: str, k: int, window: int) -> FrozenSet[int]:
+    return winnow(get_kgram_hashes(get_tokens(code), k), window)
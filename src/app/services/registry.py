@@ -0,0 +1,195 @@
+import importlib
+import threading
+import time
+from typing import Dict, Optional, Type
+
+from app.services import exceptions
+from app.services.base import (
+    AntiplagBaseService,
+    AntiplagPoolService,
+    reset_process_pool,
+    warm_up_process_pool,
+)
+
+
+class EngineRegistry:
+
+    """ Реестр детекторов плагиата, создаваемый один раз при запуске
+    приложения. Для каждого языка хранит экземпляры детекторов
+    и детектор по умолчанию, поэтому состояние детекторов (пул
+    процессов, кеши) сохраняется между запросами.
+
+    Новый детектор подключается вызовом register для каждого
+    поддерживаемого им языка. Детектор, зарегистрированный через
+    register_lazy, импортируется и запускается при первой проверке
+    на его языке, поэтому воркер не тратит время и память на модули
+    неиспользуемых детекторов. Время импорта и запуска каждого
+    детектора возвращает get_stats. """
+
+    def __init__(self):
+        self._services: Dict[str, Dict[str, AntiplagBaseService]] = {}
+        self._paths: Dict[str, Dict[str, str]] = {}
+        self._default_engines: Dict[str, str] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._started = False
+        self._lock = threading.RLock()
+
+    def register(
+        self,
+        lang: str,
+        service_cls: Type[AntiplagBaseService],
+        default: bool = False
+    ):
+
+        """ Регистрирует детектор service_cls для языка lang под именем
+        service_cls.engine. Первый зарегистрированный для языка
+        детектор, как и детектор с default=True, становится
+        детектором по умолчанию. """
+
+        self._add(lang, service_cls.engine, default)
+        self._services[lang][service_cls.engine] = service_cls()
+
+    def register_lazy(
+        self,
+        lang: str,
+        engine: str,
+        path: str,
+        default: bool = False
+    ):
+
+        """ Регистрирует детектор engine для языка lang, не импортируя
+        его. Путь к классу детектора задается в виде 'модуль:класс'. """
+
+        self._add(lang, engine, default)
+        self._paths.setdefault(lang, {})[engine] = path
+
+    def _add(self, lang: str, engine: str, default: bool):
+        self._services.setdefault(lang, {})
+        if default or lang not in self._default_engines:
+            self._default_engines[lang] = engine
+
+    def _is_registered(self, lang: str, engine: str) -> bool:
+        return (
+            engine in self._services.get(lang, {})
+            or engine in self._paths.get(lang, {})
+        )
+
+    def set_default_engine(self, lang: str, engine: str):
+        if not self._is_registered(lang, engine):
+            raise exceptions.EngineException(details=engine)
+        self._default_engines[lang] = engine
+
+    def get_service(
+        self,
+        lang: str,
+        engine: Optional[str] = None
+    ) -> AntiplagBaseService:
+
+        """ Возвращает детектор плагиата для языка. Если детектор
+        не указан в запросе, используется детектор по умолчанию. """
+
+        try:
+            services = self._services[lang]
+        except KeyError:
+            raise exceptions.LanguageException()
+        engine = engine or self._default_engines[lang]
+        try:
+            return services[engine]
+        except KeyError:
+            if not self._is_registered(lang, engine):
+                raise exceptions.EngineException()
+        return self._load(lang, engine)
+
+    def _load(self, lang: str, engine: str) -> AntiplagBaseService:
+
+        """ Импортирует и создает детектор, зарегистрированный
+        через register_lazy. Если приложение уже запущено,
+        детектор сразу запускается. Пул процессов при этом
+        не запускается: загрузка выполняется внутри запроса,
+        и процессы пула создаются по мере необходимости. """
+
+        with self._lock:
+            service = self._services[lang].get(engine)
+            if service is not None:
+                return service
+            module_name, _, class_name = (
+                self._paths[lang][engine].partition(':')
+            )
+            stats = self._stats.setdefault(
+                engine,
+                {'import_time': 0, 'boot_time': 0}
+            )
+            started = time.perf_counter()
+            service_cls = getattr(
+                importlib.import_module(module_name),
+                class_name
+            )
+            imported = time.perf_counter()
+            service = service_cls()
+            if self._started:
+                service.startup()
+            stats['import_time'] += imported - started
+            stats['boot_time'] += time.perf_counter() - imported
+            self._services[lang][engine] = service
+            return service
+
+    def load_all(self):
+
+        """ Импортирует и создает все детекторы, например,
+        в главном процессе gunicorn до запуска воркеров. """
+
+        for lang, paths in self._paths.items():
+            for engine in paths:
+                self._load(lang, engine)
+
+    def _get_all_services(self):
+        return [
+            service
+            for services in self._services.values()
+            for service in services.values()
+        ]
+
+    def startup(self):
+
+        """ Подготавливает загруженные детекторы к работе при запуске
+        приложения, чтобы первые запросы не тратили на это время.
+        Если загружен детектор, проверяющий кандидатов в общем пуле
+        процессов (детекторы загружены заранее, preload), пул тоже
+        запускается (warm_up_process_pool). """
+
+        with self._lock:
+            self._started = True
+            services = self._get_all_services()
+        for service in services:
+            started = time.perf_counter()
+            service.startup()
+            stats = self._stats.setdefault(
+                service.engine,
+                {'import_time': 0, 'boot_time': 0}
+            )
+            stats['boot_time'] += time.perf_counter() - started
+        if any(
+            isinstance(service, AntiplagPoolService)
+            for service in services
+        ):
+            warm_up_process_pool()
+
+    def shutdown(self):
+
+        """ Останавливает детекторы при завершении приложения,
+        дожидаясь окончания уже начатых проверок. """
+
+        for service in self._get_all_services():
+            service.shutdown()
+        reset_process_pool(wait=True)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+
+        """ Возвращает время (в секундах) импорта модулей и запуска
+        (создания и startup) каждого загруженного детектора. """
+
+        with self._lock:
+            return {
+                engine: dict(stats)
+                for engine, stats in self._stats.items()
+            }
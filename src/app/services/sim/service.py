@@ -1,80 +1,505 @@
-import subprocess
-import re
-from typing import List
-
-from app.services.enums import Lang
-from app.services.entities import (
-    Candidate,
-    CheckInput,
-    CheckResult
-)
-from app.services.utils import PlagFile
-from app.services import exceptions
-from app.services.base import AntiplagBaseService
-
-
-class SimService(AntiplagBaseService):
-
-    def _get_value_from_sim_console_output(
-        self,
-        sim_console_output: str
-    ) -> float:
-
-        """ Извлекает вычисленный процент плагиата из данных,
-        полученных в результате применения детектора SIM,
-        и возвращает его в виде вещественного числа. """
-
-        try:
-            if '%' in sim_console_output:
-                percent_char_index = sim_console_output.find('%')
-                value_fragment = sim_console_output[
-                    percent_char_index-4: percent_char_index
-                ]
-                str_value = re.findall(r'\b\d+\b', value_fragment)[-1]
-                result = int(str_value)/100
-            else:
-                result = 0
-        except (IndexError, ValueError) as ex:
-            raise exceptions.ParsingOutputException(details=str(ex))
-        else:
-            return result
-
-    def _call_sim(self, cmd: str) -> str:
-        return subprocess.getoutput(cmd=cmd)
-
-    def _get_reference_file(self, code: str, lang: str) -> PlagFile:
-        return PlagFile(code=code, lang=lang)
-
-    def _get_candidate_code_file(self, code: str, lang: str) -> PlagFile:
-        return PlagFile(code=code, lang=lang)
-
-    def check_plagiarism(self, data: CheckInput) -> CheckResult:
-
-        """ Проверка на плагиат исходного кода задач на языках,
-        поддерживаемых детектором SIM (C++, Java). """
-
-        lang: str = data['lang']
-        ref_code: str = data['ref_code']
-        candidates: List[Candidate] = data['candidates']
-
-        checker_module_name = 'sim_c++' if lang == Lang.CPP else 'sim_java'
-        checker_command = f'/usr/bin/{checker_module_name} -r4 -s -p'
-
-        reference_file = self._get_reference_file(lang=lang, code=ref_code)
-        reference_path = reference_file.filepath
-
-        plag_percent_by_uuids = {}
-        for candidate in candidates:
-            candidate_code_file = self._get_candidate_code_file(
-                code=candidate['code'],
-                lang=lang
-            )
-            candidate_path = candidate_code_file.filepath
-            cmd = f'{checker_command} {reference_path} {candidate_path}'
-            sim_cmd = self._call_sim(cmd=cmd)
-            plag_percent = self._get_value_from_sim_console_output(sim_cmd)
-            candidate_uuid = candidate['uuid']
-            plag_percent_by_uuids[candidate_uuid] = plag_percent
-            candidate_code_file.remove()
-        reference_file.remove()
-        return self._get_candidate_with_max_plag(plag_percent_by_uuids)
+import asyncio
+import math
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import (
+    SIM_CONCURRENCY,
+    SIM_SHARD_SIZE,
+    SIM_STREAM_SHARD_SIZE,
+    SIM_TIMEOUT,
+)
+from app.services.enums import Engine, Lang
+from app.services.entities import CheckInput, CheckResult
+from app.services.progress import is_tracking_scores, report_progress
+from app.services.utils import InputWorkspace, get_input_store
+from app.services import exceptions
+from app.services.base import AntiplagBaseService, ScoreKey
+
+
+class SimService(AntiplagBaseService):
+
+    engine = Engine.SIM
+    version = '1'
+
+    sim_output_line_pattern = re.compile(
+        r'^(?P<first>.+?) consists for (?P<percent>\d+) % '
+        r'of (?P<second>.+?) material',
+        flags=re.MULTILINE
+    )
+
+    def _get_values_from_sim_batch_output(
+        self,
+        sim_console_output: str,
+        reference_path: str,
+        uuids_by_path: Dict[str, List[str]]
+    ) -> Dict[str, float]:
+
+        """ Разбирает листинг SIM (опция -p), полученный при сравнении
+        эталона сразу с несколькими кандидатами, и возвращает процент
+        плагиата для каждого uuid кандидата.
+
+        Каждая строка листинга сопоставляется с кандидатом по пути к его
+        файлу. Если пара упоминается в обоих направлениях, берется
+        наибольшее значение. Кандидаты, не упомянутые в листинге,
+        получают 0. """
+
+        result = {
+            uuid: 0
+            for uuids in uuids_by_path.values()
+            for uuid in uuids
+        }
+        for match in self.sim_output_line_pattern.finditer(
+            sim_console_output
+        ):
+            if match['first'] == reference_path:
+                candidate_path = match['second']
+            elif match['second'] == reference_path:
+                candidate_path = match['first']
+            else:
+                continue
+            value = int(match['percent'])/100
+            for uuid in uuids_by_path.get(candidate_path, ()):
+                result[uuid] = max(result[uuid], value)
+        return result
+
+    async def _call_sim(self, args: List[str]) -> Optional[str]:
+
+        """ Запускает SIM напрямую, без командной оболочки, и возвращает
+        его вывод. Если процесс не завершился за SIM_TIMEOUT секунд,
+        он принудительно завершается и возвращается None. При отмене
+        задачи процесс также принудительно завершается. """
+
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(
+                process.communicate(),
+                timeout=SIM_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return None
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        return stdout.decode(errors='replace').rstrip('\n')
+
+    async def _call_sim_many(
+        self,
+        commands: List[List[str]],
+        on_output: Optional[Callable[[int, Optional[str]], bool]] = None,
+        on_start: Optional[Callable[[int], None]] = None
+    ) -> List[Optional[str]]:
+
+        """ Выполняет несколько запусков SIM одновременно,
+        не более SIM_CONCURRENCY процессов за раз.
+
+        Функция on_start вызывается с номером команды непосредственно
+        перед ее запуском.
+
+        Функция on_output вызывается с номером команды и ее выводом
+        по мере завершения запусков. Если она вернула True, остальные
+        запуски отменяются, а их вывод в результате равен None. """
+
+        semaphore = asyncio.Semaphore(max(SIM_CONCURRENCY, 1))
+        stopped = False
+
+        async def call(index: int, args: List[str]) -> Optional[str]:
+            nonlocal stopped
+            async with semaphore:
+                if stopped:
+                    return None
+                if on_start is not None:
+                    on_start(index)
+                output = await self._call_sim(args=args)
+                if on_output is not None and on_output(index, output):
+                    stopped = True
+                    for task in tasks:
+                        if task is not asyncio.current_task():
+                            task.cancel()
+                return output
+
+        tasks = [
+            asyncio.ensure_future(call(index, args))
+            for index, args in enumerate(commands)
+        ]
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return [
+            None if task.cancelled() else task.result()
+            for task in tasks
+        ]
+
+    def startup(self):
+
+        """ SIM запускается отдельными процессами без пула, поэтому
+        заранее создается только общее хранилище входных файлов. """
+
+        get_input_store()
+
+    def _get_workspace(self) -> InputWorkspace:
+        return InputWorkspace()
+
+    def _get_reference_file(
+        self,
+        workspace: InputWorkspace,
+        code: str,
+        lang: str
+    ) -> str:
+        return workspace.add(code=code, lang=lang)
+
+    def _get_candidate_code_file(
+        self,
+        workspace: InputWorkspace,
+        code: str,
+        lang: str
+    ) -> str:
+
+        """ Возвращает путь к файлу кандидата. Если включено общее
+        хранилище входных файлов, повторно встречающийся код
+        не записывается заново. """
+
+        store = get_input_store()
+        if store is not None:
+            return store.get_path(code=code, lang=lang)
+        return workspace.add(code=code, lang=lang)
+
+    def _refresh_candidate_files(
+        self,
+        paths: List[str],
+        lang: str,
+        candidate_paths: Dict[str, str]
+    ):
+
+        """ Обновляет время обращения к файлам кандидатов в общем
+        хранилище перед запуском SIM, чтобы очистка хранилища
+        не удалила их во время проверки из нескольких запусков.
+        В candidate_paths хранятся пути к файлам по исходному коду. """
+
+        store = get_input_store()
+        if store is None:
+            return
+        paths = set(paths)
+        store.refresh([
+            (code, lang)
+            for code, path in candidate_paths.items()
+            if path in paths
+        ])
+
+    def _get_checker_command(self, lang: str) -> List[str]:
+        checker_module_name = 'sim_c++' if lang == Lang.CPP else 'sim_java'
+        return [f'/usr/bin/{checker_module_name}', '-r4', '-s', '-p']
+
+    def get_version(self, lang: str) -> str:
+
+        """ Версия SIM определяется размером и временем изменения
+        исполняемого файла и опциями запуска, поэтому обновление
+        SIM или изменение опций сбрасывает кеш процентов плагиата. """
+
+        command = self._get_checker_command(lang)
+        try:
+            stat = os.stat(command[0])
+        except OSError:
+            binary_version = 'missing'
+        else:
+            binary_version = f'{stat.st_size}:{stat.st_mtime_ns}'
+        return ':'.join((self.version, binary_version, *command[1:]))
+
+    def _get_batch_command(
+        self,
+        lang: str,
+        reference_path: str,
+        candidate_paths: List[str]
+    ) -> List[str]:
+
+        """ Формирует команду для сравнения эталона с группой кандидатов
+        за один запуск SIM.
+
+        Эталон передается как "новый" файл, кандидаты - как "старые"
+        (после разделителя "/"). Опция -S отключает сравнение кандидатов
+        между собой, опция -e сравнивает каждую пару файлов отдельно,
+        поэтому проценты совпадают с попарным запуском. """
+
+        return [
+            *self._get_checker_command(lang),
+            '-e', '-S',
+            reference_path,
+            '/',
+            *candidate_paths
+        ]
+
+    def _get_shards(self, paths: List[str]) -> List[List[str]]:
+
+        """ Разбивает список файлов кандидатов на группы
+        не более SIM_SHARD_SIZE файлов примерно равного размера.
+        Небольшие списки обрабатываются за один запуск SIM. Если
+        проценты передаются по мере нахождения (is_tracking_scores),
+        группы не больше SIM_STREAM_SHARD_SIZE файлов. """
+
+        if not paths:
+            return []
+        max_size = SIM_SHARD_SIZE
+        if is_tracking_scores():
+            max_size = min(max_size, SIM_STREAM_SHARD_SIZE)
+        shards_count = math.ceil(len(paths) / max(max_size, 1))
+        shard_size = math.ceil(len(paths) / shards_count)
+        return [
+            paths[index: index + shard_size]
+            for index in range(0, len(paths), shard_size)
+        ]
+
+    def check_plagiarism(self, data: CheckInput) -> CheckResult:
+
+        """ Проверка на плагиат исходного кода задач на языках,
+        поддерживаемых детектором SIM (C++, Java). Если в запросе
+        задан порог, то после первой группы кандидатов, в которой
+        он достигнут, остальные запуски SIM отменяются. Кандидаты,
+        проценты которых есть в кеше, в SIM не передаются. Если SIM
+        не уложился в отведенное время ни для одного кандидата,
+        возбуждается TimeoutException. """
+
+        with self._get_workspace() as workspace:
+            return self._check_in_workspace(
+                data=data,
+                workspace=workspace,
+                candidate_paths={}
+            )
+
+    def check_plagiarism_many(
+        self,
+        data_list: List[CheckInput]
+    ) -> List[CheckResult]:
+
+        """ Проверяет несколько эталонов в одном рабочем каталоге:
+        файл каждого кандидата записывается один раз и передается
+        в SIM при проверке всех эталонов. """
+
+        if len(data_list) < 2:
+            return super().check_plagiarism_many(data_list)
+        with self._get_workspace() as workspace:
+            candidate_paths: Dict[str, str] = {}
+            return [
+                self._check_in_workspace(
+                    data=data,
+                    workspace=workspace,
+                    candidate_paths=candidate_paths
+                )
+                for data in data_list
+            ]
+
+    def get_scores_many(
+        self,
+        data_list: List[CheckInput]
+    ) -> List[Dict[str, float]]:
+
+        """ Проверяет несколько эталонов в одном рабочем каталоге.
+        Запуски SIM для всех эталонов выполняются одновременно
+        (не более SIM_CONCURRENCY процессов за раз). """
+
+        results = []
+        commands = []
+        shard_contexts = []
+        with self._get_workspace() as workspace:
+            candidate_paths: Dict[str, str] = {}
+            for data in data_list:
+                keys = self._get_score_keys(data)
+                scores, missing_data = self._get_cached_scores(data, keys)
+                results.append(scores)
+                if not missing_data['candidates']:
+                    continue
+                reference_path, uuids_by_path = self._add_files(
+                    workspace=workspace,
+                    data=missing_data,
+                    candidate_paths=candidate_paths
+                )
+                for shard in self._get_shards(list(uuids_by_path)):
+                    commands.append(self._get_batch_command(
+                        lang=data['lang'],
+                        reference_path=reference_path,
+                        candidate_paths=shard
+                    ))
+                    shard_contexts.append((
+                        reference_path,
+                        {path: uuids_by_path[path] for path in shard},
+                        keys,
+                        scores,
+                        data['lang']
+                    ))
+            workspace.flush()
+
+            def start_shard(index: int):
+                _, shard_uuids_by_path, _, _, lang = shard_contexts[index]
+                self._refresh_candidate_files(
+                    paths=list(shard_uuids_by_path),
+                    lang=lang,
+                    candidate_paths=candidate_paths
+                )
+
+            def add_output(index: int, output: Optional[str]) -> bool:
+                reference_path, shard_uuids_by_path, keys, scores, _ = (
+                    shard_contexts[index]
+                )
+                scores.update(self._get_shard_scores(
+                    output=output,
+                    reference_path=reference_path,
+                    uuids_by_path=shard_uuids_by_path,
+                    keys=keys
+                ))
+                return False
+
+            asyncio.run(self._call_sim_many(
+                commands,
+                on_output=add_output,
+                on_start=start_shard
+            ))
+
+        return [
+            self._get_ordered_scores(data, scores)
+            for data, scores in zip(data_list, results)
+        ]
+
+    def _add_files(
+        self,
+        workspace: InputWorkspace,
+        data: CheckInput,
+        candidate_paths: Dict[str, str]
+    ) -> Tuple[str, Dict[str, List[str]]]:
+
+        """ Размещает в workspace файлы эталона и кандидатов и
+        возвращает путь к файлу эталона и uuid кандидатов по путям
+        к их файлам. В candidate_paths хранятся пути к уже
+        записанным файлам кандидатов по их исходному коду. """
+
+        lang: str = data['lang']
+        reference_path = self._get_reference_file(
+            workspace=workspace,
+            lang=lang,
+            code=data['ref_code']
+        )
+        uuids_by_path = {}
+        for candidate in data['candidates']:
+            candidate_path = candidate_paths.get(candidate['code'])
+            if candidate_path is None:
+                candidate_path = self._get_candidate_code_file(
+                    workspace=workspace,
+                    code=candidate['code'],
+                    lang=lang
+                )
+                candidate_paths[candidate['code']] = candidate_path
+            uuids_by_path.setdefault(candidate_path, []).append(
+                candidate['uuid']
+            )
+        return reference_path, uuids_by_path
+
+    def _get_shard_scores(
+        self,
+        output: Optional[str],
+        reference_path: str,
+        uuids_by_path: Dict[str, List[str]],
+        keys: Dict[str, ScoreKey]
+    ) -> Dict[str, float]:
+
+        """ Возвращает проценты плагиата кандидатов группы по выводу
+        SIM и сохраняет их в кеш. """
+
+        if output is None:
+            # SIM не уложился в отведенное время:
+            # кандидаты группы остаются непроверенными
+            return {
+                uuid: -1
+                for uuids in uuids_by_path.values()
+                for uuid in uuids
+            }
+        scores = self._get_values_from_sim_batch_output(
+            sim_console_output=output,
+            reference_path=reference_path,
+            uuids_by_path=uuids_by_path
+        )
+        self._set_cached_scores(scores, keys)
+        return scores
+
+    def _check_in_workspace(
+        self,
+        data: CheckInput,
+        workspace: InputWorkspace,
+        candidate_paths: Dict[str, str]
+    ) -> CheckResult:
+
+        """ Проверяет эталон из data, размещая файлы в workspace. """
+
+        keys = self._get_score_keys(data)
+        plag_percent_by_uuids, missing_data = self._get_cached_scores(
+            data,
+            keys
+        )
+        if not missing_data['candidates'] or any(
+            self._is_threshold_reached(data, percent)
+            for percent in plag_percent_by_uuids.values()
+        ):
+            return self._get_candidate_with_max_plag(
+                self._get_ordered_scores(data, plag_percent_by_uuids)
+            )
+
+        report_progress(total=len(missing_data['candidates']))
+        reference_path, uuids_by_path = self._add_files(
+            workspace=workspace,
+            data=missing_data,
+            candidate_paths=candidate_paths
+        )
+        workspace.flush()
+
+        shards = self._get_shards(list(uuids_by_path))
+        commands = [
+            self._get_batch_command(
+                lang=data['lang'],
+                reference_path=reference_path,
+                candidate_paths=shard
+            )
+            for shard in shards
+        ]
+
+        def start_shard(index: int):
+            self._refresh_candidate_files(
+                paths=shards[index],
+                lang=data['lang'],
+                candidate_paths=candidate_paths
+            )
+
+        def add_output(index: int, output: Optional[str]) -> bool:
+            shard_result = self._get_shard_scores(
+                output=output,
+                reference_path=reference_path,
+                uuids_by_path={
+                    path: uuids_by_path[path] for path in shards[index]
+                },
+                keys=keys
+            )
+            plag_percent_by_uuids.update(shard_result)
+            report_progress(done=len(shard_result), scores=shard_result)
+            return any(
+                self._is_threshold_reached(data, percent)
+                for percent in shard_result.values()
+            )
+
+        asyncio.run(self._call_sim_many(
+            commands,
+            on_output=add_output,
+            on_start=start_shard
+        ))
+        if all(percent == -1 for percent in plag_percent_by_uuids.values()):
+            # Не проверен ни один кандидат: ответ -1 был бы
+            # неотличим от проверки, частично превысившей время
+            raise exceptions.TimeoutException(
+                details=f'SIM did not finish in {SIM_TIMEOUT} s'
+            )
+
+        # Результаты упорядочиваются так же, как кандидаты в запросе
+        return self._get_candidate_with_max_plag(
+            self._get_ordered_scores(data, plag_percent_by_uuids)
+        )
@@ -1,64 +1,17 @@
+import asyncio
+import os
+
 import pytest
-from app.services.main import SimService
+from app.services.sim.service import SimService
 from app.services.entities import (
     CheckInput,
     Candidate, CheckResult,
 )
-from app.services.exceptions import ParsingOutputException
+from app.services.exceptions import TimeoutException
 from app.services import messages
 from app.services.enums import Lang
-from app.services.utils import PlagFile
-
-
-def test_get_value_from_sim_console_output__ok():
-
-    # arrange
-    check_input = 'a1.cpp consists for 62 %_ of b2.cpp material'
-
-    check_result = 0.62
-
-    service = SimService()
-
-    # act
-    result = service._get_value_from_sim_console_output(
-        sim_console_output=check_input
-    )
-
-    # assert
-    assert result == check_result
-
-
-def test_get_value_from_sim_console_output__no_percent_symbol__ok():
-
-    # arrange
-    check_input = 'some console output'
-
-    service = SimService()
-
-    # act
-    result = service._get_value_from_sim_console_output(
-        sim_console_output=check_input
-    )
-
-    # assert
-    assert result == 0
-
-
-def test_get_value_from_sim_console_output__index_error__raise_exception():
-
-    # arrange
-    check_input = 'a1.cpp consists for 1a %_ of b2.cpp material'
-    service = SimService()
-
-    # act
-    with pytest.raises(ParsingOutputException) as ex:
-        service._get_value_from_sim_console_output(
-            sim_console_output=check_input
-        )
-
-    # assert
-    assert ex.value.message == messages.MSG_4
-    assert ex.value.details == 'list index out of range'
+from app.services.progress import Progress, track_progress
+from app.services.utils import InputStore, InputWorkspace
 
 
 def test_call_sim__language_cpp_identical_code__max_plagiarism():
@@ -75,30 +28,28 @@ def test_call_sim__language_cpp_identical_code__max_plagiarism():
     )
     candidate_code = ref_code
     service = SimService()
-    reference_file = PlagFile(code=ref_code, lang=Lang.CPP)
-    candidate_file = PlagFile(code=candidate_code, lang=Lang.CPP)
-    cmd = (
-        f'/usr/bin/sim_c++ -r4 -s -p '
-        f'{reference_file.filepath} {candidate_file.filepath}'
-    )
-    expected_output = (
-        f'File {reference_file.filepath}: 41 tokens, 7 lines\n'
-        f'File {candidate_file.filepath}: 41 tokens, 7 lines\n'
-        'Total input: 2 files (2 new, 0 old), 82 tokens\n'
-        '\n'
-        f'{reference_file.filepath} consists for 100 % '
-        f'of {candidate_file.filepath} material'
-    )
+    with InputWorkspace() as workspace:
+        reference_path = workspace.add(code=ref_code, lang=Lang.CPP)
+        candidate_path = workspace.add(code=candidate_code, lang=Lang.CPP)
+        workspace.flush()
+        args = [
+            '/usr/bin/sim_c++', '-r4', '-s', '-p',
+            reference_path, candidate_path
+        ]
+        expected_output = (
+            f'File {reference_path}: 41 tokens, 7 lines\n'
+            f'File {candidate_path}: 41 tokens, 7 lines\n'
+            'Total input: 2 files (2 new, 0 old), 82 tokens\n'
+            '\n'
+            f'{reference_path} consists for 100 % '
+            f'of {candidate_path} material'
+        )
 
-    try:
         # act
-        output = service._call_sim(cmd=cmd)
+        output = asyncio.run(service._call_sim(args=args))
 
-        # assert
-        assert output == expected_output
-    finally:
-        candidate_file.remove()
-        reference_file.remove()
+    # assert
+    assert output == expected_output
 
 
 def test_call_sim__language_cpp_different_code__min_plagiarism():
@@ -131,30 +82,28 @@ def test_call_sim__language_cpp_different_code__min_plagiarism():
         '}\n'
     )
     service = SimService()
-    reference_file = PlagFile(code=ref_code, lang=Lang.CPP)
-    candidate_file = PlagFile(code=candidate_code, lang=Lang.CPP)
-    cmd = (
-        f'/usr/bin/sim_c++ -r4 -s -p '
-        f'{reference_file.filepath} {candidate_file.filepath}'
-    )
-    expected_output = (
-        f'File {reference_file.filepath}: 41 tokens, 7 lines\n'
-        f'File {candidate_file.filepath}: 89 tokens, 15 lines\n'
-        'Total input: 2 files (2 new, 0 old), 130 tokens\n'
-        '\n'
-        f'{reference_file.filepath} consists for 61 % '
-        f'of {candidate_file.filepath} material'
-    )
+    with InputWorkspace() as workspace:
+        reference_path = workspace.add(code=ref_code, lang=Lang.CPP)
+        candidate_path = workspace.add(code=candidate_code, lang=Lang.CPP)
+        workspace.flush()
+        args = [
+            '/usr/bin/sim_c++', '-r4', '-s', '-p',
+            reference_path, candidate_path
+        ]
+        expected_output = (
+            f'File {reference_path}: 41 tokens, 7 lines\n'
+            f'File {candidate_path}: 89 tokens, 15 lines\n'
+            'Total input: 2 files (2 new, 0 old), 130 tokens\n'
+            '\n'
+            f'{reference_path} consists for 61 % '
+            f'of {candidate_path} material'
+        )
 
-    try:
         # act
-        output = service._call_sim(cmd=cmd)
+        output = asyncio.run(service._call_sim(args=args))
 
-        # assert
-        assert output == expected_output
-    finally:
-        candidate_file.remove()
-        reference_file.remove()
+    # assert
+    assert output == expected_output
 
 
 def test_call_sim__language_java_identical_code__max_plagiarism():
@@ -175,30 +124,28 @@ def test_call_sim__language_java_identical_code__max_plagiarism():
     )
     candidate_code = ref_code
     service = SimService()
-    reference_file = PlagFile(code=ref_code, lang=Lang.JAVA)
-    candidate_file = PlagFile(code=candidate_code, lang=Lang.JAVA)
-    cmd = (
-        f'/usr/bin/sim_java -r4 -s -p '
-        f'{reference_file.filepath} {candidate_file.filepath}'
-    )
-    expected_output = (
-        f'File {reference_file.filepath}: 63 tokens, 11 lines\n'
-        f'File {candidate_file.filepath}: 63 tokens, 11 lines\n'
-        'Total input: 2 files (2 new, 0 old), 126 tokens\n'
-        '\n'
-        f'{reference_file.filepath} consists for 100 % '
-        f'of {candidate_file.filepath} material'
-    )
+    with InputWorkspace() as workspace:
+        reference_path = workspace.add(code=ref_code, lang=Lang.JAVA)
+        candidate_path = workspace.add(code=candidate_code, lang=Lang.JAVA)
+        workspace.flush()
+        args = [
+            '/usr/bin/sim_java', '-r4', '-s', '-p',
+            reference_path, candidate_path
+        ]
+        expected_output = (
+            f'File {reference_path}: 63 tokens, 11 lines\n'
+            f'File {candidate_path}: 63 tokens, 11 lines\n'
+            'Total input: 2 files (2 new, 0 old), 126 tokens\n'
+            '\n'
+            f'{reference_path} consists for 100 % '
+            f'of {candidate_path} material'
+        )
 
-    try:
         # act
-        output = service._call_sim(cmd=cmd)
+        output = asyncio.run(service._call_sim(args=args))
 
-        # assert
-        assert output == expected_output
-    finally:
-        candidate_file.remove()
-        reference_file.remove()
+    # assert
+    assert output == expected_output
 
 
 def test_call_sim__language_java_different_code__min_plagiarism():
@@ -231,30 +178,141 @@ def test_call_sim__language_java_different_code__min_plagiarism():
         '}\n'
     )
     service = SimService()
-    reference_file = PlagFile(code=ref_code, lang=Lang.JAVA)
-    candidate_file = PlagFile(code=candidate_code, lang=Lang.JAVA)
-    cmd = (
-        f'/usr/bin/sim_java -r4 -s -p '
-        f'{reference_file.filepath} {candidate_file.filepath}'
-    )
-    expected_output = (
-        f'File {reference_file.filepath}: 63 tokens, 11 lines\n'
-        f'File {candidate_file.filepath}: 30 tokens, 11 lines\n'
-        'Total input: 2 files (2 new, 0 old), 93 tokens\n'
+    with InputWorkspace() as workspace:
+        reference_path = workspace.add(code=ref_code, lang=Lang.JAVA)
+        candidate_path = workspace.add(code=candidate_code, lang=Lang.JAVA)
+        workspace.flush()
+        args = [
+            '/usr/bin/sim_java', '-r4', '-s', '-p',
+            reference_path, candidate_path
+        ]
+        expected_output = (
+            f'File {reference_path}: 63 tokens, 11 lines\n'
+            f'File {candidate_path}: 30 tokens, 11 lines\n'
+            'Total input: 2 files (2 new, 0 old), 93 tokens\n'
+            '\n'
+            f'{reference_path} consists for 6 % '
+            f'of {candidate_path} material'
+        )
+
+        # act
+        output = asyncio.run(service._call_sim(args=args))
+
+    # assert
+    assert output == expected_output
+
+
+def test_get_values_from_sim_batch_output__ok():
+
+    # arrange
+    sim_console_output = (
+        'File /tmp/ref.cpp: 41 tokens, 7 lines\n'
+        'File /tmp/c1.cpp: 41 tokens, 7 lines\n'
+        'File /tmp/c2.cpp: 89 tokens, 15 lines\n'
+        'File /tmp/c3.cpp: 10 tokens, 2 lines\n'
+        'Total input: 4 files (1 new, 3 old), 181 tokens\n'
         '\n'
-        f'{reference_file.filepath} consists for 6 % '
-        f'of {candidate_file.filepath} material'
+        '/tmp/ref.cpp consists for 100 % of /tmp/c1.cpp material\n'
+        '/tmp/ref.cpp consists for 61 % of /tmp/c2.cpp material\n'
+        '/tmp/c2.cpp consists for 28 % of /tmp/ref.cpp material'
+    )
+    uuids_by_path = {
+        '/tmp/c1.cpp': ['uuid-1'],
+        '/tmp/c2.cpp': ['uuid-2', 'uuid-2-copy'],
+        '/tmp/c3.cpp': ['uuid-3'],
+    }
+    service = SimService()
+
+    # act
+    result = service._get_values_from_sim_batch_output(
+        sim_console_output=sim_console_output,
+        reference_path='/tmp/ref.cpp',
+        uuids_by_path=uuids_by_path
     )
 
-    try:
-        # act
-        output = service._call_sim(cmd=cmd)
+    # assert
+    assert result == {
+        'uuid-1': 1.0,
+        'uuid-2': 0.61,
+        'uuid-2-copy': 0.61,
+        'uuid-3': 0,
+    }
 
-        # assert
-        assert output == expected_output
-    finally:
-        candidate_file.remove()
-        reference_file.remove()
+
+def test_get_values_from_sim_batch_output__no_percent_lines__zero():
+
+    # arrange
+    service = SimService()
+
+    # act
+    result = service._get_values_from_sim_batch_output(
+        sim_console_output='some console output',
+        reference_path='/tmp/ref.cpp',
+        uuids_by_path={'/tmp/c1.cpp': ['uuid-1']}
+    )
+
+    # assert
+    assert result == {'uuid-1': 0}
+
+
+def test_get_batch_command__language_cpp__ok():
+
+    # arrange
+    service = SimService()
+
+    # act
+    result = service._get_batch_command(
+        lang=Lang.CPP,
+        reference_path='/tmp/ref.cpp',
+        candidate_paths=['/tmp/c1.cpp', '/tmp/c2.cpp']
+    )
+
+    # assert
+    assert result == [
+        '/usr/bin/sim_c++', '-r4', '-s', '-p', '-e', '-S',
+        '/tmp/ref.cpp', '/', '/tmp/c1.cpp', '/tmp/c2.cpp'
+    ]
+
+
+def test_get_shards__small_list__single_shard(mocker):
+
+    # arrange
+    mocker.patch('app.services.sim.service.SIM_SHARD_SIZE', 3)
+    service = SimService()
+
+    # act
+    result = service._get_shards(['a', 'b', 'c'])
+
+    # assert
+    assert result == [['a', 'b', 'c']]
+
+
+def test_get_shards__large_list__balanced_shards(mocker):
+
+    # arrange
+    mocker.patch('app.services.sim.service.SIM_SHARD_SIZE', 3)
+    service = SimService()
+
+    # act
+    result = service._get_shards(['a', 'b', 'c', 'd', 'e'])
+
+    # assert
+    assert result == [['a', 'b', 'c'], ['d', 'e']]
+
+
+def test_get_shards__tracking_scores__stream_shard_size(mocker):
+
+    # arrange
+    mocker.patch('app.services.sim.service.SIM_SHARD_SIZE', 250)
+    mocker.patch('app.services.sim.service.SIM_STREAM_SHARD_SIZE', 2)
+    service = SimService()
+
+    # act
+    with track_progress(Progress(on_scores=lambda scores: None)):
+        result = service._get_shards(['a', 'b', 'c', 'd', 'e'])
+
+    # assert
+    assert result == [['a', 'b'], ['c', 'd'], ['e']]
 
 
 def test_check_plagiarism__language_cpp_check_plagiarism__ok(mocker):
@@ -262,44 +320,46 @@ def test_check_plagiarism__language_cpp_check_plagiarism__ok(mocker):
     # arrange
     lang = Lang.CPP
     ref_code = 'some reference code'
-    candidate = Candidate(
-        uuid='9asd2',
-        code='some candidate code'
-    )
     check_input = CheckInput(
         lang=lang,
         ref_code=ref_code,
-        candidates=[candidate]
+        candidates=[
+            Candidate(uuid='9asd2', code='some candidate code'),
+            Candidate(uuid='7fgh1', code='other candidate code'),
+        ]
     )
     check_result = CheckResult(
-        uuid='9asd2!2',
-        percent=50.9
+        uuid='9asd2',
+        percent=0.62
     )
 
-    plag_percent_by_uuids = {'9asd2': 50.9}
-    sim_cmd_output = 'some console output'
-
-    reference_file_mock = mocker.Mock()
-    reference_file_mock.filepath = '/some/reference_file.cpp'
+    workspace_mock = mocker.MagicMock()
+    workspace_mock.__enter__.return_value = workspace_mock
+    mocker.patch(
+        'app.services.sim.service.SimService._get_workspace',
+        return_value=workspace_mock
+    )
     get_reference_file_mock = mocker.patch(
         'app.services.sim.service.SimService._get_reference_file',
-        return_value=reference_file_mock
+        return_value='/some/reference_file.cpp'
     )
-    candidate_file_mock = mocker.Mock()
-    candidate_file_mock.filepath = '/some/candidate_file.cpp'
     get_candidate_file_mock = mocker.patch(
         'app.services.sim.service.SimService._get_candidate_code_file',
-        return_value=candidate_file_mock
+        side_effect=[
+            '/some/candidate_file_1.cpp',
+            '/some/candidate_file_2.cpp'
+        ]
+    )
+    sim_cmd_output = (
+        '/some/reference_file.cpp consists for 62 % '
+        'of /some/candidate_file_1.cpp material\n'
+        '/some/reference_file.cpp consists for 15 % '
+        'of /some/candidate_file_2.cpp material'
     )
     call_sim_mock = mocker.patch(
         'app.services.sim.service.SimService._call_sim',
         return_value=sim_cmd_output
     )
-    get_value_from_sim_console_output_mock = mocker.patch(
-        'app.services.sim.service.SimService'
-        '._get_value_from_sim_console_output',
-        return_value=50.9
-    )
     get_candidate_with_max_plag_mock = mocker.patch(
         'app.services.sim.service.SimService._get_candidate_with_max_plag',
         return_value=check_result
@@ -310,24 +370,34 @@ def test_check_plagiarism__language_cpp_check_plagiarism__ok(mocker):
     result = service.check_plagiarism(data=check_input)
 
     # assert
-    get_reference_file_mock.assert_called_once_with(lang=lang, code=ref_code)
+    get_reference_file_mock.assert_called_once_with(
+        workspace=workspace_mock,
+        lang=lang,
+        code=ref_code
+    )
     get_candidate_file_mock.assert_has_calls([
-        mocker.call(lang=lang, code=candidate['code'])
-    ])
-    call_sim_mock.assert_has_calls([
         mocker.call(
-            cmd=f'/usr/bin/sim_c++ -r4 -s -p '
-                f'{reference_file_mock.filepath} '
-                f'{candidate_file_mock.filepath}'
-        )
-    ])
-    get_value_from_sim_console_output_mock.assert_has_calls([
-        mocker.call(sim_cmd_output)
+            workspace=workspace_mock,
+            lang=lang,
+            code='some candidate code'
+        ),
+        mocker.call(
+            workspace=workspace_mock,
+            lang=lang,
+            code='other candidate code'
+        ),
     ])
-    assert candidate_file_mock.remove.call_count == 1
-    reference_file_mock.remove.assert_called_once()
+    workspace_mock.flush.assert_called_once()
+    call_sim_mock.assert_called_once_with(
+        args=[
+            '/usr/bin/sim_c++', '-r4', '-s', '-p', '-e', '-S',
+            '/some/reference_file.cpp', '/',
+            '/some/candidate_file_1.cpp', '/some/candidate_file_2.cpp'
+        ]
+    )
+    workspace_mock.__exit__.assert_called_once()
     get_candidate_with_max_plag_mock.assert_called_once_with(
-        plag_percent_by_uuids
+        {'9asd2': 0.62, '7fgh1': 0.15}
     )
     assert result == check_result
 
@@ -347,34 +417,32 @@ def test_check_plagiarism__language_java_check_plagiarism__ok(mocker):
         candidates=[candidate]
     )
     check_result = CheckResult(
-        uuid='9asd2!2',
-        percent=50.9
+        uuid='9asd2',
+        percent=0.5
     )
 
-    plag_percent_by_uuids = {'9asd2': 50.9}
-    sim_cmd_output = 'some console output'
-
-    reference_file_mock = mocker.Mock()
-    reference_file_mock.filepath = '/some/reference_file.cpp'
+    workspace_mock = mocker.MagicMock()
+    workspace_mock.__enter__.return_value = workspace_mock
+    mocker.patch(
+        'app.services.sim.service.SimService._get_workspace',
+        return_value=workspace_mock
+    )
     get_reference_file_mock = mocker.patch(
         'app.services.sim.service.SimService._get_reference_file',
-        return_value=reference_file_mock
+        return_value='/some/reference_file.java'
     )
-    candidate_file_mock = mocker.Mock()
-    candidate_file_mock.filepath = '/some/candidate_file.cpp'
     get_candidate_file_mock = mocker.patch(
         'app.services.sim.service.SimService._get_candidate_code_file',
-        return_value=candidate_file_mock
+        return_value='/some/candidate_file.java'
+    )
+    sim_cmd_output = (
+        '/some/candidate_file.java consists for 50 % '
+        'of /some/reference_file.java material'
     )
     call_sim_mock = mocker.patch(
         'app.services.sim.service.SimService._call_sim',
         return_value=sim_cmd_output
     )
-    get_value_from_sim_console_output_mock = mocker.patch(
-        'app.services.sim.service.SimService'
-        '._get_value_from_sim_console_output',
-        return_value=50.9
-    )
     get_candidate_with_max_plag_mock = mocker.patch(
         'app.services.sim.service.SimService._get_candidate_with_max_plag',
         return_value=check_result
@@ -385,91 +453,553 @@ def test_check_plagiarism__language_java_check_plagiarism__ok(mocker):
     result = service.check_plagiarism(data=check_input)
 
     # assert
-    get_reference_file_mock.assert_called_once_with(lang=lang, code=ref_code)
-    get_candidate_file_mock.assert_has_calls([
-        mocker.call(lang=lang, code=candidate['code'])
-    ])
-    call_sim_mock.assert_has_calls([
-        mocker.call(
-            cmd=f'/usr/bin/sim_java -r4 -s -p '
-                f'{reference_file_mock.filepath} '
-                f'{candidate_file_mock.filepath}'
-        )
-    ])
-    get_value_from_sim_console_output_mock.assert_has_calls([
-        mocker.call(sim_cmd_output)
-    ])
-    assert candidate_file_mock.remove.call_count == 1
-    reference_file_mock.remove.assert_called_once()
-    get_candidate_with_max_plag_mock.assert_called_once_with(
-        plag_percent_by_uuids
+    get_reference_file_mock.assert_called_once_with(
+        workspace=workspace_mock,
+        lang=lang,
+        code=ref_code
+    )
+    get_candidate_file_mock.assert_called_once_with(
+        workspace=workspace_mock,
+        lang=lang,
+        code=candidate['code']
+    )
+    workspace_mock.flush.assert_called_once()
+    call_sim_mock.assert_called_once_with(
+        args=[
+            '/usr/bin/sim_java', '-r4', '-s', '-p', '-e', '-S',
+            '/some/reference_file.java', '/', '/some/candidate_file.java'
+        ]
     )
+    workspace_mock.__exit__.assert_called_once()
+    get_candidate_with_max_plag_mock.assert_called_once_with({'9asd2': 0.5})
     assert result == check_result
 
 
-def test_get_reference_file__language_cpp__ok():
+def test_check_plagiarism__sim_error__workspace_removed(mocker, tmp_path):
 
     # arrange
-    code = 'int main() { return 0; }'
+    check_input = CheckInput(
+        lang=Lang.CPP,
+        ref_code='some reference code',
+        candidates=[Candidate(uuid='9asd2', code='some candidate code')]
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._get_workspace',
+        return_value=InputWorkspace(directory=str(tmp_path))
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._call_sim',
+        side_effect=OSError('sim failed')
+    )
     service = SimService()
 
     # act
-    result = service._get_reference_file(code=code, lang=Lang.CPP)
+    with pytest.raises(OSError):
+        service.check_plagiarism(data=check_input)
 
-    try:
-        # assert
-        assert isinstance(result, PlagFile)
-        assert result.filename.endswith('.cpp')
-    finally:
-        result.remove()
+    # assert
+    assert list(tmp_path.iterdir()) == []
 
 
-def test_get_reference_file__language_java__ok():
+def test_call_sim__timeout__process_killed(mocker):
 
     # arrange
-    code = 'public class Ref { public static void main(String[] args) {} }'
+    mocker.patch('app.services.sim.service.SIM_TIMEOUT', 0.1)
     service = SimService()
 
     # act
-    result = service._get_reference_file(code=code, lang=Lang.JAVA)
+    output = asyncio.run(service._call_sim(args=['sleep', '5']))
 
-    try:
-        # assert
-        assert isinstance(result, PlagFile)
-        assert result.filename.endswith('.java')
-    finally:
-        result.remove()
+    # assert
+    assert output is None
 
 
-def test_get_candidate_code_file__language_cpp__ok():
+def test_call_sim_many__concurrency_limited(mocker):
 
     # arrange
-    code = 'int main() { return 0; }'
+    mocker.patch('app.services.sim.service.SIM_CONCURRENCY', 2)
+    running = 0
+    max_running = 0
+
+    async def call_sim(args):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return args[0]
+
+    service = SimService()
+    mocker.patch.object(service, '_call_sim', side_effect=call_sim)
+
+    # act
+    outputs = asyncio.run(
+        service._call_sim_many([['a'], ['b'], ['c'], ['d'], ['e']])
+    )
+
+    # assert
+    assert outputs == ['a', 'b', 'c', 'd', 'e']
+    assert max_running == 2
+
+
+def test_check_plagiarism__sim_timeout__candidates_unscored(mocker):
+
+    # arrange
+    mocker.patch('app.services.sim.service.SIM_SHARD_SIZE', 1)
+    check_input = CheckInput(
+        lang=Lang.CPP,
+        ref_code='some reference code',
+        candidates=[
+            Candidate(uuid='9asd2', code='some candidate code'),
+            Candidate(uuid='7fgh1', code='other candidate code'),
+        ]
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._get_reference_file',
+        return_value='/some/reference_file.cpp'
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._get_candidate_code_file',
+        side_effect=[
+            '/some/candidate_file_1.cpp',
+            '/some/candidate_file_2.cpp'
+        ]
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._call_sim',
+        side_effect=[
+            None,
+            '/some/reference_file.cpp consists for 40 % '
+            'of /some/candidate_file_2.cpp material'
+        ]
+    )
+    service = SimService()
+
+    # act
+    result = service.check_plagiarism(data=check_input)
+
+    # assert
+    assert result == CheckResult(uuid='7fgh1', percent=0.4)
+
+
+def test_check_plagiarism__all_shards_timed_out__timeout_error(mocker):
+
+    # arrange
+    mocker.patch('app.services.sim.service.SIM_SHARD_SIZE', 1)
+    check_input = CheckInput(
+        lang=Lang.CPP,
+        ref_code='some reference code',
+        candidates=[
+            Candidate(uuid='9asd2', code='some candidate code'),
+            Candidate(uuid='7fgh1', code='other candidate code'),
+        ]
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._get_reference_file',
+        return_value='/some/reference_file.cpp'
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._get_candidate_code_file',
+        side_effect=[
+            '/some/candidate_file_1.cpp',
+            '/some/candidate_file_2.cpp'
+        ]
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._call_sim',
+        return_value=None
+    )
     service = SimService()
 
     # act
-    result = service._get_candidate_code_file(code=code, lang=Lang.CPP)
+    with pytest.raises(TimeoutException) as ex:
+        service.check_plagiarism(data=check_input)
+
+    # assert
+    assert ex.value.message == messages.MSG_10
+
+
+def test_get_reference_file__language_cpp__ok(tmp_path):
+
+    # arrange
+    code = 'int main() { return 0; }'
+    service = SimService()
+
+    with InputWorkspace(directory=str(tmp_path)) as workspace:
+        # act
+        result = service._get_reference_file(
+            workspace=workspace,
+            code=code,
+            lang=Lang.CPP
+        )
+        workspace.flush()
 
-    try:
         # assert
-        assert isinstance(result, PlagFile)
-        assert result.filename.endswith('.cpp')
-    finally:
-        result.remove()
+        assert result.startswith(workspace.path)
+        assert result.endswith('.cpp')
+        with open(result) as file:
+            assert file.read() == code
 
 
-def test_get_candidate_code_file__language_java__ok():
+def test_get_candidate_code_file__language_java__ok(tmp_path):
 
     # arrange
     code = 'public class Cand { public static void main(String[] args) {} }'
     service = SimService()
 
-    # act
-    result = service._get_candidate_code_file(code=code, lang=Lang.JAVA)
+    with InputWorkspace(directory=str(tmp_path)) as workspace:
+        # act
+        result = service._get_candidate_code_file(
+            workspace=workspace,
+            code=code,
+            lang=Lang.JAVA
+        )
+        workspace.flush()
 
-    try:
         # assert
-        assert isinstance(result, PlagFile)
-        assert result.filename.endswith('.java')
-    finally:
-        result.remove()
+        assert result.startswith(workspace.path)
+        assert result.endswith('.java')
+        with open(result) as file:
+            assert file.read() == code
+
+
+def test_input_workspace__exception__directory_removed(tmp_path):
+
+    # act
+    with pytest.raises(ValueError):
+        with InputWorkspace(directory=str(tmp_path)) as workspace:
+            workspace.add(code='int main() {}', lang=Lang.CPP)
+            workspace.flush()
+            raise ValueError()
+
+    # assert
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_get_candidate_code_file__store_enabled__store_path(
+    mocker,
+    tmp_path
+):
+
+    # arrange
+    store_mock = mocker.Mock()
+    store_mock.get_path.return_value = '/store/ab/abcdef.cpp'
+    mocker.patch(
+        'app.services.sim.service.get_input_store',
+        return_value=store_mock
+    )
+    code = 'int main() { return 0; }'
+    service = SimService()
+
+    with InputWorkspace(directory=str(tmp_path)) as workspace:
+        # act
+        result = service._get_candidate_code_file(
+            workspace=workspace,
+            code=code,
+            lang=Lang.CPP
+        )
+
+    # assert
+    assert result == '/store/ab/abcdef.cpp'
+    store_mock.get_path.assert_called_once_with(code=code, lang=Lang.CPP)
+
+
+def test_check_plagiarism__file_evicted_between_shards__file_restored(
+    mocker,
+    tmp_path
+):
+
+    # arrange
+    mocker.patch('app.services.sim.service.SIM_SHARD_SIZE', 1)
+    mocker.patch('app.services.sim.service.SIM_CONCURRENCY', 1)
+    store = InputStore(directory=str(tmp_path / 'store'), max_size=1024)
+    mocker.patch(
+        'app.services.sim.service.get_input_store',
+        return_value=store
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._get_workspace',
+        return_value=InputWorkspace(directory=str(tmp_path))
+    )
+    check_input = CheckInput(
+        lang=Lang.CPP,
+        ref_code='some reference code',
+        candidates=[
+            Candidate(uuid='9asd2', code='some candidate code'),
+            Candidate(uuid='7fgh1', code='other candidate code'),
+        ]
+    )
+    second_path = store.get_path(code='other candidate code', lang=Lang.CPP)
+    existing = []
+
+    async def call_sim(args):
+        existing.append(os.path.exists(args[-1]))
+        # Очистка хранилища другим воркером во время первого запуска
+        if os.path.exists(second_path):
+            os.unlink(second_path)
+        return ''
+
+    mocker.patch(
+        'app.services.sim.service.SimService._call_sim',
+        side_effect=call_sim
+    )
+
+    # act
+    SimService().check_plagiarism(data=check_input)
+
+    # assert
+    assert existing == [True, True]
+
+
+def test_call_sim_many__on_output_true__rest_cancelled(mocker):
+
+    # arrange
+    mocker.patch('app.services.sim.service.SIM_CONCURRENCY', 1)
+    started = []
+
+    async def call_sim(args):
+        started.append(args[0])
+        await asyncio.sleep(0.01)
+        return args[0]
+
+    service = SimService()
+    mocker.patch.object(service, '_call_sim', side_effect=call_sim)
+    on_output = mocker.Mock(side_effect=[False, True])
+
+    # act
+    outputs = asyncio.run(
+        service._call_sim_many(
+            [['a'], ['b'], ['c'], ['d']],
+            on_output=on_output
+        )
+    )
+
+    # assert
+    assert outputs == ['a', 'b', None, None]
+    assert started == ['a', 'b']
+    assert on_output.call_args_list == [
+        mocker.call(0, 'a'),
+        mocker.call(1, 'b'),
+    ]
+
+
+def test_call_sim__cancelled__process_killed():
+
+    # arrange
+    service = SimService()
+
+    async def cancel_call_sim():
+        task = asyncio.ensure_future(service._call_sim(args=['sleep', '5']))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    # act
+    cancelled = asyncio.run(asyncio.wait_for(cancel_call_sim(), timeout=2))
+
+    # assert
+    assert cancelled
+
+
+def test_check_plagiarism__threshold_reached__rest_shards_skipped(mocker):
+
+    # arrange
+    mocker.patch('app.services.sim.service.SIM_SHARD_SIZE', 1)
+    mocker.patch('app.services.sim.service.SIM_CONCURRENCY', 1)
+    check_input = CheckInput(
+        lang=Lang.CPP,
+        ref_code='some reference code',
+        candidates=[
+            Candidate(uuid='9asd2', code='some candidate code'),
+            Candidate(uuid='7fgh1', code='other candidate code'),
+            Candidate(uuid='3klm5', code='third candidate code'),
+        ],
+        threshold=0.8
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._get_reference_file',
+        return_value='/some/reference_file.cpp'
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._get_candidate_code_file',
+        side_effect=[
+            '/some/candidate_file_1.cpp',
+            '/some/candidate_file_2.cpp',
+            '/some/candidate_file_3.cpp',
+        ]
+    )
+    call_sim_mock = mocker.patch(
+        'app.services.sim.service.SimService._call_sim',
+        side_effect=[
+            '/some/reference_file.cpp consists for 90 % '
+            'of /some/candidate_file_1.cpp material',
+            '/some/reference_file.cpp consists for 95 % '
+            'of /some/candidate_file_2.cpp material',
+            '/some/reference_file.cpp consists for 99 % '
+            'of /some/candidate_file_3.cpp material',
+        ]
+    )
+    service = SimService()
+
+    # act
+    result = service.check_plagiarism(data=check_input)
+
+    # assert
+    assert call_sim_mock.call_count == 1
+    assert result == CheckResult(uuid='9asd2', percent=0.9)
+
+
+def test_check_plagiarism__cached_scores__sim_not_called_again(mocker):
+
+    # arrange
+    mocker.patch('app.services.sim.service.SIM_SHARD_SIZE', 1)
+    check_input = CheckInput(
+        lang=Lang.CPP,
+        ref_code='some reference code',
+        candidates=[
+            Candidate(uuid='9asd2', code='some candidate code'),
+            Candidate(uuid='7fgh1', code='other candidate code'),
+        ]
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._get_reference_file',
+        return_value='/some/reference_file.cpp'
+    )
+    mocker.patch(
+        'app.services.sim.service.SimService._get_candidate_code_file',
+        side_effect=[
+            '/some/candidate_file_1.cpp',
+            '/some/candidate_file_2.cpp',
+            '/some/candidate_file_1.cpp',
+        ]
+    )
+    call_sim_mock = mocker.patch(
+        'app.services.sim.service.SimService._call_sim',
+        side_effect=[
+            None,
+            '/some/reference_file.cpp consists for 40 % '
+            'of /some/candidate_file_2.cpp material',
+            '/some/reference_file.cpp consists for 70 % '
+            'of /some/candidate_file_1.cpp material',
+        ]
+    )
+    service = SimService()
+    service.check_plagiarism(data=check_input)
+
+    # act
+    result = service.check_plagiarism(data=check_input)
+
+    # assert
+    assert call_sim_mock.call_count == 3
+    assert call_sim_mock.call_args.kwargs['args'][-1] == (
+        '/some/candidate_file_1.cpp'
+    )
+    assert result == CheckResult(uuid='9asd2', percent=0.7)
+
+
+def test_check_plagiarism_many__candidate_files_written_once(mocker):
+
+    # arrange
+    candidates = [
+        Candidate(uuid='9asd2', code='some candidate code'),
+        Candidate(uuid='7fgh1', code='other candidate code'),
+    ]
+    data_list = [
+        CheckInput(lang=Lang.CPP, ref_code=ref_code, candidates=candidates)
+        for ref_code in ('first reference', 'second reference')
+    ]
+    mocker.patch(
+        'app.services.sim.service.SimService._get_reference_file',
+        side_effect=['/some/reference_1.cpp', '/some/reference_2.cpp']
+    )
+    get_candidate_code_file_mock = mocker.patch(
+        'app.services.sim.service.SimService._get_candidate_code_file',
+        side_effect=['/some/candidate_1.cpp', '/some/candidate_2.cpp']
+    )
+    call_sim_mock = mocker.patch(
+        'app.services.sim.service.SimService._call_sim',
+        side_effect=[
+            '/some/reference_1.cpp consists for 40 % '
+            'of /some/candidate_2.cpp material',
+            '/some/reference_2.cpp consists for 70 % '
+            'of /some/candidate_1.cpp material',
+        ]
+    )
+
+    # act
+    result = SimService().check_plagiarism_many(data_list)
+
+    # assert
+    assert get_candidate_code_file_mock.call_count == 2
+    assert call_sim_mock.call_count == 2
+    assert result == [
+        CheckResult(uuid='7fgh1', percent=0.4),
+        CheckResult(uuid='9asd2', percent=0.7),
+    ]
+
+
+def test_get_scores_many__all_candidates_scored(mocker):
+
+    # arrange
+    candidates = [
+        Candidate(uuid='9asd2', code='some candidate code'),
+        Candidate(uuid='7fgh1', code='other candidate code'),
+    ]
+    data_list = [
+        CheckInput(
+            lang=Lang.CPP,
+            ref_code='first reference',
+            candidates=candidates,
+        ),
+        CheckInput(
+            lang=Lang.CPP,
+            ref_code='second reference',
+            candidates=candidates[:1]
+        ),
+    ]
+    mocker.patch(
+        'app.services.sim.service.SimService._get_reference_file',
+        side_effect=['/some/reference_1.cpp', '/some/reference_2.cpp']
+    )
+    get_candidate_code_file_mock = mocker.patch(
+        'app.services.sim.service.SimService._get_candidate_code_file',
+        side_effect=['/some/candidate_1.cpp', '/some/candidate_2.cpp']
+    )
+    call_sim_many_mock = mocker.patch(
+        'app.services.sim.service.SimService._call_sim',
+        side_effect=[
+            '/some/reference_1.cpp consists for 40 % '
+            'of /some/candidate_2.cpp material',
+            '/some/reference_2.cpp consists for 70 % '
+            'of /some/candidate_1.cpp material',
+        ]
+    )
+
+    # act
+    result = SimService().get_scores_many(data_list)
+
+    # assert
+    assert get_candidate_code_file_mock.call_count == 2
+    assert call_sim_many_mock.call_count == 2
+    assert result == [{'9asd2': 0, '7fgh1': 0.4}, {'9asd2': 0.7}]
+
+
+def test_get_version__binary_changed__version_changed(mocker):
+
+    # arrange
+    stat_mock = mocker.patch('app.services.sim.service.os.stat')
+    stat_mock.return_value.st_size = 100
+    stat_mock.return_value.st_mtime_ns = 1
+    service = SimService()
+    version = service.get_version(Lang.CPP)
+    stat_mock.return_value.st_mtime_ns = 2
+
+    # act
+    new_version = service.get_version(Lang.CPP)
+
+    # assert
+    assert new_version != version
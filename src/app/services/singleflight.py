@@ -0,0 +1,154 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.config import SINGLE_FLIGHT_ENABLED
+from app.services import exceptions
+from app.services.cache import get_hash
+from app.services.entities import CheckInput
+from app.services.metrics import metrics
+from app.services.store import FlightStore, get_flight_store
+
+
+def get_request_key(data: CheckInput) -> str:
+
+    """ Возвращает хеш данных запроса, не зависящий от порядка
+    полей. Порядок кандидатов учитывается: от него зависит выбор
+    кандидата при равных процентах плагиата. """
+
+    return get_hash(json.dumps(data, sort_keys=True, ensure_ascii=False))
+
+
+class Flight:
+
+    """ Выполняемое в воркере вычисление и его результат. """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+
+    """ Объединяет одновременные вычисления с одинаковым ключом.
+
+    Первый вызов do с ключом выполняет функцию, а вызовы с тем же
+    ключом, поступившие до его завершения, ждут и получают тот же
+    результат или то же исключение. Если включена общая база
+    (get_flight_store), вычисления объединяются и между воркерами:
+    результат передается через базу в виде JSON, ошибки сервиса
+    (ServiceException) передаются с типом, сообщением и деталями.
+    При других ошибках ведущего воркера ожидающие воркеры выполняют
+    вычисление сами. """
+
+    # Интервал (в секундах) опроса базы в ожидании результата
+    poll_interval = 0.05
+
+    def __init__(self, name: str):
+        self.leaders = 0
+        self.followers = 0
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+        metrics.register(name, self.get_stats)
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        if not SINGLE_FLIGHT_ENABLED:
+            return func()
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = Flight()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._do_shared(key, func)
+        except BaseException as ex:
+            flight.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def _do_shared(self, key: str, func: Callable[[], Any]) -> Any:
+
+        """ Объединяет вычисление с вычислениями других воркеров. """
+
+        store = get_flight_store()
+        if store is None:
+            return func()
+        while True:
+            try:
+                is_leader, payload = store.acquire(key)
+            except sqlite3.Error:
+                metrics.increment('single_flight.errors')
+                return func()
+            if is_leader:
+                return self._lead(store, key, func)
+            if payload is not None:
+                metrics.increment('single_flight.shared')
+                return self._get_result(payload)
+            time.sleep(self.poll_interval)
+
+    def _lead(self, store: FlightStore, key: str, func: Callable[[], Any]):
+        try:
+            result = func()
+        except exceptions.ServiceException as ex:
+            self._finish(store, key, {
+                'error': type(ex).__name__,
+                'message': ex.message,
+                'details': ex.details,
+            })
+            raise
+        except BaseException:
+            try:
+                store.release(key)
+            except sqlite3.Error:
+                metrics.increment('single_flight.errors')
+            raise
+        self._finish(store, key, {'result': result})
+        return result
+
+    def _finish(self, store: FlightStore, key: str, payload: dict):
+        try:
+            store.finish(key, payload)
+        except sqlite3.Error:
+            metrics.increment('single_flight.errors')
+
+    def _get_result(self, payload: dict) -> Any:
+        if 'error' in payload:
+            exception_cls = getattr(exceptions, payload['error'], None)
+            if not (
+                isinstance(exception_cls, type)
+                and issubclass(exception_cls, exceptions.ServiceException)
+            ):
+                exception_cls = exceptions.ServiceException
+            raise exception_cls(
+                message=payload['message'],
+                details=payload['details']
+            )
+        return payload['result']
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'leaders': self.leaders,
+                'followers': self.followers,
+                'in_flight': len(self._flights),
+            }
+
+
+check_flight = SingleFlight(name='single_flight')
@@ -0,0 +1,297 @@
+import re
+from typing import Dict, List, Optional, Set
+
+TOKEN_PATTERN = re.compile(
+    r"""
+    \s+
+    | --[^\n]*
+    | /\*.*?(?:\*/|$)
+    | (?P<string>'(?:[^']|'')*'?)
+    | (?P<quoted>"[^"]*"?|`[^`]*`?)
+    | (?P<word>[A-Za-z_][\w$]*)
+    | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+    | (?P<operator><=|>=|<>|!=|\|\||::|.)
+    """,
+    flags=re.VERBOSE | re.DOTALL
+)
+
+# Ключевые слова, которые не могут быть псевдонимом таблицы
+RESERVED_WORDS = frozenset((
+    'all', 'and', 'as', 'asc', 'between', 'by', 'case', 'cross', 'desc',
+    'distinct', 'else', 'end', 'except', 'exists', 'fetch', 'from', 'full',
+    'group', 'having', 'in', 'inner', 'intersect', 'is', 'join', 'lateral',
+    'left', 'like', 'limit', 'natural', 'not', 'null', 'offset', 'on', 'or',
+    'order', 'outer', 'right', 'select', 'then', 'union', 'using', 'when',
+    'where', 'window', 'with',
+))
+
+# Ключевые слова, завершающие условие WHERE, HAVING или ON
+CLAUSE_WORDS = frozenset((
+    'cross', 'except', 'fetch', 'full', 'group', 'having', 'inner',
+    'intersect', 'join', 'left', 'limit', 'natural', 'offset', 'on',
+    'order', 'right', 'union', 'using', 'where', 'window',
+))
+
+CONDITION_WORDS = frozenset(('where', 'having', 'on'))
+
+SYMMETRIC_OPERATORS = frozenset(('=', '<>', '!='))
+MIRRORED_OPERATORS = {'>': '<', '>=': '<='}
+COMPARISON_OPERATORS = frozenset(('=', '<>', '!=', '<', '>', '<=', '>='))
+
+
+def get_query_type(code: str) -> str:
+
+    """ Возвращает тип SQL-запроса по началу исходного кода:
+    select, with или unknown. """
+
+    normalized_code = code.lstrip().lower()
+
+    if normalized_code.startswith('select'):
+        return 'select'
+
+    if normalized_code.startswith('with'):
+        return 'with'
+
+    return 'unknown'
+
+
+def tokenize(code: str) -> List[str]:
+
+    """ Разбивает SQL-запрос на токены, отбрасывая пробелы и комментарии.
+    Ключевые слова и идентификаторы приводятся к нижнему регистру,
+    строковые литералы сохраняются как есть. """
+
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(code):
+        kind = match.lastgroup
+        if kind is None:
+            continue
+        token = match.group()
+        if kind == 'word':
+            token = token.lower()
+        elif kind == 'quoted':
+            name = token[1:-1]
+            if re.fullmatch(r'[A-Za-z_][\w$]*', name):
+                token = name.lower()
+        tokens.append(token)
+    while tokens and tokens[-1] == ';':
+        tokens.pop()
+    return tokens
+
+
+def is_name(token: str) -> bool:
+    return (
+        (token[0].isalpha() or token[0] == '_')
+        and token not in RESERVED_WORDS
+    )
+
+
+def _read_table_name(tokens: List[str], start: int) -> Optional[int]:
+
+    """ Возвращает позицию за именем таблицы (возможно, со схемой),
+    начинающимся в позиции start, или None. """
+
+    if start >= len(tokens) or not is_name(tokens[start]):
+        return None
+    end = start + 1
+    while (
+        end + 1 < len(tokens)
+        and tokens[end] == '.'
+        and is_name(tokens[end + 1])
+    ):
+        end += 2
+    return end
+
+
+def _remove_table_aliases(tokens: List[str]) -> List[str]:
+
+    """ Заменяет псевдонимы таблиц (FROM users u, JOIN orders AS o)
+    именами самих таблиц. Неоднозначные псевдонимы (указывающие
+    на разные таблицы, совпадающие с именем таблицы или относящиеся
+    к таблице, которая встречается в запросе несколько раз, как при
+    соединении таблицы с самой собой) сохраняются. """
+
+    declarations = []
+    aliases: Dict[str, str] = {}
+    ambiguous: Set[str] = set()
+    tables: Set[str] = set()
+    repeated_tables: Set[str] = set()
+    in_from = False
+    for index, token in enumerate(tokens):
+        if token in ('from', 'join'):
+            in_from = True
+        elif token in CLAUSE_WORDS or token in ('select', ')'):
+            in_from = False
+            continue
+        elif token != ',' or not in_from:
+            continue
+        end = _read_table_name(tokens, index + 1)
+        if end is None:
+            continue
+        table = ''.join(tokens[index + 1:end])
+        if table in tables:
+            repeated_tables.add(table)
+        tables.add(table)
+        alias_index = end + 1 if tokens[end:end + 1] == ['as'] else end
+        if alias_index >= len(tokens) or not is_name(tokens[alias_index]):
+            continue
+        alias = tokens[alias_index]
+        if aliases.setdefault(alias, table) != table:
+            ambiguous.add(alias)
+        declarations.append((end, alias_index, alias))
+
+    ambiguous.update(
+        alias for alias, table in aliases.items()
+        if alias in tables or table in repeated_tables
+    )
+    removed = set()
+    for end, alias_index, alias in declarations:
+        if alias not in ambiguous:
+            removed.update(range(end, alias_index + 1))
+
+    result = []
+    for index, token in enumerate(tokens):
+        if index in removed:
+            continue
+        if (
+            token in aliases
+            and token not in ambiguous
+            and tokens[index + 1:index + 2] == ['.']
+            and tokens[index - 1:index] != ['.']
+        ):
+            token = aliases[token]
+        result.append(token)
+    return result
+
+
+def _split_top_level(tokens: List[str], separator: str) -> List[List[str]]:
+    parts: List[List[str]] = [[]]
+    depth = 0
+    for token in tokens:
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth == 0 and token == separator:
+            parts.append([])
+            continue
+        parts[-1].append(token)
+    return parts
+
+
+def _normalize_comparison(tokens: List[str]) -> List[str]:
+
+    """ Приводит простое сравнение к каноническому виду:
+    операнды симметричных операторов (=, <>) упорядочиваются,
+    операторы > и >= заменяются на < и <= с перестановкой операндов. """
+
+    positions = [
+        index for index, token in enumerate(tokens)
+        if token in COMPARISON_OPERATORS
+    ]
+    if len(positions) != 1 or '(' in tokens:
+        return tokens
+    position = positions[0]
+    left, operator, right = (
+        tokens[:position],
+        tokens[position],
+        tokens[position + 1:]
+    )
+    if not left or not right:
+        return tokens
+    if operator == '!=':
+        operator = '<>'
+    if operator in MIRRORED_OPERATORS:
+        left, operator, right = right, MIRRORED_OPERATORS[operator], left
+    elif operator in SYMMETRIC_OPERATORS and right < left:
+        left, right = right, left
+    return [*left, operator, *right]
+
+
+def _normalize_condition(tokens: List[str]) -> List[str]:
+
+    """ Упорядочивает условия, объединенные через AND на верхнем уровне.
+    Условия с OR, BETWEEN и CASE на верхнем уровне не изменяются. """
+
+    conjuncts = _split_top_level(tokens, 'and')
+    for conjunct in conjuncts:
+        depth = 0
+        for token in conjunct:
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+            elif depth == 0 and token in ('or', 'between', 'case'):
+                return tokens
+    if not all(conjuncts):
+        return tokens
+    conjuncts = sorted(
+        (_normalize_comparison(conjunct) for conjunct in conjuncts),
+        key=render
+    )
+    result = conjuncts[0]
+    for conjunct in conjuncts[1:]:
+        result = [*result, 'and', *conjunct]
+    return result
+
+
+def _normalize_conditions(tokens: List[str]) -> List[str]:
+    result = []
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        result.append(token)
+        index += 1
+        if token not in CONDITION_WORDS:
+            continue
+        depth = 0
+        end = index
+        while end < len(tokens):
+            current = tokens[end]
+            if current == '(':
+                depth += 1
+            elif current == ')':
+                if depth == 0:
+                    break
+                depth -= 1
+            elif depth == 0 and current in CLAUSE_WORDS:
+                break
+            end += 1
+        result.extend(_normalize_condition(tokens[index:end]))
+        index = end
+    return result
+
+
+def render(tokens: List[str]) -> str:
+
+    """ Собирает токены в строку запроса. Пробелы не ставятся
+    вокруг точек, перед запятыми и внутри скобок. """
+
+    parts = []
+    previous = None
+    for token in tokens:
+        if (
+            previous is not None
+            and previous not in ('.', '(')
+            and token not in ('.', ',', ')', '(')
+        ):
+            parts.append(' ')
+        parts.append(token)
+        previous = token
+    return ''.join(parts)
+
+
+def get_canonical_tokens(code: str) -> List[str]:
+
+    """ Возвращает токены канонического вида SQL-запроса,
+    не зависящие от пробелов, комментариев, регистра ключевых слов,
+    псевдонимов таблиц и порядка условий, объединенных через AND. """
+
+    return _normalize_conditions(_remove_table_aliases(tokenize(code)))
+
+
+def get_canonical_form(code: str) -> str:
+
+    """ Возвращает канонический вид SQL-запроса (get_canonical_tokens). """
+
+    return render(get_canonical_tokens(code))
@@ -0,0 +1,104 @@
+from collections import Counter
+from difflib import SequenceMatcher
+from functools import cached_property
+from typing import List
+
+import cappa_sqlplag
+
+# Методы cappa_sqlplag.SQLPlag, используемые для разбора запросов,
+# не зависят от сравниваемой пары, поэтому достаточно одного экземпляра
+_sqlplag = cappa_sqlplag.SQLPlag(ref_code='', candidate_code='')
+
+
+class PreparedQuery:
+
+    """ SQL-запрос, разобранный так же, как это делает cappa_sqlplag.
+    Части разбора вычисляются при первом обращении и сохраняются,
+    поэтому запрос разбирается не более одного раза. """
+
+    def __init__(self, code: str):
+        self.code = code
+
+    @cached_property
+    def normalized(self) -> str:
+        return _sqlplag.normalize_sql(self.code)
+
+    @cached_property
+    def tokens(self) -> List[str]:
+        return _sqlplag.tokenize_sql(self.normalized)
+
+    @cached_property
+    def structure(self) -> dict:
+        return _sqlplag.parse_sql_structure(self.normalized)
+
+    @cached_property
+    def cte_tokens(self) -> List[str]:
+        return _sqlplag.tokenize(self.code.lower())
+
+
+class PreparedComparison:
+
+    """ Сравнение разобранного эталона с разобранным кандидатом.
+    Повторяет метрики cappa_sqlplag.SQLPlag и имеет тот же интерфейс
+    (similarity_percentage, cte_similarity_percentage). """
+
+    def __init__(self, reference: PreparedQuery, candidate: PreparedQuery):
+        self.reference = reference
+        self.candidate = candidate
+
+    def calculate_similarity(self) -> float:
+        reference, candidate = self.reference, self.candidate
+        if reference.normalized == candidate.normalized:
+            return 1.0
+        structure_similarity = _sqlplag._calculate_structure_similarity(
+            reference.structure,
+            candidate.structure
+        )
+        token_similarity = _sqlplag._calculate_token_similarity(
+            reference.tokens,
+            candidate.tokens
+        )
+        return 0.5 * structure_similarity + 0.5 * token_similarity
+
+    def similarity_percentage(self) -> int:
+        return int(round(self.calculate_similarity() * 100))
+
+    def calculate_similarity_bound(self) -> float:
+
+        """ Верхняя оценка calculate_similarity. Расстояние Левенштейна
+        между списками токенов не меньше, чем длина большего списка
+        за вычетом числа общих токенов, поэтому оценка не требует
+        вычисления расстояния. """
+
+        reference, candidate = self.reference, self.candidate
+        if reference.normalized == candidate.normalized:
+            return 1.0
+        structure_similarity = _sqlplag._calculate_structure_similarity(
+            reference.structure,
+            candidate.structure
+        )
+        common = Counter(reference.tokens) & Counter(candidate.tokens)
+        max_len = max(len(reference.tokens), len(candidate.tokens))
+        min_distance = max_len - sum(common.values())
+        token_similarity = 1 - min_distance / (max_len or 1)
+        return 0.5 * structure_similarity + 0.5 * token_similarity
+
+    def similarity_percentage_bound(self) -> int:
+        return int(round(self.calculate_similarity_bound() * 100))
+
+    def cte_similarity_percentage(self) -> int:
+        matcher = SequenceMatcher(
+            None,
+            self.reference.cte_tokens,
+            self.candidate.cte_tokens
+        )
+        return int(matcher.ratio() * 100)
+
+    def cte_similarity_percentage_bound(self) -> int:
+        matcher = SequenceMatcher(
+            None,
+            self.reference.cte_tokens,
+            self.candidate.cte_tokens
+        )
+        return int(matcher.quick_ratio() * 100)
+
@@ -1,73 +1,196 @@
-import cappa_sqlplag
-from app.services.entities import (
-    CheckInput,
-    CheckResult
-)
-from app.services import exceptions
-from app.services.base import AntiplagBaseService
-
-
-class SqlPlagService(AntiplagBaseService):
-
-    @staticmethod
-    def _get_query_type(code: str) -> str:
-        normalized_code = code.lstrip().lower()
-
-        if normalized_code.startswith('select'):
-            return 'select'
-
-        if normalized_code.startswith('with'):
-            return 'with'
-
-        return 'unknown'
-
-    @staticmethod
-    def _normalize_percent(percent: float) -> float:
-        return max(0.0, min(1.0, percent / 100))
-
-    @classmethod
-    def _calculate_percent(cls, sqlplag, query_type: str) -> float:
-        if query_type == 'select':
-            percent = sqlplag.similarity_percentage()
-        elif query_type == 'with':
-            percent = sqlplag.cte_similarity_percentage()
-        else:
-            raise exceptions.UnsupportedQueryException()
-
-        return cls._normalize_percent(percent)
-
-    def check_plagiarism(self, data: CheckInput) -> CheckResult:
-
-        """ Проверка на плагиат SQL-запросов с помощью cappa-sqlplag. """
-
-        ref_type = self._get_query_type(data['ref_code'])
-
-        if ref_type == 'unknown':
-            raise exceptions.UnsupportedQueryException()
-
-        plag_percent_by_uuids = {}
-
-        for candidate in data['candidates']:
-            candidate_type = self._get_query_type(candidate['code'])
-            uuid = candidate['uuid']
-
-            if candidate_type != ref_type:
-                continue
-
-            sqlplag = cappa_sqlplag.SQLPlag(
-                ref_code=data['ref_code'],
-                candidate_code=candidate['code']
-            )
-
-            plag_percent_by_uuids[uuid] = self._calculate_percent(
-                sqlplag=sqlplag,
-                query_type=ref_type
-            )
-
-        if not plag_percent_by_uuids:
-            return CheckResult(
-                uuid=None,
-                percent=0.0
-            )
-
-        return self._get_candidate_with_max_plag(plag_percent_by_uuids)
+import sys
+from importlib import metadata
+from typing import Dict, List
+
+from app.config import SQL_QUERY_CACHE_SIZE
+from app.services.cache import LRUCache, get_hash
+from app.services.enums import Engine
+from app.services.entities import (
+    CheckInput,
+    CheckResult
+)
+from app.services import exceptions
+from app.services.base import AntiplagPoolService
+from app.services.progress import report_progress
+from app.services.sql.canonical import get_canonical_form, get_query_type
+from app.services.sql.prepared import PreparedComparison, PreparedQuery
+
+# Во сколько раз разобранный запрос больше своего текста (оценка)
+QUERY_SIZE_FACTOR = 8
+
+
+def get_query_size(query: PreparedQuery) -> int:
+    return sys.getsizeof(query.code) * QUERY_SIZE_FACTOR
+
+
+query_cache = LRUCache(
+    name='sql_queries',
+    max_size=SQL_QUERY_CACHE_SIZE,
+    get_size=get_query_size
+)
+
+
+class SqlPlagService(AntiplagPoolService):
+
+    engine = Engine.SQLPLAG
+    version = f'2:{metadata.version("cappa-sqlplag")}'
+
+    @staticmethod
+    def _get_query_type(code: str) -> str:
+        return get_query_type(code)
+
+    @staticmethod
+    def _normalize_percent(percent: float) -> float:
+        return max(0.0, min(1.0, percent / 100))
+
+    @staticmethod
+    def _get_query(code: str) -> PreparedQuery:
+
+        """ Возвращает запрос, приведенный к каноническому виду.
+        Разобранные запросы кешируются по хешу канонического вида,
+        поэтому запросы, отличающиеся только пробелами, регистром,
+        псевдонимами таблиц или порядком условий, и запросы,
+        повторяющиеся в разных проверках, разбираются один раз. """
+
+        canonical_code = get_canonical_form(code)
+        key = get_hash(canonical_code)
+        query = query_cache.get(key)
+        if query is None:
+            query = PreparedQuery(canonical_code)
+            query_cache.set(key, query)
+        return query
+
+    def _get_context(self, data: CheckInput) -> Dict[str, str]:
+        return {'ref_type': self._get_query_type(data['ref_code'])}
+
+    def get_scores_many(
+        self,
+        data_list: List[CheckInput]
+    ) -> List[Dict[str, float]]:
+
+        """ Эталоны неподдерживаемого типа не сравниваются
+        с кандидатами: процентов плагиата для них нет. """
+
+        supported = [
+            data for data in data_list
+            if self._get_query_type(data['ref_code']) != 'unknown'
+        ]
+        scores = iter(super().get_scores_many(supported))
+        return [
+            next(scores)
+            if self._get_query_type(data['ref_code']) != 'unknown' else {}
+            for data in data_list
+        ]
+
+    @classmethod
+    def _calculate_percent_bound(
+        cls,
+        comparison: PreparedComparison,
+        query_type: str
+    ) -> float:
+
+        """ Верхняя оценка _calculate_percent, не требующая
+        вычисления расстояния Левенштейна и построения diff. """
+
+        if query_type == 'select':
+            percent = comparison.similarity_percentage_bound()
+        elif query_type == 'with':
+            percent = comparison.cte_similarity_percentage_bound()
+        else:
+            raise exceptions.UnsupportedQueryException()
+
+        return cls._normalize_percent(percent)
+
+    @classmethod
+    def _calculate_percent(cls, sqlplag, query_type: str) -> float:
+        if query_type == 'select':
+            percent = sqlplag.similarity_percentage()
+        elif query_type == 'with':
+            percent = sqlplag.cte_similarity_percentage()
+        else:
+            raise exceptions.UnsupportedQueryException()
+
+        return cls._normalize_percent(percent)
+
+    def check_plagiarism(self, data: CheckInput) -> CheckResult:
+
+        """ Проверка на плагиат SQL-запросов с помощью cappa-sqlplag. """
+
+        ref_type = self._get_query_type(data['ref_code'])
+
+        if ref_type == 'unknown':
+            raise exceptions.UnsupportedQueryException()
+
+        plag_percent_by_uuids = self._execute_bounded(data, ref_type=ref_type)
+
+        if not plag_percent_by_uuids:
+            return CheckResult(
+                uuid=None,
+                percent=0.0
+            )
+
+        return self._get_candidate_with_max_plag(plag_percent_by_uuids)
+
+    def _get_upper_bounds(
+        self,
+        data: CheckInput,
+        ref_type: str
+    ) -> List[float]:
+
+        """ Кандидаты другого типа запроса получают оценку -1:
+        они проверяются последними и в результат не попадают. """
+
+        reference = self._get_query(data['ref_code'])
+        bounds = []
+        for candidate in data['candidates']:
+            if self._get_query_type(candidate['code']) != ref_type:
+                bounds.append(-1)
+                continue
+            candidate_query = self._get_query(candidate['code'])
+            if candidate_query.code == reference.code:
+                bounds.append(1.0)
+                continue
+            bounds.append(
+                self._calculate_percent_bound(
+                    comparison=PreparedComparison(reference, candidate_query),
+                    query_type=ref_type
+                )
+            )
+        return bounds
+
+    def _check_candidates(
+        self,
+        data: CheckInput,
+        ref_type: str
+    ) -> Dict[str, float]:
+
+        """ Сравнивает эталон с кандидатами того же типа запроса.
+        Кандидаты другого типа в результат не попадают. """
+
+        reference = self._get_query(data['ref_code'])
+        plag_percent_by_uuids = {}
+
+        for candidate in data['candidates']:
+            candidate_type = self._get_query_type(candidate['code'])
+            uuid = candidate['uuid']
+
+            if candidate_type != ref_type:
+                report_progress(done=1)
+                continue
+
+            candidate_query = self._get_query(candidate['code'])
+            if candidate_query.code == reference.code:
+                # Канонический вид запросов совпадает
+                plag_percent = 1.0
+            else:
+                plag_percent = self._calculate_percent(
+                    sqlplag=PreparedComparison(reference, candidate_query),
+                    query_type=ref_type
+                )
+            plag_percent_by_uuids[uuid] = plag_percent
+            report_progress(done=1, scores={uuid: plag_percent})
+
+            if self._is_threshold_reached(data, plag_percent):
+                break
+
+        return plag_percent_by_uuids
@@ -0,0 +1,92 @@
+import pytest
+
+from app.services.sql.canonical import get_canonical_form, tokenize
+
+
+def test_tokenize__comments_and_case__ok():
+
+    # act
+    tokens = tokenize(
+        "SELECT Name, 'A b' -- comment\n"
+        "FROM /* users */ \"Users\";"
+    )
+
+    # assert
+    assert tokens == ['select', 'name', ',', "'A b'", 'from', 'users']
+
+
+@pytest.mark.parametrize('first,second', (
+    (
+        'SELECT id FROM users WHERE id = 1',
+        'select  id\nfrom USERS where 1 = id;',
+    ),
+    (
+        'SELECT u.id FROM users u WHERE u.age > 18',
+        'SELECT users.id FROM users AS x WHERE 18 < x.age',
+    ),
+    (
+        'SELECT * FROM a JOIN b ON a.id = b.a_id WHERE a.x = 1 AND b.y = 2',
+        'SELECT * FROM a JOIN b ON b.a_id = a.id WHERE b.y = 2 AND a.x = 1',
+    ),
+    (
+        'SELECT * FROM users u, orders o WHERE o.user_id = u.id',
+        'SELECT * FROM users, orders WHERE users.id = orders.user_id',
+    ),
+))
+def test_get_canonical_form__equivalent_queries__same(first, second):
+    assert get_canonical_form(first) == get_canonical_form(second)
+
+
+@pytest.mark.parametrize('first,second', (
+    (
+        "SELECT id FROM users WHERE name = 'Bob'",
+        "SELECT id FROM users WHERE name = 'bob'",
+    ),
+    (
+        'SELECT id FROM users WHERE age > 18',
+        'SELECT id FROM users WHERE age < 18',
+    ),
+    (
+        'SELECT id FROM t WHERE a = 1 OR b = 2 AND c = 3',
+        'SELECT id FROM t WHERE b = 2 OR a = 1 AND c = 3',
+    ),
+    (
+        'SELECT id FROM t WHERE x BETWEEN 1 AND 2',
+        'SELECT id FROM t WHERE x BETWEEN 2 AND 1',
+    ),
+    (
+        'SELECT a.id FROM users a JOIN orders b ON a.id = b.id',
+        'SELECT b.id FROM users a JOIN orders b ON a.id = b.id',
+    ),
+    (
+        'SELECT a.name, b.name FROM emp a JOIN emp b ON a.boss_id = b.id',
+        'SELECT a.name, b.name FROM emp a JOIN emp b ON b.boss_id = a.id',
+    ),
+))
+def test_get_canonical_form__different_queries__differ(first, second):
+    assert get_canonical_form(first) != get_canonical_form(second)
+
+
+def test_get_canonical_form__ambiguous_alias__kept():
+
+    # act
+    result = get_canonical_form(
+        'SELECT t.id FROM users t JOIN (SELECT id FROM orders t) s '
+        'ON s.id = t.id'
+    )
+
+    # assert
+    assert 't.id' in result
+
+
+def test_get_canonical_form__self_join_aliases__kept():
+
+    # act
+    result = get_canonical_form(
+        'SELECT a.name FROM emp a JOIN emp AS b ON a.boss_id = b.id'
+    )
+
+    # assert
+    assert result == (
+        'select a.name from emp a join emp as b on a.boss_id = b.id'
+    )
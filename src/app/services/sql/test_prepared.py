@@ -0,0 +1,104 @@
+import cappa_sqlplag
+import pytest
+
+from app.services.sql.prepared import PreparedComparison, PreparedQuery
+
+QUERIES = (
+    'SELECT u.id, u.name, o.total '
+    'FROM users u '
+    'JOIN orders o ON o.user_id = u.id '
+    'WHERE o.total > 100 '
+    'ORDER BY o.total DESC',
+    'select u.id, u.name,  o.total from users u '
+    'join orders o on o.user_id = u.id where o.total > 100 '
+    'order by o.total desc',
+    'SELECT department_id, COUNT(*) AS employee_count '
+    'FROM employees '
+    'WHERE hire_date >= \'2020-01-01\' AND salary > 10 '
+    'GROUP BY department_id '
+    'LIMIT 5',
+    'WITH t AS (SELECT id FROM users) SELECT * FROM t -- comment',
+    '',
+)
+
+
+@pytest.mark.parametrize('ref_code', QUERIES)
+@pytest.mark.parametrize('candidate_code', QUERIES)
+def test_prepared_comparison__same_as_sqlplag(ref_code, candidate_code):
+
+    # arrange
+    sqlplag = cappa_sqlplag.SQLPlag(
+        ref_code=ref_code,
+        candidate_code=candidate_code
+    )
+
+    # act
+    comparison = PreparedComparison(
+        reference=PreparedQuery(ref_code),
+        candidate=PreparedQuery(candidate_code)
+    )
+
+    # assert
+    assert (
+        comparison.similarity_percentage()
+        == sqlplag.similarity_percentage()
+    )
+    assert (
+        comparison.cte_similarity_percentage()
+        == sqlplag.cte_similarity_percentage()
+    )
+
+
+def test_prepared_comparison__many_candidates__reference_parsed_once(mocker):
+
+    # arrange
+    reference = PreparedQuery('SELECT id FROM users WHERE id > 1')
+    parse_mock = mocker.spy(
+        cappa_sqlplag.SQLPlag,
+        'parse_sql_structure'
+    )
+
+    # act
+    for candidate_code in QUERIES[:3]:
+        PreparedComparison(
+            reference=reference,
+            candidate=PreparedQuery(candidate_code)
+        ).similarity_percentage()
+
+    # assert
+    assert parse_mock.call_count == 4
+
+
+def test_prepared_query__parts_computed_lazily(mocker):
+
+    # arrange
+    tokenize_mock = mocker.spy(cappa_sqlplag.SQLPlag, 'tokenize_sql')
+    query = PreparedQuery('SELECT 1')
+
+    # act
+    query.cte_tokens
+
+    # assert
+    tokenize_mock.assert_not_called()
+
+
+@pytest.mark.parametrize('ref_code', QUERIES)
+@pytest.mark.parametrize('candidate_code', QUERIES)
+def test_prepared_comparison__bounds_not_less_than_percent(
+    ref_code,
+    candidate_code
+):
+
+    # arrange
+    comparison = PreparedComparison(
+        reference=PreparedQuery(ref_code),
+        candidate=PreparedQuery(candidate_code)
+    )
+
+    # act
+    bound = comparison.similarity_percentage_bound()
+    cte_bound = comparison.cte_similarity_percentage_bound()
+
+    # assert
+    assert bound >= comparison.similarity_percentage()
+    assert cte_bound >= comparison.cte_similarity_percentage()
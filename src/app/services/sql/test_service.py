@@ -1,6 +1,7 @@
+import cappa_sqlplag
 import pytest
 from app.services import messages
-from app.services.main import SqlPlagService
+from app.services.sql.service import SqlPlagService
 from app.services.enums import Lang
 from app.services.entities import (
     CheckInput,
@@ -9,6 +10,7 @@ from app.services.entities import (
 )
 
 from app.services.exceptions import UnsupportedQueryException
+from app.services.sql.service import query_cache
 
 
 def test_check_plagiarism__select_queries__ok(mocker):
@@ -244,7 +246,7 @@ def test_check_plagiarism__identical_select_queries__max_plag(mocker):
 
     # assert
     assert get_query_type_mock.call_count == 2
-    calculate_percent_mock.assert_called_once()
+    calculate_percent_mock.assert_not_called()
     get_candidate_with_max_plag_mock.assert_called_once_with(
         {'candidate-1': plag_percent}
     )
@@ -481,3 +483,140 @@ def test_calculate_percent__unknown_type__raise_exception(mocker):
     # assert
     sqlplag_mock.similarity_percentage.assert_not_called()
     sqlplag_mock.cte_similarity_percentage.assert_not_called()
+
+
+
+def test_check_plagiarism__same_canonical_form__max_plag(mocker):
+
+    # arrange
+    ref_code = (
+        'SELECT u.id, u.name, o.total '
+        'FROM users u '
+        'JOIN orders o ON o.user_id = u.id '
+        'WHERE o.total > 100 AND u.active = 1'
+    )
+    candidate_code = (
+        'select users.id, users.name,  orders.total\n'
+        'from users\n'
+        'join orders as ord on users.id = ord.user_id  -- join\n'
+        'where users.active = 1 and 100 < ord.total;'
+    )
+    test_data = CheckInput(
+        lang=Lang.SQL,
+        ref_code=ref_code,
+        candidates=[
+            Candidate(uuid='candidate-1', code=candidate_code),
+        ]
+    )
+    calculate_percent_spy = mocker.spy(SqlPlagService, '_calculate_percent')
+
+    service = SqlPlagService()
+
+    # act
+    result = service.check_plagiarism(test_data)
+
+    # assert
+    calculate_percent_spy.assert_not_called()
+    assert result == CheckResult(uuid='candidate-1', percent=1.0)
+
+
+def test_check_plagiarism__repeated_candidate__parsed_once(mocker):
+
+    # arrange
+    ref_code = 'SELECT id, name FROM users WHERE id > 10'
+    candidate_code = 'SELECT id FROM users WHERE id > 1'
+    test_data = CheckInput(
+        lang=Lang.SQL,
+        ref_code=ref_code,
+        candidates=[
+            Candidate(uuid='candidate-1', code=candidate_code),
+            Candidate(uuid='candidate-2', code=candidate_code.lower()),
+        ]
+    )
+    query_cache.clear()
+    parse_spy = mocker.spy(cappa_sqlplag.SQLPlag, 'parse_sql_structure')
+
+    service = SqlPlagService()
+
+    # act
+    service.check_plagiarism(test_data)
+    service.check_plagiarism(test_data)
+
+    # assert
+    assert parse_spy.call_count == 2
+
+
+def test_get_upper_bounds__other_type_and_same_canonical_form():
+
+    # arrange
+    ref_code = 'SELECT id, name FROM users WHERE id > 10'
+    test_data = CheckInput(
+        lang=Lang.SQL,
+        ref_code=ref_code,
+        candidates=[
+            Candidate(uuid='candidate-1', code='select id, name from users '
+                                               'where 10 < id'),
+            Candidate(uuid='candidate-2', code='WITH t AS (SELECT 1) '
+                                               'SELECT * FROM t'),
+            Candidate(uuid='candidate-3', code='SELECT id FROM orders'),
+        ]
+    )
+    service = SqlPlagService()
+
+    # act
+    bounds = service._get_upper_bounds(test_data, ref_type='select')
+
+    # assert
+    percents = service._check_candidates(test_data, ref_type='select')
+    assert bounds[:2] == [1.0, -1]
+    assert percents['candidate-3'] <= bounds[2] < 1.0
+
+
+def test_check_plagiarism__threshold_reached__rest_skipped(mocker):
+
+    # arrange
+    ref_code = 'SELECT id, name FROM users WHERE id > 10'
+    test_data = CheckInput(
+        lang=Lang.SQL,
+        ref_code=ref_code,
+        candidates=[
+            Candidate(uuid='candidate-1', code='SELECT id FROM users'),
+            Candidate(uuid='candidate-2', code=ref_code),
+            Candidate(uuid='candidate-3', code=ref_code.lower()),
+        ],
+        threshold=0.9
+    )
+    get_query_spy = mocker.spy(SqlPlagService, '_get_query')
+
+    service = SqlPlagService()
+
+    # act
+    result = service.check_plagiarism(test_data)
+
+    # assert
+    assert get_query_spy.call_count == 3
+    assert result == CheckResult(uuid='candidate-2', percent=1.0)
+
+
+def test_get_scores_many__unsupported_reference__no_scores():
+
+    # arrange
+    candidates = [Candidate(uuid='1', code='SELECT a FROM t')]
+    data_list = [
+        CheckInput(
+            lang=Lang.SQL,
+            ref_code='DELETE FROM t',
+            candidates=candidates
+        ),
+        CheckInput(
+            lang=Lang.SQL,
+            ref_code='select a from t',
+            candidates=candidates
+        ),
+    ]
+
+    # act
+    result = SqlPlagService().get_scores_many(data_list)
+
+    # assert
+    assert result == [{}, {'1': 1.0}]
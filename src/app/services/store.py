@@ -0,0 +1,406 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.config import (
+    JOB_STORE_PATH,
+    JOB_TIMEOUT,
+    JOB_TTL,
+    SCORE_STORE_MAX_ENTRIES,
+    SCORE_STORE_PATH,
+    SCORE_STORE_TTL,
+    SINGLE_FLIGHT_RESULT_TTL,
+    SINGLE_FLIGHT_TIMEOUT,
+)
+from app.services import messages
+from app.services.enums import JobStatus
+from app.services.metrics import metrics
+
+
+class SqliteStore(ABC):
+
+    """ Базовый класс хранилищ в базе SQLite на локальном диске,
+    общих для всех воркеров. База работает в режиме WAL: воркеры
+    читают ее одновременно, а запись одного воркера не блокирует
+    чтение остальных. """
+
+    # Время ожидания (в секундах) блокировки базы другим воркером
+    timeout = 5
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._get_connection() as connection:
+            self._create_tables(connection)
+
+    @abstractmethod
+    def _create_tables(self, connection: sqlite3.Connection):
+        pass
+
+    def _get_connection(self) -> sqlite3.Connection:
+
+        """ Возвращает соединение текущего потока. Соединения
+        не передаются между потоками и процессами, поэтому после
+        fork воркер открывает собственное соединение. """
+
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+
+class ScoreStore(SqliteStore):
+
+    """ Описывает хранилище процентов плагиата на локальном диске,
+    общее для всех воркеров и сохраняющееся между перезапусками.
+
+    Проценты всех кандидатов запроса читаются одним запросом
+    и записываются одной транзакцией. Записи старше ttl секунд
+    удаляются, а при превышении max_entries удаляются самые
+    старые записи.
+
+    Ошибки SQLite не прерывают проверку: хранилище считается пустым,
+    а ошибки подсчитываются в метрике score_store.errors. """
+
+    # Доля max_entries, до которой сокращается хранилище при очистке
+    shrink_ratio = 0.8
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._written_count = 0
+        super().__init__(path)
+
+    def _create_tables(self, connection: sqlite3.Connection):
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS scores ('
+            'key TEXT PRIMARY KEY, '
+            'percent REAL NOT NULL, '
+            'created REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS scores_created '
+            'ON scores (created)'
+        )
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, float]:
+
+        """ Возвращает проценты плагиата, найденные по ключам,
+        за один запрос к базе. Устаревшие записи не возвращаются. """
+
+        keys = list(keys)
+        if not keys:
+            return {}
+        try:
+            rows = self._get_connection().execute(
+                'SELECT key, percent FROM scores '
+                'WHERE key IN (SELECT value FROM json_each(?)) '
+                'AND created >= ?',
+                (json.dumps(keys), time.time() - self.ttl)
+            ).fetchall()
+        except sqlite3.Error:
+            metrics.increment('score_store.errors')
+            return {}
+        metrics.increment('score_store.hits', len(rows))
+        metrics.increment('score_store.misses', len(keys) - len(rows))
+        return dict(rows)
+
+    def set_many(self, scores: Dict[str, float]):
+
+        """ Записывает проценты плагиата одной транзакцией. """
+
+        if not scores:
+            return
+        created = time.time()
+        try:
+            with self._get_connection() as connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO scores (key, percent, created) '
+                    'VALUES (?, ?, ?)',
+                    [
+                        (key, percent, created)
+                        for key, percent in scores.items()
+                    ]
+                )
+        except sqlite3.Error:
+            metrics.increment('score_store.errors')
+            return
+        metrics.increment('score_store.writes', len(scores))
+        self._written_count += len(scores)
+        # Размер хранилища проверяется не после каждой записи,
+        # а после записи заметной его доли
+        if self._written_count > self.max_entries * (1 - self.shrink_ratio):
+            self._written_count = 0
+            self.compact()
+
+    def compact(self):
+
+        """ Удаляет устаревшие записи и сокращает хранилище
+        до shrink_ratio от max_entries, удаляя самые старые записи. """
+
+        try:
+            with self._get_connection() as connection:
+                connection.execute(
+                    'DELETE FROM scores WHERE created < ?',
+                    (time.time() - self.ttl,)
+                )
+                count, = connection.execute(
+                    'SELECT COUNT(*) FROM scores'
+                ).fetchone()
+                if count > self.max_entries:
+                    connection.execute(
+                        'DELETE FROM scores WHERE key IN ('
+                        'SELECT key FROM scores ORDER BY created LIMIT ?'
+                        ')',
+                        (count - int(self.max_entries * self.shrink_ratio),)
+                    )
+        except sqlite3.Error:
+            metrics.increment('score_store.errors')
+            return
+        metrics.increment('score_store.compactions')
+
+
+class FlightStore(SqliteStore):
+
+    """ Описывает общий для воркеров реестр выполняемых вычислений.
+
+    Воркер, первым начавший вычисление с данным ключом, становится
+    ведущим и по окончании сохраняет результат (или ошибку) в виде
+    JSON. Остальные воркеры ждут этот результат, он хранится
+    result_ttl секунд. Если ведущий не завершил вычисление за lease
+    секунд (например, воркер был перезапущен), ведущим становится
+    следующий обратившийся воркер. """
+
+    def __init__(self, path: str, lease: float, result_ttl: float):
+        self.lease = lease
+        self.result_ttl = result_ttl
+        super().__init__(path)
+
+    def _create_tables(self, connection: sqlite3.Connection):
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS flights ('
+            'key TEXT PRIMARY KEY, '
+            'started REAL NOT NULL, '
+            'finished REAL, '
+            'payload TEXT'
+            ') WITHOUT ROWID'
+        )
+
+    def acquire(self, key: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+
+        """ Пытается начать вычисление с ключом key. Возвращает
+        (True, None), если текущий воркер стал ведущим, (False, payload),
+        если результат уже сохранен, и (False, None), если вычисление
+        выполняется другим воркером. """
+
+        now = time.time()
+        with self._get_connection() as connection:
+            connection.execute(
+                'DELETE FROM flights '
+                'WHERE (finished IS NULL AND started < ?) OR finished < ?',
+                (now - self.lease, now - self.result_ttl)
+            )
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO flights (key, started) VALUES (?, ?)',
+                (key, now)
+            )
+            if cursor.rowcount:
+                return True, None
+            row = connection.execute(
+                'SELECT payload FROM flights WHERE key = ?',
+                (key,)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return False, None
+        return False, json.loads(row[0])
+
+    def finish(self, key: str, payload: Dict[str, Any]):
+
+        """ Сохраняет результат вычисления для ожидающих воркеров. """
+
+        with self._get_connection() as connection:
+            connection.execute(
+                'UPDATE flights SET finished = ?, payload = ? WHERE key = ?',
+                (time.time(), json.dumps(payload, default=str), key)
+            )
+
+    def release(self, key: str):
+
+        """ Отказывается от вычисления без результата: один из
+        ожидающих воркеров станет ведущим и выполнит его сам. """
+
+        with self._get_connection() as connection:
+            connection.execute('DELETE FROM flights WHERE key = ?', (key,))
+
+
+class JobStore(SqliteStore):
+
+    """ Описывает общее для воркеров хранилище асинхронных проверок:
+    состояние задания может запросить любой воркер, а не только
+    выполняющий его. Результат и ошибка хранятся в виде JSON.
+
+    Задания, не обновлявшиеся ttl секунд, удаляются при создании
+    новых. Незавершенное задание, не обновлявшееся job_timeout секунд
+    (например, воркер был перезапущен), возвращается как завершенное
+    с ошибкой. """
+
+    def __init__(self, path: str, ttl: float, job_timeout: float):
+        self.ttl = ttl
+        # timeout базового класса - время ожидания блокировки базы
+        self.job_timeout = job_timeout
+        super().__init__(path)
+
+    def _create_tables(self, connection: sqlite3.Connection):
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, '
+            'status TEXT NOT NULL, '
+            'progress REAL NOT NULL, '
+            'result TEXT, '
+            'error TEXT, '
+            'created REAL NOT NULL, '
+            'updated REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated)'
+        )
+
+    def create(self, job_id: str):
+
+        """ Добавляет задание в очередь и удаляет устаревшие задания. """
+
+        now = time.time()
+        with self._get_connection() as connection:
+            connection.execute(
+                'DELETE FROM jobs WHERE updated < ?',
+                (now - self.ttl,)
+            )
+            connection.execute(
+                'INSERT INTO jobs (id, status, progress, created, updated) '
+                'VALUES (?, ?, 0, ?, ?)',
+                (job_id, JobStatus.QUEUED, now, now)
+            )
+
+    def start(self, job_id: str):
+        self._update(job_id, 'status = ?', JobStatus.RUNNING)
+
+    def set_progress(self, job_id: str, progress: float):
+
+        """ Сохраняет долю проверенных кандидатов. Доля не уменьшается,
+        а завершенное задание не меняется. """
+
+        with self._get_connection() as connection:
+            connection.execute(
+                'UPDATE jobs SET progress = MAX(progress, ?), updated = ? '
+                'WHERE id = ? AND status = ?',
+                (progress, time.time(), job_id, JobStatus.RUNNING)
+            )
+
+    def finish(self, job_id: str, result: Any):
+        self._update(
+            job_id,
+            'status = ?, progress = 1, result = ?',
+            JobStatus.DONE,
+            json.dumps(result, default=str)
+        )
+
+    def fail(self, job_id: str, error: Dict[str, Any]):
+        self._update(
+            job_id,
+            'status = ?, error = ?',
+            JobStatus.FAILED,
+            json.dumps(error, default=str)
+        )
+
+    def _update(self, job_id: str, assignments: str, *params: Any):
+        with self._get_connection() as connection:
+            connection.execute(
+                f'UPDATE jobs SET {assignments}, updated = ? WHERE id = ?',
+                (*params, time.time(), job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+
+        """ Возвращает задание или None, если оно не найдено
+        или устарело. """
+
+        now = time.time()
+        row = self._get_connection().execute(
+            'SELECT status, progress, result, error, created, updated '
+            'FROM jobs WHERE id = ? AND updated >= ?',
+            (job_id, now - self.ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        status, progress, result, error, created, updated = row
+        job = {
+            'id': job_id,
+            'status': status,
+            'progress': progress,
+            'result': json.loads(result) if result is not None else None,
+            'error': json.loads(error) if error is not None else None,
+            'created': created,
+            'updated': updated,
+        }
+        is_finished = status in (JobStatus.DONE, JobStatus.FAILED)
+        if not is_finished and updated < now - self.job_timeout:
+            job['status'] = JobStatus.FAILED
+            job['error'] = {'error': messages.MSG_8, 'details': None}
+        return job
+
+
+@lru_cache(maxsize=None)
+def get_score_store() -> Optional[ScoreStore]:
+
+    """ Возвращает хранилище процентов плагиата
+    или None, если оно отключено. """
+
+    if not SCORE_STORE_PATH:
+        return None
+    return ScoreStore(
+        path=SCORE_STORE_PATH,
+        max_entries=SCORE_STORE_MAX_ENTRIES,
+        ttl=SCORE_STORE_TTL
+    )
+
+
+@lru_cache(maxsize=None)
+def get_flight_store() -> Optional[FlightStore]:
+
+    """ Возвращает общий для воркеров реестр выполняемых вычислений
+    (в той же базе, что и проценты плагиата) или None,
+    если база отключена. """
+
+    if not SCORE_STORE_PATH:
+        return None
+    return FlightStore(
+        path=SCORE_STORE_PATH,
+        lease=SINGLE_FLIGHT_TIMEOUT,
+        result_ttl=SINGLE_FLIGHT_RESULT_TTL
+    )
+
+
+@lru_cache(maxsize=None)
+def get_job_store() -> JobStore:
+
+    """ Возвращает общее для воркеров хранилище асинхронных проверок. """
+
+    return JobStore(
+        path=JOB_STORE_PATH,
+        ttl=JOB_TTL,
+        job_timeout=JOB_TIMEOUT
+    )
@@ -1,7 +1,15 @@
 import pytest
-from app.services.base import AntiplagBaseService
-from app.services.entities import CheckResult
+from app.services.base import (
+    AntiplagBaseService,
+    AntiplagPoolService,
+    reset_process_pool,
+    score_cache,
+)
+from app.services.entities import Candidate, CheckInput, CheckResult
+from app.services.enums import Lang
 from app.services.exceptions import CandidatesException
+from app.services.pycode.service import WinnowService
+from app.services.store import ScoreStore
 
 
 class _ConcreteService(AntiplagBaseService):
@@ -68,3 +76,506 @@ def test_get_candidate_with_max_plag__empty_dict__raise_exception():
 
     # assert
     assert ex.value.message is not None
+
+
+def get_candidates(count: int) -> list:
+    return [
+        Candidate(
+            uuid=f'candidate-{index}',
+            code='\n'.join(
+                f'x{line} = {index} + {line}' for line in range(index % 7)
+            ) or 'pass'
+        )
+        for index in range(count)
+    ]
+
+
+def test_pool_service__check_candidates_not_implemented__abstract():
+
+    # arrange
+    class IncompleteService(AntiplagPoolService):
+
+        def check_plagiarism(self, data):
+            pass
+
+    # act
+    with pytest.raises(TypeError) as ex:
+        IncompleteService()
+
+    # assert
+    assert '_check_candidates' in str(ex.value)
+
+
+def test_get_scores_many__base_service__candidates_checked_one_by_one():
+
+    # arrange
+    class LengthService(AntiplagBaseService):
+
+        def check_plagiarism(self, data):
+            assert 'threshold' not in data
+            candidate = data['candidates'][0]
+            return CheckResult(
+                uuid=candidate['uuid'],
+                percent=len(candidate['code']) / 10
+            )
+
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='',
+        candidates=[
+            Candidate(uuid='1', code='x'),
+            Candidate(uuid='2', code='xy'),
+        ],
+        threshold=0.1
+    )
+
+    # act
+    result = LengthService().get_scores_many([data])
+
+    # assert
+    assert result == [{'1': 0.1, '2': 0.2}]
+
+
+def test_get_chunks__balanced_largest_first():
+
+    # arrange
+    candidates = [
+        Candidate(uuid=str(index), code='x' * size)
+        for index, size in enumerate((1, 9, 3, 5, 7, 2))
+    ]
+    service = WinnowService()
+
+    # act
+    chunks = service._get_chunks(candidates=candidates, chunks_count=2)
+
+    # assert
+    assert [[c['uuid'] for c in chunk] for chunk in chunks] == [
+        ['1', '2', '5'],
+        ['4', '3', '0'],
+    ]
+
+
+def test_get_chunks__more_chunks_than_candidates__no_empty_chunks():
+
+    # arrange
+    candidates = get_candidates(2)
+    service = WinnowService()
+
+    # act
+    chunks = service._get_chunks(candidates=candidates, chunks_count=5)
+
+    # assert
+    assert len(chunks) == 2
+
+
+def test_execute__small_list__in_process(mocker):
+
+    # arrange
+    mocker.patch('app.services.base.POOL_SIZE', 4)
+    mocker.patch('app.services.base.POOL_MIN_CANDIDATES', 10)
+    get_process_pool_mock = mocker.patch(
+        'app.services.base.get_process_pool'
+    )
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='x = 1',
+        candidates=get_candidates(9)
+    )
+    service = WinnowService()
+
+    # act
+    result = service._execute(data)
+
+    # assert
+    get_process_pool_mock.assert_not_called()
+    assert list(result) == [f'candidate-{index}' for index in range(9)]
+
+
+def test_execute__large_list__same_as_in_process(mocker):
+
+    # arrange
+    mocker.patch('app.services.base.POOL_SIZE', 2)
+    mocker.patch('app.services.base.POOL_MIN_CANDIDATES', 10)
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='x0 = 5 + 0\nx1 = 5 + 1\nx2 = 5 + 2',
+        candidates=get_candidates(30)
+    )
+    service = WinnowService()
+    expected_result = service._check_candidates(data)
+    check_candidates_spy = mocker.spy(WinnowService, '_check_candidates')
+
+    # act
+    try:
+        result = service._execute(data)
+    finally:
+        reset_process_pool()
+
+    # assert
+    check_candidates_spy.assert_not_called()
+    assert result == expected_result
+    assert list(result) == [f'candidate-{index}' for index in range(30)]
+
+
+class BoundedService(WinnowService):
+
+    """ Детектор с заданными процентами плагиата и их оценками. """
+
+    percents = {}
+    bounds = {}
+
+    def _check_candidates(self, data):
+        return {
+            candidate['uuid']: self.percents[candidate['uuid']]
+            for candidate in data['candidates']
+        }
+
+    def _get_upper_bounds(self, data):
+        return [
+            self.bounds[candidate['uuid']]
+            for candidate in data['candidates']
+        ]
+
+
+def test_execute_bounded__obvious_copy__rest_pruned(mocker):
+
+    # arrange
+    mocker.patch('app.services.base.PRUNING_MIN_CANDIDATES', 2)
+    mocker.patch('app.services.base.PRUNING_BATCH_SIZE', 2)
+    candidates = get_candidates(20)
+    service = BoundedService()
+    service.percents = {c['uuid']: 0.1 for c in candidates}
+    service.bounds = {c['uuid']: 0.5 for c in candidates}
+    service.percents['candidate-7'] = 0.95
+    service.bounds['candidate-7'] = 1.0
+    service.bounds['candidate-3'] = 0.97
+    check_candidates_spy = mocker.spy(BoundedService, '_check_candidates')
+    data = CheckInput(lang=Lang.PYTHON, ref_code='', candidates=candidates)
+
+    # act
+    result = service._execute_bounded(data)
+
+    # assert
+    assert result == {'candidate-3': 0.1, 'candidate-7': 0.95}
+    check_candidates_spy.assert_called_once()
+
+
+def test_execute_bounded__loose_bounds__batches_grow(mocker):
+
+    # arrange
+    mocker.patch('app.services.base.PRUNING_MIN_CANDIDATES', 2)
+    mocker.patch('app.services.base.PRUNING_BATCH_SIZE', 2)
+    candidates = get_candidates(10)
+    service = BoundedService()
+    service.percents = {c['uuid']: 0.1 for c in candidates}
+    service.bounds = {c['uuid']: 1.0 for c in candidates}
+    check_candidates_spy = mocker.spy(BoundedService, '_check_candidates')
+    data = CheckInput(lang=Lang.PYTHON, ref_code='', candidates=candidates)
+
+    # act
+    result = service._execute_bounded(data)
+
+    # assert
+    assert list(result) == [c['uuid'] for c in candidates]
+    assert [
+        len(call.args[1]['candidates'])
+        for call in check_candidates_spy.call_args_list
+    ] == [2, 4, 4]
+
+
+def test_execute_bounded__few_candidates__bounds_not_used(mocker):
+
+    # arrange
+    mocker.patch('app.services.base.PRUNING_MIN_CANDIDATES', 10)
+    get_upper_bounds_mock = mocker.patch.object(
+        BoundedService,
+        '_get_upper_bounds'
+    )
+    candidates = get_candidates(3)
+    service = BoundedService()
+    service.percents = {c['uuid']: 0.1 for c in candidates}
+    data = CheckInput(lang=Lang.PYTHON, ref_code='', candidates=candidates)
+
+    # act
+    result = service._execute_bounded(data)
+
+    # assert
+    get_upper_bounds_mock.assert_not_called()
+    assert len(result) == 3
+
+
+def test_execute_bounded__equal_bound__earlier_candidate_checked(mocker):
+
+    # arrange
+    mocker.patch('app.services.base.PRUNING_MIN_CANDIDATES', 2)
+    mocker.patch('app.services.base.PRUNING_BATCH_SIZE', 1)
+    candidates = get_candidates(4)
+    service = BoundedService()
+    service.percents = {c['uuid']: 0.1 for c in candidates}
+    service.bounds = {c['uuid']: 0.5 for c in candidates}
+    service.percents['candidate-2'] = 0.9
+    service.bounds['candidate-2'] = 1.0
+    service.percents['candidate-1'] = 0.9
+    service.bounds['candidate-1'] = 0.9
+    service.bounds['candidate-3'] = 0.9
+    data = CheckInput(lang=Lang.PYTHON, ref_code='', candidates=candidates)
+
+    # act
+    result = service._execute_bounded(data)
+    full_result = service._execute(data)
+
+    # assert
+    assert result == {'candidate-1': 0.9, 'candidate-2': 0.9}
+    assert (
+        service._get_candidate_with_max_plag(result)
+        == service._get_candidate_with_max_plag(full_result)
+        == {'uuid': 'candidate-1', 'percent': 0.9}
+    )
+
+
+def test_execute_bounded__threshold_reached__stopped(mocker):
+
+    # arrange
+    mocker.patch('app.services.base.PRUNING_MIN_CANDIDATES', 2)
+    mocker.patch('app.services.base.PRUNING_BATCH_SIZE', 2)
+    candidates = get_candidates(10)
+    service = BoundedService()
+    service.percents = {c['uuid']: 0.1 for c in candidates}
+    service.bounds = {c['uuid']: 1.0 for c in candidates}
+    service.percents['candidate-1'] = 0.85
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='',
+        candidates=candidates,
+        threshold=0.8
+    )
+
+    # act
+    result = service._execute_bounded(data)
+
+    # assert
+    assert result == {'candidate-0': 0.1, 'candidate-1': 0.85}
+
+
+def test_execute__threshold_reached__pending_chunks_cancelled(mocker):
+
+    # arrange
+    mocker.patch('app.services.base.POOL_SIZE', 2)
+    mocker.patch('app.services.base.POOL_MIN_CANDIDATES', 2)
+    mocker.patch('app.services.base.POOL_CHUNKS_PER_WORKER', 2)
+    futures = [mocker.Mock() for _ in range(4)]
+    futures[0].result.return_value = {'candidate-0': 0.9}
+    pool_mock = mocker.patch('app.services.base.get_process_pool')
+    pool_mock.return_value.submit.side_effect = futures
+    mocker.patch(
+        'app.services.base.as_completed',
+        side_effect=lambda items: iter(items)
+    )
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='',
+        candidates=get_candidates(4),
+        threshold=0.8
+    )
+
+    # act
+    result = WinnowService()._execute(data)
+
+    # assert
+    assert result == {'candidate-0': 0.9}
+    for future in futures:
+        future.cancel.assert_called_once()
+
+
+def test_execute__repeated_check__cached_scores_used(mocker):
+
+    # arrange
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='x0 = 5 + 0',
+        candidates=get_candidates(5)
+    )
+    service = WinnowService()
+    expected_result = service._execute(data)
+    hits = score_cache.get_stats()['hits']
+    check_candidates_spy = mocker.spy(WinnowService, '_check_candidates')
+
+    # act
+    result = service._execute(data)
+
+    # assert
+    check_candidates_spy.assert_not_called()
+    assert result == expected_result
+    assert score_cache.get_stats()['hits'] == hits + 5
+
+
+def test_execute__partially_cached__missing_checked(mocker):
+
+    # arrange
+    candidates = get_candidates(5)
+    service = WinnowService()
+    service._execute(
+        CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='x0 = 5 + 0',
+            candidates=candidates[:3]
+        )
+    )
+    check_candidates_spy = mocker.spy(WinnowService, '_check_candidates')
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='x0 = 5 + 0',
+        candidates=candidates
+    )
+
+    # act
+    result = service._execute(data)
+
+    # assert
+    assert check_candidates_spy.call_args.args[1]['candidates'] == (
+        candidates[3:]
+    )
+    assert list(result) == [c['uuid'] for c in candidates]
+
+
+def test_execute__version_changed__scores_recomputed(mocker):
+
+    # arrange
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='x0 = 5 + 0',
+        candidates=get_candidates(3)
+    )
+    WinnowService()._execute(data)
+    mocker.patch.object(WinnowService, 'version', 'new')
+    check_candidates_spy = mocker.spy(WinnowService, '_check_candidates')
+
+    # act
+    WinnowService()._execute(data)
+
+    # assert
+    check_candidates_spy.assert_called_once()
+
+
+def test_execute__cache_size_exceeded__old_scores_evicted(mocker):
+
+    # arrange
+    mocker.patch.object(score_cache, 'max_size', 4 * 512)
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='x0 = 5 + 0',
+        candidates=get_candidates(6)
+    )
+
+    evictions = score_cache.get_stats()['evictions']
+
+    # act
+    WinnowService()._execute(data)
+
+    # assert
+    assert len(score_cache) == 4
+    assert score_cache.get_stats()['evictions'] == evictions + 2
+
+
+def test_execute_bounded__cached_best__missing_pruned(mocker):
+
+    # arrange
+    mocker.patch('app.services.base.PRUNING_MIN_CANDIDATES', 2)
+    candidates = get_candidates(10)
+    service = BoundedService()
+    service.percents = {c['uuid']: 0.1 for c in candidates}
+    service.bounds = {c['uuid']: 0.5 for c in candidates}
+    service.percents['candidate-3'] = 0.95
+    service._execute(
+        CheckInput(lang=Lang.PYTHON, ref_code='', candidates=candidates[3:4])
+    )
+    check_candidates_spy = mocker.spy(BoundedService, '_check_candidates')
+    data = CheckInput(lang=Lang.PYTHON, ref_code='', candidates=candidates)
+
+    # act
+    result = service._execute_bounded(data)
+
+    # assert
+    check_candidates_spy.assert_not_called()
+    assert result == {'candidate-3': 0.95}
+
+
+def test_execute__score_store__shared_between_workers(mocker, tmp_path):
+
+    # arrange
+    store = ScoreStore(
+        path=str(tmp_path / 'scores.db'),
+        max_entries=100,
+        ttl=60
+    )
+    mocker.patch('app.services.base.get_score_store', return_value=store)
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='x0 = 5 + 0',
+        candidates=get_candidates(3)
+    )
+    expected_result = WinnowService()._execute(data)
+    # Другой воркер: кеш процесса пуст, база общая
+    score_cache.clear()
+    check_candidates_spy = mocker.spy(WinnowService, '_check_candidates')
+
+    # act
+    result = WinnowService()._execute(data)
+
+    # assert
+    check_candidates_spy.assert_not_called()
+    assert result == expected_result
+    assert len(score_cache) == 3
+
+
+def test_get_scores_many__references_checked_in_pool(mocker):
+
+    # arrange
+    mocker.patch('app.services.base.POOL_SIZE', 2)
+    mocker.patch('app.services.base.POOL_MIN_CANDIDATES', 10)
+    data_list = [
+        CheckInput(
+            lang=Lang.PYTHON,
+            ref_code=f'x{index} = 5 + {index}',
+            candidates=get_candidates(6),
+            threshold=0
+        )
+        for index in range(3)
+    ]
+    service = WinnowService()
+    expected_result = [
+        service._check_candidates({**data, 'threshold': None})
+        for data in data_list
+    ]
+    check_candidates_spy = mocker.spy(WinnowService, '_check_candidates')
+
+    # act
+    try:
+        result = service.get_scores_many(data_list)
+    finally:
+        reset_process_pool()
+
+    # assert
+    check_candidates_spy.assert_not_called()
+    assert result == expected_result
+
+
+def test_get_scores_many__cached_scores_used(mocker):
+
+    # arrange
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='x = 1',
+        candidates=get_candidates(3)
+    )
+    service = WinnowService()
+    service.get_scores_many([data])
+    check_candidates_spy = mocker.spy(WinnowService, '_check_candidates')
+
+    # act
+    result = service.get_scores_many([data, data])
+
+    # assert
+    check_candidates_spy.assert_not_called()
+    assert result[0] == result[1]
+    assert list(result[0]) == [f'candidate-{index}' for index in range(3)]
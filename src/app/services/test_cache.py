@@ -0,0 +1,63 @@
+from app.services.cache import LRUCache, get_hash
+
+
+def test_get_hash__same_parts__same_hash():
+
+    # act
+    first = get_hash('python', 'print(1)')
+    second = get_hash('python', 'print(1)')
+    other = get_hash('python', 'print(2)')
+
+    # assert
+    assert first == second
+    assert first != other
+
+
+def test_lru_cache__get__hit_and_miss_counted():
+
+    # arrange
+    cache = LRUCache(name='test_hits', max_size=100, get_size=len)
+    cache.set('a', 'value')
+
+    # act
+    hit = cache.get('a')
+    miss = cache.get('b')
+
+    # assert
+    assert hit == 'value'
+    assert miss is None
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['misses'] == 1
+    assert cache.get_stats()['hit_ratio'] == 0.5
+
+
+def test_lru_cache__set__least_recently_used_evicted():
+
+    # arrange
+    cache = LRUCache(name='test_eviction', max_size=10, get_size=len)
+    cache.set('a', 'aaaa')
+    cache.set('b', 'bbbb')
+    cache.get('a')
+
+    # act
+    cache.set('c', 'cccc')
+
+    # assert
+    assert cache.get('a') == 'aaaa'
+    assert cache.get('b') is None
+    assert cache.get('c') == 'cccc'
+    assert cache.size == 8
+    assert cache.evictions == 1
+
+
+def test_lru_cache__set__value_larger_than_cache__not_stored():
+
+    # arrange
+    cache = LRUCache(name='test_large', max_size=3, get_size=len)
+
+    # act
+    cache.set('a', 'aaaa')
+
+    # assert
+    assert len(cache) == 0
+    assert cache.size == 0
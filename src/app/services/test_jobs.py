@@ -0,0 +1,163 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app.services import messages
+from app.services.entities import Candidate, CheckInput, CheckResult
+from app.services.enums import JobStatus, Lang
+from app.services.exceptions import UnsupportedQueryException
+from app.services.jobs import JobRunner
+from app.services.main import create_registry
+from app.services.progress import report_progress
+from app.services.store import JobStore
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture()
+def runner(tmp_path):
+    runner = JobRunner(
+        registry=create_registry(),
+        workers=1,
+        store=JobStore(path=str(tmp_path / 'jobs.db'), ttl=60, job_timeout=30)
+    )
+    yield runner
+    runner.shutdown()
+
+
+def get_check_input() -> CheckInput:
+    return CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='print(1)',
+        candidates=[Candidate(uuid='a', code='print(2)')]
+    )
+
+
+def is_finished(runner: JobRunner, job_id: str) -> bool:
+    return runner.get(job_id)['status'] in (JobStatus.DONE, JobStatus.FAILED)
+
+
+def test_job_runner__submit__result_saved(runner, mocker):
+
+    # arrange
+    set_progress_spy = mocker.spy(runner.store, 'set_progress')
+
+    def check(data):
+        report_progress(total=2, done=1)
+        return CheckResult(uuid='a', percent=0.9)
+
+    mocker.patch(
+        'app.services.main.AntiplagService.check',
+        side_effect=check
+    )
+
+    # act
+    job_id = runner.submit(data=get_check_input())
+    wait_for(lambda: is_finished(runner, job_id))
+    result = runner.get(job_id)
+
+    # assert
+    set_progress_spy.assert_called_once_with(job_id, 0.5)
+    assert result['status'] == JobStatus.DONE
+    assert result['progress'] == 1
+    assert result['result'] == {'uuid': 'a', 'percent': 0.9}
+
+
+def test_job_runner__service_exception__error_saved(runner, mocker):
+
+    # arrange
+    mocker.patch(
+        'app.services.main.AntiplagService.check',
+        side_effect=UnsupportedQueryException(details='query')
+    )
+
+    # act
+    job_id = runner.submit(data=get_check_input())
+    wait_for(lambda: is_finished(runner, job_id))
+    result = runner.get(job_id)
+
+    # assert
+    assert result['status'] == JobStatus.FAILED
+    assert result['error'] == {
+        'error': messages.MSG_5,
+        'details': 'query',
+    }
+
+
+def test_job_runner__unexpected_exception__internal_error(runner, mocker):
+
+    # arrange
+    mocker.patch(
+        'app.services.main.AntiplagService.check',
+        side_effect=RuntimeError('boom')
+    )
+
+    # act
+    job_id = runner.submit(data=get_check_input())
+    wait_for(lambda: is_finished(runner, job_id))
+    result = runner.get(job_id)
+
+    # assert
+    assert result['error'] == {'error': messages.MSG_9, 'details': 'boom'}
+
+
+def test_job_runner__callback_url__job_posted(runner, mocker):
+
+    # arrange
+    mocker.patch(
+        'app.services.main.AntiplagService.check',
+        return_value=CheckResult(uuid='a', percent=0.9)
+    )
+    urlopen_mock = mocker.patch('app.services.jobs.urllib.request.urlopen')
+
+    # act
+    job_id = runner.submit(
+        data=get_check_input(),
+        callback_url='http://example.com/done'
+    )
+    wait_for(lambda: urlopen_mock.called)
+
+    # assert
+    request = urlopen_mock.call_args.args[0]
+    assert request.full_url == 'http://example.com/done'
+    assert request.get_method() == 'POST'
+    body = json.loads(request.data)
+    assert body['id'] == job_id
+    assert body['status'] == JobStatus.DONE
+    assert body['result'] == {'uuid': 'a', 'percent': 0.9}
+
+
+def test_job_runner__shutdown__queued_jobs_failed(runner, mocker):
+
+    # arrange
+    started = threading.Event()
+    release = threading.Event()
+
+    def check(data):
+        started.set()
+        release.wait(5)
+        return CheckResult(uuid='a', percent=0.9)
+
+    mocker.patch(
+        'app.services.main.AntiplagService.check',
+        side_effect=check
+    )
+    running_id = runner.submit(data=get_check_input())
+    started.wait(5)
+    queued_id = runner.submit(data=get_check_input())
+
+    # act
+    threading.Timer(0.1, release.set).start()
+    runner.shutdown()
+
+    # assert
+    assert runner.get(running_id)['status'] == JobStatus.DONE
+    assert runner.get(queued_id)['status'] == JobStatus.FAILED
+    assert runner.get(queued_id)['error']['error'] == messages.MSG_8
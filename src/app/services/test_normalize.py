@@ -0,0 +1,181 @@
+import pytest
+
+from app.services.enums import Lang
+from app.services.normalize import (
+    get_content_hash,
+    get_normalized_hash,
+    get_normalized_tokens,
+    normalize_whitespace,
+)
+
+
+@pytest.mark.parametrize('lang', (Lang.CPP, Lang.JAVA))
+def test_normalize_whitespace__cpp_java__indentation_removed(lang):
+
+    # arrange
+    code = 'int main() {\r\n\n    return 0;  \n}\n'
+
+    # act
+    result = normalize_whitespace(code=code, lang=lang)
+
+    # assert
+    assert result == 'int main() {\nreturn 0;\n}'
+
+
+def test_normalize_whitespace__python__indentation_kept():
+
+    # arrange
+    code = 'def f():  \n\n    return 0\n\n'
+
+    # act
+    result = normalize_whitespace(code=code, lang=Lang.PYTHON)
+
+    # assert
+    assert result == 'def f():\n    return 0'
+
+
+def test_normalize_whitespace__sql__canonical_form():
+
+    # arrange
+    code = 'SELECT  id\nFROM users;'
+
+    # act
+    result = normalize_whitespace(code=code, lang=Lang.SQL)
+
+    # assert
+    assert result == 'select\nselect id from users'
+
+
+def test_get_content_hash__sql_leading_comment__different_hash():
+
+    # act
+    commented_hash = get_content_hash(
+        code='-- my note\nselect a from t',
+        lang=Lang.SQL
+    )
+    plain_hash = get_content_hash(code='select a from t', lang=Lang.SQL)
+
+    # assert
+    assert commented_hash != plain_hash
+
+
+def test_get_content_hash__depends_on_lang():
+
+    # act
+    cpp_hash = get_content_hash(code='x', lang=Lang.CPP)
+    java_hash = get_content_hash(code='x', lang=Lang.JAVA)
+
+    # assert
+    assert cpp_hash != java_hash
+
+
+def test_get_normalized_tokens__cpp__comments_removed():
+
+    # arrange
+    code = (
+        '#include  <cstdio>\n'
+        'int main() { /* comment */ return 0; } // end'
+    )
+
+    # act
+    result = get_normalized_tokens(code=code, lang=Lang.CPP)
+
+    # assert
+    assert result == [
+        '#include <cstdio>',
+        'int', 'main', '(', ')', '{', 'return', '0', ';', '}',
+    ]
+
+
+def test_get_normalized_tokens__python__structure_kept():
+
+    # arrange
+    code = 'if a:  # comment\n\n    b()\nc()\n'
+
+    # act
+    result = get_normalized_tokens(code=code, lang=Lang.PYTHON)
+
+    # assert
+    assert result == [
+        'if', 'a', ':', '<NEWLINE>',
+        '<INDENT>', 'b', '(', ')', '<NEWLINE>',
+        '<DEDENT>', 'c', '(', ')', '<NEWLINE>',
+    ]
+
+
+def test_get_normalized_tokens__python_syntax_error__lines():
+
+    # arrange
+    code = 'def f(:\n    """\n'
+
+    # act
+    result = get_normalized_tokens(code=code, lang=Lang.PYTHON)
+
+    # assert
+    assert result == ['def f(:', '    """']
+
+
+@pytest.mark.parametrize(
+    'lang, code',
+    (
+        (Lang.CPP, 'int f(int x) { return x + y; }'),
+        (Lang.JAVA, 'int f(int x) { return x + y; }'),
+        (Lang.PYTHON, 'def f(x):\n    return x + y'),
+        (Lang.SQL, 'SELECT f(x), y FROM t WHERE x > 1'),
+    )
+)
+def test_get_normalized_tokens__rename_identifiers(lang, code):
+
+    # act
+    result = get_normalized_tokens(
+        code=code,
+        lang=lang,
+        rename_identifiers=True
+    )
+
+    # assert
+    assert 'x' not in result and 'y' not in result
+    assert result.count('id2') == 2
+    assert 'id3' in result
+
+
+@pytest.mark.parametrize(
+    'lang, code, other_code',
+    (
+        (Lang.CPP, 'int a = 1; // one', 'int a=1;'),
+        (Lang.JAVA, 'int a = 1; /* one */', 'int  a = 1 ;'),
+        (Lang.PYTHON, 'a = (1,\n     2)', 'a = (1, 2)  # pair'),
+        (Lang.SQL, 'select A from T -- t', 'SELECT a FROM t'),
+    )
+)
+def test_get_normalized_hash__copies_equal(lang, code, other_code):
+
+    # act
+    code_hash = get_normalized_hash(code=code, lang=lang)
+    other_hash = get_normalized_hash(code=other_code, lang=lang)
+
+    # assert
+    assert code_hash == other_hash
+
+
+@pytest.mark.parametrize(
+    'lang, code, other_code',
+    (
+        (Lang.CPP, 'int a = 1;', 'int a = 2;'),
+        (Lang.CPP, 's = "a b";', 's = "a  b";'),
+        (Lang.PYTHON, 'if a:\n    b()\nc()', 'if a:\n    b()\n    c()'),
+        (Lang.PYTHON, 'a = b', 'a = c'),
+    )
+)
+def test_get_normalized_hash__different_code__not_equal(
+    lang,
+    code,
+    other_code
+):
+
+    # act
+    code_hash = get_normalized_hash(code=code, lang=lang)
+    other_hash = get_normalized_hash(code=other_code, lang=lang)
+
+    # assert
+    assert code_hash != other_hash
@@ -0,0 +1,90 @@
+import numpy as np
+
+from app.services.enums import Lang
+from app.services.pairs import (
+    find_similar_pairs,
+    get_clusters,
+    get_lsh_pairs,
+    get_signatures,
+)
+
+REFERENCE = '''
+def solve(items):
+    total = 0
+    for item in items:
+        if item % 2 == 0:
+            total += item * item
+    return total
+'''
+
+RENAMED = '''
+def calc(values):
+    acc = 0
+    for v in values:
+        if v % 2 == 0:
+            acc += v * v
+    return acc
+'''
+
+UNRELATED = '''
+class Node:
+    def __init__(self, value):
+        self.value = value
+        self.children = []
+'''
+
+
+def test_get_signatures__same_shingles__same_signature():
+
+    # arrange
+    shingles = [
+        np.array([1, 2, 3], dtype=np.uint64),
+        np.array([1, 2, 3], dtype=np.uint64),
+        np.array([4, 5, 6], dtype=np.uint64),
+    ]
+
+    # act
+    signatures = get_signatures(shingles, 16)
+
+    # assert
+    assert signatures.shape == (3, 16)
+    assert (signatures[0] == signatures[1]).all()
+    assert not (signatures[0] == signatures[2]).all()
+
+
+def test_get_lsh_pairs__matching_band__paired():
+
+    # arrange
+    signatures = np.array([
+        [1, 2, 3, 4],
+        [1, 2, 5, 6],
+        [7, 8, 9, 10],
+        [0, 0, 9, 10],
+    ], dtype=np.uint64)
+
+    # act
+    pairs = get_lsh_pairs(signatures, bands=2, rows=2)
+
+    # assert
+    assert pairs == {(0, 1), (2, 3)}
+
+
+def test_find_similar_pairs__renamed_copy__paired():
+
+    # arrange
+    codes = [REFERENCE, UNRELATED, RENAMED, '']
+
+    # act
+    pairs = find_similar_pairs(codes, Lang.PYTHON)
+
+    # assert
+    assert pairs == [(0, 2)]
+
+
+def test_get_clusters__connected_components():
+
+    # act
+    clusters = get_clusters(6, [(4, 2), (0, 5), (2, 3)])
+
+    # assert
+    assert clusters == [[0, 5], [2, 3, 4]]
@@ -0,0 +1,194 @@
+import numpy as np
+
+from app.services.enums import Lang
+from app.services.entities import Candidate, CheckInput
+from app.services.prefilter import (
+    PrefilterStats,
+    get_candidate_shingles,
+    get_shingles,
+    get_similarities,
+    get_tokens,
+    select_candidates,
+)
+
+REFERENCE = '''
+def solve(items):
+    total = 0
+    for item in items:
+        if item % 2 == 0:
+            total += item * item
+    return total
+'''
+
+RENAMED = '''
+def calc(values):
+    acc = 0
+    for v in values:
+        if v % 2 == 0:
+            acc += v * v
+    return acc
+'''
+
+UNRELATED = '''
+class Node:
+    def __init__(self, value):
+        self.value = value
+        self.children = []
+'''
+
+
+def get_data(candidates, **options) -> CheckInput:
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code=REFERENCE,
+        candidates=[
+            Candidate(uuid=str(index), code=code)
+            for index, code in enumerate(candidates)
+        ]
+    )
+    if options:
+        data['prefilter'] = options
+    return data
+
+
+def test_get_tokens__python_renamed_identifiers__same_tokens():
+    assert (
+        get_tokens(code=REFERENCE, lang=Lang.PYTHON)
+        == get_tokens(code=RENAMED, lang=Lang.PYTHON)
+    )
+
+
+def test_get_tokens__python_syntax_error__ok():
+    assert get_tokens(code='def f(:\n  "unclosed', lang=Lang.PYTHON)
+
+
+def test_get_shingles__short_sequence__single_shingle():
+
+    # act
+    shingles = get_shingles([1, 2], size=4)
+
+    # assert
+    assert len(shingles) == 1
+    assert len(get_shingles([], size=4)) == 0
+
+
+def test_get_similarities__jaccard():
+
+    # arrange
+    reference = np.array([1, 2, 3, 4], dtype=np.uint64)
+    candidates = [
+        np.array([1, 2, 3, 4], dtype=np.uint64),
+        np.array([3, 4, 5, 6], dtype=np.uint64),
+        np.array([], dtype=np.uint64),
+    ]
+
+    # act
+    result = get_similarities(reference, candidates)
+
+    # assert
+    assert list(result) == [1.0, 2 / 6, 0.0]
+
+
+def test_get_similarities__shared_shingles__not_above_one():
+
+    # arrange
+    reference = np.arange(1, 101, dtype=np.uint64) << np.uint64(40)
+    candidates = [
+        np.array([7, 1 << 40], dtype=np.uint64),
+        np.array([7, 9], dtype=np.uint64),
+        np.array([9, 2 << 40], dtype=np.uint64),
+    ]
+
+    # act
+    result = get_similarities(reference, candidates)
+
+    # assert
+    assert list(result) == [1 / 101, 0.0, 1 / 101]
+
+
+def test_select_candidates__top_k_and_floor():
+
+    # arrange
+    data = get_data(
+        [UNRELATED, RENAMED, UNRELATED, REFERENCE, UNRELATED, ''],
+        enabled=True,
+        top_k=1,
+        floor=0.9
+    )
+
+    # act
+    result = select_candidates(data)
+
+    # assert
+    assert [candidate['uuid'] for candidate in result] == ['1', '3', '5']
+
+
+def test_select_candidates__precomputed_shingles__same_result():
+
+    # arrange
+    data = get_data(
+        [UNRELATED, RENAMED, UNRELATED, REFERENCE, UNRELATED, ''],
+        enabled=True,
+        top_k=1,
+        floor=0.9
+    )
+    shingles = get_candidate_shingles(data)
+
+    # act
+    result = select_candidates(data, shingles)
+
+    # assert
+    assert result == select_candidates(data)
+
+
+def test_select_candidates__few_candidates__not_applied():
+
+    # arrange
+    data = get_data([UNRELATED, RENAMED], enabled=True, top_k=2)
+
+    # act
+    result = select_candidates(data)
+
+    # assert
+    assert result is None
+
+
+def test_select_candidates__disabled__not_applied():
+
+    # arrange
+    data = get_data([UNRELATED] * 5, enabled=False, top_k=1)
+
+    # act
+    result = select_candidates(data)
+
+    # assert
+    assert result is None
+
+
+def test_select_candidates__default_config__not_applied():
+
+    # arrange
+    data = get_data([UNRELATED] * 5, top_k=1)
+
+    # act
+    result = select_candidates(data)
+
+    # assert
+    assert result is None
+
+
+def test_prefilter_stats__recall():
+
+    # arrange
+    stats = PrefilterStats(name='test_prefilter')
+    selected = [Candidate(uuid='1', code='')]
+
+    # act
+    stats.add_audit(result={'uuid': '1', 'percent': 0.5}, selected=selected)
+    stats.add_audit(result={'uuid': None, 'percent': 0}, selected=selected)
+    stats.add_audit(result={'uuid': '2', 'percent': 0.7}, selected=selected)
+    stats.add_audit(result={'uuid': '1', 'percent': 0.9}, selected=selected)
+
+    # assert
+    assert stats.get_stats()['audits'] == 4
+    assert stats.get_stats()['recall'] == 0.75
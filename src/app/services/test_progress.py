@@ -0,0 +1,54 @@
+from app.services.progress import (
+    Progress,
+    report_copies,
+    report_progress,
+    track_progress,
+)
+
+
+def test_report_progress__tracked__fraction_reported():
+
+    # arrange
+    fractions = []
+    progress = Progress(on_change=fractions.append, step=0.25)
+
+    # act
+    with track_progress(progress):
+        report_progress(total=10)
+        report_progress(done=1)
+        report_progress(done=2)
+        report_progress(done=7)
+
+    # assert
+    assert fractions == [0.3, 1.0]
+
+
+def test_report_progress__not_tracked__ignored():
+
+    # arrange
+    fractions = []
+    progress = Progress(on_change=fractions.append)
+
+    # act
+    with track_progress(progress):
+        pass
+    report_progress(total=1, done=1)
+
+    # assert
+    assert fractions == []
+    assert progress.total == 0
+
+
+def test_report_progress__copies__scores_expanded():
+
+    # arrange
+    scores = []
+    progress = Progress(on_scores=scores.append)
+
+    # act
+    with track_progress(progress):
+        report_copies({'a': ['a', 'c']})
+        report_progress(scores={'a': 0.5, 'b': 0.1})
+
+    # assert
+    assert scores == [{'a': 0.5, 'c': 0.5, 'b': 0.1}]
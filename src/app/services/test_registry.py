@@ -0,0 +1,303 @@
+import importlib
+
+import pytest
+
+from app.services.base import (
+    AntiplagBaseService,
+    AntiplagPoolService,
+    warm_up_process_pool,
+)
+from app.services.entities import CheckResult
+from app.services.enums import Lang
+from app.services.exceptions import EngineException, LanguageException
+from app.services.registry import EngineRegistry
+
+
+class FirstService(AntiplagBaseService):
+
+    engine = 'first'
+
+    def check_plagiarism(self, data):
+        return CheckResult(uuid=None, percent=0)
+
+
+class SecondService(FirstService):
+
+    engine = 'second'
+
+
+class PoolService(AntiplagPoolService):
+
+    engine = 'pool'
+
+    def check_plagiarism(self, data):
+        return CheckResult(uuid=None, percent=0)
+
+    def _check_candidates(self, data, **context):
+        return {}
+
+
+def test_get_service__first_registered__default():
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register(Lang.PYTHON, FirstService)
+    registry.register(Lang.PYTHON, SecondService)
+
+    # act
+    service = registry.get_service(Lang.PYTHON)
+
+    # assert
+    assert type(service) is FirstService
+    assert service is registry.get_service(Lang.PYTHON, 'first')
+
+
+def test_get_service__registered_as_default__ok():
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register(Lang.PYTHON, FirstService)
+    registry.register(Lang.PYTHON, SecondService, default=True)
+
+    # act
+    service = registry.get_service(Lang.PYTHON)
+
+    # assert
+    assert type(service) is SecondService
+
+
+def test_get_service__unknown_lang__raise_exception():
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register(Lang.PYTHON, FirstService)
+
+    # act
+    with pytest.raises(LanguageException):
+        registry.get_service(Lang.SQL)
+
+
+def test_get_service__unknown_engine__raise_exception():
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register(Lang.PYTHON, FirstService)
+
+    # act
+    with pytest.raises(EngineException):
+        registry.get_service(Lang.PYTHON, 'second')
+
+
+def test_set_default_engine__not_registered__raise_exception():
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register(Lang.PYTHON, FirstService)
+
+    # act
+    with pytest.raises(EngineException):
+        registry.set_default_engine(Lang.PYTHON, 'second')
+
+
+def test_register_lazy__loaded_on_first_use(mocker):
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register_lazy(
+        Lang.PYTHON,
+        'first',
+        'app.services.test_registry:FirstService'
+    )
+    import_module_mock = mocker.patch(
+        'app.services.registry.importlib.import_module',
+        wraps=importlib.import_module
+    )
+
+    # act
+    service = registry.get_service(Lang.PYTHON)
+
+    # assert
+    assert type(service) is FirstService
+    assert service is registry.get_service(Lang.PYTHON, 'first')
+    import_module_mock.assert_called_once_with('app.services.test_registry')
+    assert set(registry.get_stats()['first']) == {
+        'import_time',
+        'boot_time',
+    }
+
+
+def test_register_lazy__not_used__not_loaded():
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register_lazy(Lang.PYTHON, 'first', 'missing.module:Service')
+
+    # act
+    registry.set_default_engine(Lang.PYTHON, 'first')
+
+    # assert
+    assert registry.get_stats() == {}
+    with pytest.raises(EngineException):
+        registry.get_service(Lang.PYTHON, 'second')
+
+
+def test_register_lazy__loaded_after_startup__service_started(mocker):
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register_lazy(
+        Lang.PYTHON,
+        'first',
+        'app.services.test_registry:FirstService'
+    )
+    startup_mock = mocker.patch.object(FirstService, 'startup')
+    registry.startup()
+    startup_mock.assert_not_called()
+
+    # act
+    registry.get_service(Lang.PYTHON)
+
+    # assert
+    startup_mock.assert_called_once_with()
+
+
+def test_register_lazy__pool_service_loaded_in_request__pool_not_started(
+    mocker
+):
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register_lazy(
+        Lang.PYTHON,
+        'pool',
+        'app.services.test_registry:PoolService'
+    )
+    warm_up_mock = mocker.patch(
+        'app.services.registry.warm_up_process_pool'
+    )
+    registry.startup()
+
+    # act
+    registry.get_service(Lang.PYTHON)
+
+    # assert
+    warm_up_mock.assert_not_called()
+
+
+def test_startup__pool_service_loaded__pool_started(mocker):
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register(Lang.PYTHON, PoolService)
+    warm_up_mock = mocker.patch(
+        'app.services.registry.warm_up_process_pool'
+    )
+
+    # act
+    registry.startup()
+
+    # assert
+    warm_up_mock.assert_called_once_with()
+
+
+def test_startup__no_pool_service__pool_not_started(mocker):
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register(Lang.PYTHON, FirstService)
+    warm_up_mock = mocker.patch(
+        'app.services.registry.warm_up_process_pool'
+    )
+
+    # act
+    registry.startup()
+
+    # assert
+    warm_up_mock.assert_not_called()
+
+
+def test_load_all__all_services_loaded():
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register_lazy(
+        Lang.PYTHON,
+        'first',
+        'app.services.test_registry:FirstService'
+    )
+    registry.register_lazy(
+        Lang.SQL,
+        'second',
+        'app.services.test_registry:SecondService'
+    )
+
+    # act
+    registry.load_all()
+
+    # assert
+    assert type(registry._services[Lang.PYTHON]['first']) is FirstService
+    assert type(registry._services[Lang.SQL]['second']) is SecondService
+
+
+def test_startup__services_started(mocker):
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register(Lang.PYTHON, FirstService)
+    registry.register(Lang.SQL, SecondService)
+    startup_mock = mocker.patch.object(FirstService, 'startup')
+
+    # act
+    registry.startup()
+
+    # assert
+    assert startup_mock.call_count == 2
+
+
+def test_shutdown__process_pool_drained(mocker):
+
+    # arrange
+    registry = EngineRegistry()
+    registry.register(Lang.PYTHON, FirstService)
+    reset_process_pool_mock = mocker.patch(
+        'app.services.registry.reset_process_pool'
+    )
+
+    # act
+    registry.shutdown()
+
+    # assert
+    reset_process_pool_mock.assert_called_once_with(wait=True)
+
+
+def test_warm_up_process_pool__workers_started(mocker):
+
+    # arrange
+    mocker.patch('app.services.base.POOL_WARM_UP', True)
+    mocker.patch('app.services.base.POOL_SIZE', 3)
+    mocker.patch('app.services.base._pool', None)
+    get_process_pool_mock = mocker.patch(
+        'app.services.base.get_process_pool'
+    )
+    mocker.patch('app.services.base.wait')
+
+    # act
+    warm_up_process_pool()
+
+    # assert
+    assert get_process_pool_mock.return_value.submit.call_count == 3
+
+
+def test_warm_up_process_pool__disabled__pool_not_started(mocker):
+
+    # arrange
+    mocker.patch('app.services.base.POOL_WARM_UP', False)
+    get_process_pool_mock = mocker.patch(
+        'app.services.base.get_process_pool'
+    )
+
+    # act
+    warm_up_process_pool()
+
+    # assert
+    get_process_pool_mock.assert_not_called()
@@ -1,18 +1,24 @@
+import threading
+
 import pytest
 from app.services.base import AntiplagBaseService
 from app.services.main import AntiplagService
-from app.services.enums import Lang
+from app.services.enums import CheckEventType, Engine, Lang
 from app.services.entities import (
+    BatchCheckInput,
     CheckInput,
+    PairsInput,
     CheckResult,
     Candidate
 )
 
 from app.services.exceptions import (
     CandidatesException,
+    EngineException,
     LanguageException,
 )
 from app.services import messages
+from app.services.sql.service import SqlPlagService
 
 
 class TestAntiplagBaseService:
@@ -109,7 +115,7 @@ class TestAntiplagService:
             candidates=[
                 Candidate(
                     uuid='9asd2',
-                    code='some code'
+                    code='other code'
                 )
             ]
         )
@@ -139,7 +145,7 @@ class TestAntiplagService:
             candidates=[
                 Candidate(
                     uuid='9asd2',
-                    code='some code'
+                    code='other code'
                 )
             ]
         )
@@ -169,7 +175,7 @@ class TestAntiplagService:
             candidates=[
                 Candidate(
                     uuid='9asd2',
-                    code='some code'
+                    code='other code'
                 )
             ]
         )
@@ -178,7 +184,8 @@ class TestAntiplagService:
             percent=50.9
         )
         check_plagiarism_mock = mocker.patch(
-            'app.services.main.PycodeSimilarService.check_plagiarism',
+            'app.services.pycode.service.'
+            'PycodeSimilarService.check_plagiarism',
             return_value=check_result
         )
         service = AntiplagService()
@@ -208,7 +215,7 @@ class TestAntiplagService:
             percent=0.7
         )
         check_plagiarism_mock = mocker.patch(
-            'app.services.main.SqlPlagService.check_plagiarism',
+            'app.services.sql.service.SqlPlagService.check_plagiarism',
             return_value=check_result
         )
         service = AntiplagService()
@@ -229,7 +236,7 @@ class TestAntiplagService:
             candidates=[
                 Candidate(
                     uuid='9asd2',
-                    code='some code'
+                    code='other code'
                 )
             ]
         )
@@ -240,3 +247,620 @@ class TestAntiplagService:
 
         # assert
         assert ex.value.message == messages.MSG_2
+
+    def test_check__engine_gst__call_gst_service__ok(self, mocker):
+
+        # arrange
+        check_input = CheckInput(
+            lang=Lang.JAVA,
+            engine=Engine.GST,
+            ref_code='some code',
+            candidates=[
+                Candidate(
+                    uuid='9asd2',
+                    code='other code'
+                )
+            ]
+        )
+        check_result = CheckResult(
+            uuid='9asd2',
+            percent=1.0
+        )
+        check_plagiarism_mock = mocker.patch(
+            'app.services.gst.service.GstService.check_plagiarism',
+            return_value=check_result
+        )
+        sim_check_plagiarism_mock = mocker.patch(
+            'app.services.sim.service.SimService.check_plagiarism'
+        )
+        service = AntiplagService()
+
+        # act
+        result = service.check(data=check_input)
+
+        # assert
+        check_plagiarism_mock.assert_called_once_with(check_input)
+        sim_check_plagiarism_mock.assert_not_called()
+        assert result == check_result
+
+    def test_check__default_engine_from_config__ok(self, mocker):
+
+        # arrange
+        check_input = CheckInput(
+            lang=Lang.CPP,
+            ref_code='some code',
+            candidates=[
+                Candidate(
+                    uuid='9asd2',
+                    code='other code'
+                )
+            ]
+        )
+        mocker.patch('app.services.main.CPP_ENGINE', Engine.GST)
+        check_plagiarism_mock = mocker.patch(
+            'app.services.gst.service.GstService.check_plagiarism'
+        )
+
+        # act
+        AntiplagService().check(data=check_input)
+
+        # assert
+        check_plagiarism_mock.assert_called_once_with(check_input)
+
+    def test_check__engine_not_supported_by_lang__raise_exception(self):
+
+        # arrange
+        check_input = CheckInput(
+            lang=Lang.PYTHON,
+            engine=Engine.SIM,
+            ref_code='some code',
+            candidates=[
+                Candidate(
+                    uuid='9asd2',
+                    code='other code'
+                )
+            ]
+        )
+
+        # act
+        with pytest.raises(EngineException) as ex:
+            AntiplagService().check(data=check_input)
+
+        # assert
+        assert ex.value.message == messages.MSG_6
+
+    def test_check__prefilter__selected_candidates_checked(self, mocker):
+
+        # arrange
+        candidates = [
+            Candidate(uuid=str(index), code=f'code_{index}')
+            for index in range(3)
+        ]
+        check_input = CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='some code',
+            candidates=candidates
+        )
+        mocker.patch(
+            'app.services.main.select_candidates',
+            return_value=candidates[1:2]
+        )
+        mocker.patch(
+            'app.services.main.prefilter_stats.should_audit',
+            return_value=False
+        )
+        check_plagiarism_mock = mocker.patch(
+            'app.services.pycode.service.PycodeSimilarService.check_plagiarism'
+        )
+
+        # act
+        AntiplagService().check(data=check_input)
+
+        # assert
+        check_plagiarism_mock.assert_called_once_with(
+            CheckInput(
+                lang=Lang.PYTHON,
+                ref_code='some code',
+                candidates=candidates[1:2]
+            )
+        )
+
+    def test_check__prefilter_audit__all_candidates_checked(self, mocker):
+
+        # arrange
+        candidates = [
+            Candidate(uuid=str(index), code=f'code_{index}')
+            for index in range(3)
+        ]
+        check_input = CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='some code',
+            candidates=candidates
+        )
+        mocker.patch(
+            'app.services.main.select_candidates',
+            return_value=candidates[1:2]
+        )
+        mocker.patch(
+            'app.services.main.prefilter_stats.should_audit',
+            return_value=True
+        )
+        add_audit_mock = mocker.patch(
+            'app.services.main.prefilter_stats.add_audit'
+        )
+        check_result = CheckResult(uuid='2', percent=0.5)
+        check_plagiarism_mock = mocker.patch(
+            'app.services.pycode.service.'
+            'PycodeSimilarService.check_plagiarism',
+            return_value=check_result
+        )
+
+        # act
+        result = AntiplagService().check(data=check_input)
+
+        # assert
+        check_plagiarism_mock.assert_called_once_with(check_input)
+        add_audit_mock.assert_called_once_with(
+            result=check_result,
+            selected=candidates[1:2]
+        )
+        assert result == check_result
+
+    def test_check__duplicate_candidates__checked_once(self, mocker):
+
+        # arrange
+        candidates = [
+            Candidate(uuid='1', code='a = 1\n'),
+            Candidate(uuid='2', code='b = 2'),
+            Candidate(uuid='3', code='a = 1   \r\n\n'),
+            Candidate(uuid='4', code='a = 1'),
+        ]
+        check_input = CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='x = 0',
+            candidates=candidates
+        )
+        check_result = CheckResult(uuid='1', percent=1.0)
+        check_plagiarism_mock = mocker.patch(
+            'app.services.pycode.service.'
+            'PycodeSimilarService.check_plagiarism',
+            return_value=check_result
+        )
+
+        # act
+        result = AntiplagService().check(data=check_input)
+
+        # assert
+        check_plagiarism_mock.assert_called_once_with(
+            CheckInput(
+                lang=Lang.PYTHON,
+                ref_code='x = 0',
+                candidates=candidates[:2]
+            )
+        )
+        assert result == check_result
+
+    def test_check__sql_leading_comment__same_result_as_engine(self):
+
+        # arrange
+        check_input = CheckInput(
+            lang=Lang.SQL,
+            ref_code='select a from t',
+            candidates=[
+                Candidate(uuid='A', code='-- my note\nselect a from t'),
+                Candidate(uuid='B', code='select a from t'),
+            ]
+        )
+
+        # act
+        result = AntiplagService().check(data=check_input)
+
+        # assert
+        assert result == SqlPlagService().check_plagiarism(data=check_input)
+        assert result == CheckResult(uuid='B', percent=1.0)
+
+    def test_check__python_indentation_differs__not_grouped(self, mocker):
+
+        # arrange
+        candidates = [
+            Candidate(uuid='1', code='if a:\n    b()\nc()'),
+            Candidate(uuid='2', code='if a:\n    b()\n    c()'),
+        ]
+        check_input = CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='a = 1',
+            candidates=candidates
+        )
+        check_plagiarism_mock = mocker.patch(
+            'app.services.pycode.service.PycodeSimilarService.check_plagiarism'
+        )
+
+        # act
+        AntiplagService().check(data=check_input)
+
+        # assert
+        check_plagiarism_mock.assert_called_once_with(check_input)
+
+    @pytest.mark.parametrize(
+        'lang, ref_code, code',
+        (
+            (
+                Lang.CPP,
+                'int main() { return 0; }',
+                '// copy\nint main()\n{\n    return 0; /* ok */\n}\n'
+            ),
+            (
+                Lang.JAVA,
+                'class A { }',
+                'class A {\n    // empty\n}'
+            ),
+            (
+                Lang.PYTHON,
+                'def f(a):\n    return a',
+                '# copy\ndef f(a):  # f\n\n    return a\n'
+            ),
+        )
+    )
+    def test_check__exact_copy__engine_not_called(
+        self,
+        mocker,
+        lang,
+        ref_code,
+        code
+    ):
+
+        # arrange
+        check_input = CheckInput(
+            lang=lang,
+            ref_code=ref_code,
+            candidates=[
+                Candidate(uuid='1', code='other code'),
+                Candidate(uuid='2', code=code),
+                Candidate(uuid='3', code=ref_code),
+            ]
+        )
+        service_cls = type(AntiplagService().registry.get_service(lang))
+        check_plagiarism_mock = mocker.patch.object(
+            service_cls,
+            'check_plagiarism'
+        )
+
+        # act
+        result = AntiplagService().check(data=check_input)
+
+        # assert
+        check_plagiarism_mock.assert_not_called()
+        assert result == CheckResult(uuid='2', percent=1.0)
+
+    def test_check__renamed_copy__engine_called(self, mocker):
+
+        # arrange
+        check_input = CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='def f(a):\n    return a',
+            candidates=[
+                Candidate(uuid='1', code='def g(b):\n    return b'),
+            ]
+        )
+        check_plagiarism_mock = mocker.patch(
+            'app.services.pycode.service.PycodeSimilarService.check_plagiarism'
+        )
+
+        # act
+        AntiplagService().check(data=check_input)
+
+        # assert
+        check_plagiarism_mock.assert_called_once_with(check_input)
+
+    def test_check__renamed_copy__rename_identifiers__engine_not_called(
+        self,
+        mocker
+    ):
+
+        # arrange
+        check_input = CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='def f(a):\n    return a',
+            candidates=[
+                Candidate(uuid='1', code='def g(b):\n    return b'),
+            ]
+        )
+        mocker.patch(
+            'app.services.main.EXACT_MATCH_RENAME_IDENTIFIERS',
+            True
+        )
+        check_plagiarism_mock = mocker.patch(
+            'app.services.pycode.service.PycodeSimilarService.check_plagiarism'
+        )
+
+        # act
+        result = AntiplagService().check(data=check_input)
+
+        # assert
+        check_plagiarism_mock.assert_not_called()
+        assert result == CheckResult(uuid='1', percent=1.0)
+
+    def test_check__exact_match_disabled__engine_called(self, mocker):
+
+        # arrange
+        check_input = CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='a = 1',
+            candidates=[Candidate(uuid='1', code='a = 1')]
+        )
+        mocker.patch('app.services.main.EXACT_MATCH_ENABLED', False)
+        check_plagiarism_mock = mocker.patch(
+            'app.services.pycode.service.PycodeSimilarService.check_plagiarism'
+        )
+
+        # act
+        AntiplagService().check(data=check_input)
+
+        # assert
+        check_plagiarism_mock.assert_called_once_with(check_input)
+
+    def test_check_batch__results_in_reference_order(self, mocker):
+
+        # arrange
+        candidates = [
+            Candidate(uuid='1', code='a = 1'),
+            Candidate(uuid='2', code='b = 2'),
+        ]
+        batch_input = BatchCheckInput(
+            lang=Lang.PYTHON,
+            ref_codes=['x = 0', 'a = 1', 'y = 3'],
+            candidates=candidates
+        )
+        check_plagiarism_mock = mocker.patch(
+            'app.services.pycode.service.'
+            'PycodeSimilarService.check_plagiarism',
+            side_effect=[
+                CheckResult(uuid='2', percent=0.4),
+                CheckResult(uuid='1', percent=0.6),
+            ]
+        )
+
+        # act
+        result = AntiplagService().check_batch(data=batch_input)
+
+        # assert
+        assert result == [
+            CheckResult(uuid='2', percent=0.4),
+            CheckResult(uuid='1', percent=1.0),
+            CheckResult(uuid='1', percent=0.6),
+        ]
+        assert [
+            call.args[0]['ref_code']
+            for call in check_plagiarism_mock.call_args_list
+        ] == ['x = 0', 'y = 3']
+
+    def test_check_batch__candidates_prepared_once(self, mocker):
+
+        # arrange
+        candidates = [
+            Candidate(uuid=str(index), code=f'code_{index} = {index}')
+            for index in range(3)
+        ]
+        batch_input = BatchCheckInput(
+            lang=Lang.PYTHON,
+            ref_codes=['x = 0', 'y = 1'],
+            candidates=candidates,
+            prefilter={'enabled': True, 'top_k': 1}
+        )
+        get_candidate_shingles_mock = mocker.patch(
+            'app.services.main.get_candidate_shingles'
+        )
+        select_candidates_mock = mocker.patch(
+            'app.services.main.select_candidates',
+            return_value=candidates[:1]
+        )
+        mocker.patch(
+            'app.services.main.prefilter_stats.should_audit',
+            return_value=False
+        )
+        get_normalized_hash_mock = mocker.patch(
+            'app.services.main.get_normalized_hash',
+            side_effect=lambda code, **kwargs: code
+        )
+        check_plagiarism_many_mock = mocker.patch(
+            'app.services.pycode.service.'
+            'PycodeSimilarService.check_plagiarism_many',
+            return_value=[
+                CheckResult(uuid='0', percent=0.1),
+                CheckResult(uuid='0', percent=0.2),
+            ]
+        )
+
+        # act
+        AntiplagService().check_batch(data=batch_input)
+
+        # assert
+        get_candidate_shingles_mock.assert_called_once()
+        for call in select_candidates_mock.call_args_list:
+            assert call.args[1] is get_candidate_shingles_mock.return_value
+        # Хеши кандидатов вычисляются один раз, эталонов - для каждого
+        assert get_normalized_hash_mock.call_count == 5
+        check_plagiarism_many_mock.assert_called_once()
+        inputs = check_plagiarism_many_mock.call_args.args[0]
+        assert [data['candidates'] for data in inputs] == [
+            candidates[:1],
+            candidates[:1],
+        ]
+
+    def test_check_pairs__edges_and_clusters(self, mocker):
+
+        # arrange
+        submissions = [
+            Candidate(uuid='1', code='def f(a):\n    return a + 1\n'),
+            Candidate(uuid='2', code='print(2)'),
+            Candidate(uuid='3', code='def f(a):\n    return a + 2\n'),
+            Candidate(uuid='4', code='def f(a):\n\n    return a + 1'),
+        ]
+        pairs_input = PairsInput(
+            lang=Lang.PYTHON,
+            submissions=submissions,
+            threshold=0.5
+        )
+        find_similar_pairs_mock = mocker.patch(
+            'app.services.main.find_similar_pairs',
+            return_value=[(0, 1), (0, 2), (1, 2)]
+        )
+        get_scores_many_mock = mocker.patch(
+            'app.services.pycode.service.'
+            'PycodeSimilarService.get_scores_many',
+            return_value=[{'1': 0.1}, {'1': 0.9, '2': 0.2}]
+        )
+
+        # act
+        result = AntiplagService().check_pairs(data=pairs_input)
+
+        # assert
+        find_similar_pairs_mock.assert_called_once_with(
+            [submission['code'] for submission in submissions[:3]],
+            Lang.PYTHON
+        )
+        get_scores_many_mock.assert_called_once_with([
+            CheckInput(
+                lang=Lang.PYTHON,
+                ref_code=submissions[1]['code'],
+                candidates=submissions[:1]
+            ),
+            CheckInput(
+                lang=Lang.PYTHON,
+                ref_code=submissions[2]['code'],
+                candidates=submissions[:2]
+            ),
+        ])
+        assert result == {
+            'edges': [
+                {'first': '1', 'second': '3', 'percent': 0.9},
+                {'first': '1', 'second': '4', 'percent': 1.0},
+                {'first': '3', 'second': '4', 'percent': 0.9},
+            ],
+            'clusters': [['1', '3', '4']],
+        }
+
+    def test_check_stream__scores_then_result(self, mocker):
+
+        # arrange
+        mocker.patch('app.services.base.POOL_SIZE', 1)
+        check_input = CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='stream = 0',
+            candidates=[
+                Candidate(uuid='1', code='stream_a = 1\n'),
+                Candidate(uuid='2', code='stream_b = 2'),
+                Candidate(uuid='3', code='stream_a = 1   \n\n'),
+            ]
+        )
+        percents = {'stream_a = 1\n': 0.3, 'stream_b = 2': 0.7}
+        mocker.patch(
+            'app.services.pycode.service.'
+            'PycodeSimilarService._get_percent_from_pycode_candidate',
+            side_effect=lambda reference_infos, candidate_code: (
+                percents[candidate_code]
+            )
+        )
+
+        # act
+        events = list(AntiplagService().check_stream(data=check_input))
+
+        # assert
+        assert events == [
+            {'type': CheckEventType.SCORE, 'uuid': '1', 'percent': 0.3},
+            {'type': CheckEventType.SCORE, 'uuid': '3', 'percent': 0.3},
+            {'type': CheckEventType.SCORE, 'uuid': '2', 'percent': 0.7},
+            {'type': CheckEventType.RESULT, 'uuid': '2', 'percent': 0.7},
+        ]
+
+    def test_check_stream__in_process__score_sent_before_last_checked(
+        self,
+        mocker
+    ):
+
+        # arrange
+        mocker.patch('app.services.base.POOL_SIZE', 1)
+        check_input = CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='incremental = 0',
+            candidates=[
+                Candidate(uuid=str(index), code=f'incremental_{index} = 1')
+                for index in range(3)
+            ]
+        )
+        first_received = threading.Event()
+        checked = []
+
+        def get_percent(reference_infos, candidate_code):
+            if len(checked) == 2:
+                # Последний кандидат проверяется только после того,
+                # как клиент получил процент первого
+                assert first_received.wait(5)
+            checked.append(candidate_code)
+            return 0.1 * len(checked)
+
+        mocker.patch(
+            'app.services.pycode.service.'
+            'PycodeSimilarService._get_percent_from_pycode_candidate',
+            side_effect=get_percent
+        )
+        events = AntiplagService().check_stream(data=check_input)
+
+        # act
+        first_event = next(events)
+        checked_before_first = len(checked)
+        first_received.set()
+        rest = list(events)
+
+        # assert
+        assert first_event == {
+            'type': CheckEventType.SCORE,
+            'uuid': '0',
+            'percent': 0.1,
+        }
+        assert checked_before_first < 3
+        assert [event['type'] for event in rest] == [
+            CheckEventType.SCORE,
+            CheckEventType.SCORE,
+            CheckEventType.RESULT,
+        ]
+
+    def test_check_stream__exact_copy__score_and_result(self):
+
+        # arrange
+        check_input = CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='x = 0',
+            candidates=[
+                Candidate(uuid='1', code='y = 1'),
+                Candidate(uuid='2', code='x = 0\n'),
+            ]
+        )
+
+        # act
+        events = list(AntiplagService().check_stream(data=check_input))
+
+        # assert
+        assert events == [
+            {'type': CheckEventType.SCORE, 'uuid': '2', 'percent': 1.0},
+            {'type': CheckEventType.RESULT, 'uuid': '2', 'percent': 1.0},
+        ]
+
+    def test_check_stream__service_exception__error(self):
+
+        # arrange
+        check_input = CheckInput(
+            lang='go',
+            ref_code='x = 0',
+            candidates=[Candidate(uuid='1', code='y = 1')]
+        )
+
+        # act
+        events = list(AntiplagService().check_stream(data=check_input))
+
+        # assert
+        assert events == [{
+            'type': CheckEventType.ERROR,
+            'error': messages.MSG_2,
+            'details': None,
+        }]
@@ -0,0 +1,290 @@
+import threading
+import time
+
+import pytest
+
+from app.services.entities import Candidate, CheckInput
+from app.services.enums import Lang
+from app.services.exceptions import (
+    ServiceException,
+    UnsupportedQueryException,
+)
+from app.services.singleflight import SingleFlight, get_request_key
+from app.services.store import FlightStore
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def run_in_thread(func):
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = func()
+        except Exception as ex:
+            outcome['error'] = ex
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, outcome
+
+
+@pytest.fixture()
+def flight_store(tmp_path, mocker):
+    store = FlightStore(
+        path=str(tmp_path / 'scores.db'),
+        lease=60,
+        result_ttl=5
+    )
+    mocker.patch(
+        'app.services.singleflight.get_flight_store',
+        return_value=store
+    )
+    return store
+
+
+def test_get_request_key__fields_order__same_key():
+
+    # arrange
+    data = CheckInput(
+        lang=Lang.PYTHON,
+        ref_code='a = 1',
+        candidates=[Candidate(uuid='1', code='b = 2')]
+    )
+    other_data = {
+        'candidates': [{'code': 'b = 2', 'uuid': '1'}],
+        'ref_code': 'a = 1',
+        'lang': Lang.PYTHON,
+    }
+
+    # act
+    key = get_request_key(data)
+    other_key = get_request_key(other_data)
+
+    # assert
+    assert key == other_key
+
+
+def test_single_flight__concurrent_calls__computed_once():
+
+    # arrange
+    single_flight = SingleFlight(name='test_single_flight')
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {'uuid': '1', 'percent': 0.5}
+
+    leader, leader_outcome = run_in_thread(
+        lambda: single_flight.do('key', compute)
+    )
+    wait_for(lambda: calls)
+    follower, follower_outcome = run_in_thread(
+        lambda: single_flight.do('key', compute)
+    )
+    wait_for(lambda: single_flight.followers == 1)
+
+    # act
+    release.set()
+    leader.join()
+    follower.join()
+
+    # assert
+    assert len(calls) == 1
+    assert leader_outcome['result'] == {'uuid': '1', 'percent': 0.5}
+    assert follower_outcome['result'] == {'uuid': '1', 'percent': 0.5}
+    assert single_flight.get_stats()['in_flight'] == 0
+
+
+def test_single_flight__error__raised_for_all_callers():
+
+    # arrange
+    single_flight = SingleFlight(name='test_single_flight')
+    release = threading.Event()
+    started = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise UnsupportedQueryException()
+
+    leader, leader_outcome = run_in_thread(
+        lambda: single_flight.do('key', compute)
+    )
+    started.wait(5)
+    follower, follower_outcome = run_in_thread(
+        lambda: single_flight.do('key', compute)
+    )
+    wait_for(lambda: single_flight.followers == 1)
+
+    # act
+    release.set()
+    leader.join()
+    follower.join()
+
+    # assert
+    assert isinstance(leader_outcome['error'], UnsupportedQueryException)
+    assert follower_outcome['error'] is leader_outcome['error']
+
+
+def test_single_flight__sequential_calls__computed_each_time():
+
+    # arrange
+    single_flight = SingleFlight(name='test_single_flight')
+    results = iter((1, 2))
+
+    # act
+    first = single_flight.do('key', lambda: next(results))
+    second = single_flight.do('key', lambda: next(results))
+
+    # assert
+    assert (first, second) == (1, 2)
+
+
+def test_single_flight__other_worker__result_shared(flight_store, mocker):
+
+    # arrange
+    leader_worker = SingleFlight(name='test_single_flight')
+    follower_worker = SingleFlight(name='test_single_flight')
+    release = threading.Event()
+    started = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return {'uuid': '1', 'percent': 0.5}
+
+    follower_compute = mocker.Mock()
+    leader, leader_outcome = run_in_thread(
+        lambda: leader_worker.do('key', compute)
+    )
+    started.wait(5)
+    follower, follower_outcome = run_in_thread(
+        lambda: follower_worker.do('key', follower_compute)
+    )
+
+    # act
+    release.set()
+    leader.join()
+    follower.join()
+
+    # assert
+    follower_compute.assert_not_called()
+    assert follower_outcome['result'] == leader_outcome['result']
+
+
+def test_single_flight__other_worker_service_error__raised(flight_store):
+
+    # arrange
+    leader_worker = SingleFlight(name='test_single_flight')
+    follower_worker = SingleFlight(name='test_single_flight')
+
+    def compute():
+        raise UnsupportedQueryException(details='INSERT')
+
+    with pytest.raises(UnsupportedQueryException):
+        leader_worker.do('key', compute)
+
+    # act
+    with pytest.raises(UnsupportedQueryException) as exc_info:
+        follower_worker.do('key', lambda: None)
+
+    # assert
+    assert exc_info.value.details == 'INSERT'
+
+
+def test_single_flight__other_worker_unexpected_error__computed_again(
+    flight_store
+):
+
+    # arrange
+    leader_worker = SingleFlight(name='test_single_flight')
+    follower_worker = SingleFlight(name='test_single_flight')
+    with pytest.raises(ZeroDivisionError):
+        leader_worker.do('key', lambda: 1 / 0)
+
+    # act
+    result = follower_worker.do('key', lambda: 1)
+
+    # assert
+    assert result == 1
+
+
+def test_flight_store__lease_expired__new_leader(tmp_path, mocker):
+
+    # arrange
+    time_mock = mocker.patch('app.services.store.time.time')
+    time_mock.return_value = 1000
+    store = FlightStore(
+        path=str(tmp_path / 'scores.db'),
+        lease=60,
+        result_ttl=5
+    )
+    store.acquire('key')
+    time_mock.return_value = 1030
+    in_progress = store.acquire('key')
+    time_mock.return_value = 1061
+
+    # act
+    result = store.acquire('key')
+
+    # assert
+    assert in_progress == (False, None)
+    assert result == (True, None)
+
+
+def test_flight_store__finished__payload_returned(tmp_path):
+
+    # arrange
+    store = FlightStore(
+        path=str(tmp_path / 'scores.db'),
+        lease=60,
+        result_ttl=5
+    )
+    store.acquire('key')
+    store.finish('key', {'result': {'uuid': None, 'percent': 0}})
+
+    # act
+    result = store.acquire('key')
+
+    # assert
+    assert result == (False, {'result': {'uuid': None, 'percent': 0}})
+
+
+def test_single_flight__disabled__not_coalesced(mocker):
+
+    # arrange
+    mocker.patch('app.services.singleflight.SINGLE_FLIGHT_ENABLED', False)
+    single_flight = SingleFlight(name='test_single_flight')
+    func = mocker.Mock(return_value=1)
+
+    # act
+    single_flight.do('key', func)
+
+    # assert
+    assert single_flight.leaders == 0
+    func.assert_called_once()
+
+
+def test_service_exception__not_exception_name__base_exception():
+
+    # arrange
+    single_flight = SingleFlight(name='test_single_flight')
+
+    # act
+    with pytest.raises(ServiceException) as exc_info:
+        single_flight._get_result({
+            'error': 'messages',
+            'message': 'error',
+            'details': None,
+        })
+
+    # assert
+    assert type(exc_info.value) is ServiceException
@@ -0,0 +1,217 @@
+import sqlite3
+
+import pytest
+from app.services import messages
+from app.services.enums import JobStatus
+from app.services.store import JobStore, ScoreStore, SqliteStore
+
+
+def test_score_store__set_many__get_many(tmp_path):
+
+    # arrange
+    store = ScoreStore(
+        path=str(tmp_path / 'scores.db'),
+        max_entries=100,
+        ttl=60
+    )
+
+    # act
+    store.set_many({'a': 0.5, 'b': -1})
+    result = store.get_many(['a', 'b', 'c'])
+
+    # assert
+    assert result == {'a': 0.5, 'b': -1}
+
+
+def test_score_store__shared_between_instances__wal_mode(tmp_path):
+
+    # arrange
+    path = str(tmp_path / 'scores.db')
+    ScoreStore(path=path, max_entries=100, ttl=60).set_many({'a': 0.5})
+
+    # act
+    result = ScoreStore(path=path, max_entries=100, ttl=60).get_many(['a'])
+
+    # assert
+    assert result == {'a': 0.5}
+    connection = sqlite3.connect(path)
+    assert connection.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+
+
+def test_score_store__expired__not_returned(tmp_path, mocker):
+
+    # arrange
+    time_mock = mocker.patch('app.services.store.time.time')
+    time_mock.return_value = 1000
+    store = ScoreStore(
+        path=str(tmp_path / 'scores.db'),
+        max_entries=100,
+        ttl=60
+    )
+    store.set_many({'a': 0.5})
+    time_mock.return_value = 1061
+
+    # act
+    result = store.get_many(['a'])
+
+    # assert
+    assert result == {}
+
+
+def test_score_store__max_entries_exceeded__oldest_removed(
+    tmp_path,
+    mocker
+):
+
+    # arrange
+    time_mock = mocker.patch('app.services.store.time.time')
+    store = ScoreStore(
+        path=str(tmp_path / 'scores.db'),
+        max_entries=10,
+        ttl=60
+    )
+
+    for index in range(11):
+        time_mock.return_value = 1000 + index
+        store.set_many({str(index): index / 10})
+
+    # act
+    store.compact()
+
+    # assert
+    result = store.get_many([str(index) for index in range(11)])
+    assert sorted(result, key=int) == ['3', '4', '5', '6', '7', '8', '9', '10']
+
+
+def test_score_store__database_error__empty_result(tmp_path, mocker):
+
+    # arrange
+    store = ScoreStore(
+        path=str(tmp_path / 'scores.db'),
+        max_entries=100,
+        ttl=60
+    )
+    store._get_connection().execute('DROP TABLE scores')
+    increment_mock = mocker.patch('app.services.store.metrics.increment')
+
+    # act
+    store.set_many({'a': 0.5})
+    result = store.get_many(['a'])
+
+    # assert
+    assert result == {}
+    increment_mock.assert_called_with('score_store.errors')
+
+
+def test_job_store__create__finish(tmp_path):
+
+    # arrange
+    store = JobStore(path=str(tmp_path / 'jobs.db'), ttl=60, job_timeout=30)
+    store.create('job')
+
+    # act
+    queued = store.get('job')
+    store.start('job')
+    store.set_progress('job', 0.5)
+    store.set_progress('job', 0.25)
+    running = store.get('job')
+    store.finish('job', {'uuid': 'a', 'percent': 0.9})
+    done = store.get('job')
+
+    # assert
+    assert queued['status'] == JobStatus.QUEUED
+    assert queued['progress'] == 0
+    assert running['status'] == JobStatus.RUNNING
+    assert running['progress'] == 0.5
+    assert done['status'] == JobStatus.DONE
+    assert done['progress'] == 1
+    assert done['result'] == {'uuid': 'a', 'percent': 0.9}
+    assert done['error'] is None
+
+
+def test_job_store__fail__error_saved(tmp_path):
+
+    # arrange
+    store = JobStore(path=str(tmp_path / 'jobs.db'), ttl=60, job_timeout=30)
+    store.create('job')
+
+    # act
+    store.fail('job', {'error': 'error', 'details': 'details'})
+    store.set_progress('job', 0.5)
+    result = store.get('job')
+
+    # assert
+    assert result['status'] == JobStatus.FAILED
+    assert result['progress'] == 0
+    assert result['error'] == {'error': 'error', 'details': 'details'}
+
+
+def test_job_store__not_updated__interrupted(tmp_path, mocker):
+
+    # arrange
+    time_mock = mocker.patch('app.services.store.time.time')
+    time_mock.return_value = 1000
+    store = JobStore(path=str(tmp_path / 'jobs.db'), ttl=60, job_timeout=30)
+    store.create('job')
+    store.start('job')
+    time_mock.return_value = 1031
+
+    # act
+    result = store.get('job')
+
+    # assert
+    assert result['status'] == JobStatus.FAILED
+    assert result['error'] == {'error': messages.MSG_8, 'details': None}
+
+
+def test_job_store__expired__removed(tmp_path, mocker):
+
+    # arrange
+    time_mock = mocker.patch('app.services.store.time.time')
+    time_mock.return_value = 1000
+    store = JobStore(path=str(tmp_path / 'jobs.db'), ttl=60, job_timeout=30)
+    store.create('old')
+    store.finish('old', {'uuid': 'a', 'percent': 0.9})
+    time_mock.return_value = 1061
+
+    # act
+    store.create('new')
+    expired = store.get('old')
+
+    # assert
+    assert expired is None
+    count, = store._get_connection().execute(
+        'SELECT COUNT(*) FROM jobs'
+    ).fetchone()
+    assert count == 1
+
+
+def test_job_store__connection__lock_timeout_not_job_timeout(tmp_path, mocker):
+
+    # arrange
+    connect_mock = mocker.patch(
+        'app.services.store.sqlite3.connect',
+        wraps=sqlite3.connect
+    )
+    store = JobStore(path=str(tmp_path / 'jobs.db'), ttl=60, job_timeout=30)
+
+    # act
+    store.create('job')
+
+    # assert
+    assert connect_mock.call_args.kwargs['timeout'] == JobStore.timeout
+    assert JobStore.timeout < 30
+
+
+def test_sqlite_store__create_tables_not_implemented__abstract(tmp_path):
+
+    # arrange
+    class IncompleteStore(SqliteStore):
+        pass
+
+    # act
+    with pytest.raises(TypeError) as ex:
+        IncompleteStore(path=str(tmp_path / 'store.db'))
+
+    # assert
+    assert '_create_tables' in str(ex.value)
@@ -0,0 +1,115 @@
+import os
+
+from app.services.enums import Lang
+from app.services.utils import InputStore
+
+
+def test_input_store__get_path__same_code__same_path(tmp_path):
+
+    # arrange
+    store = InputStore(directory=str(tmp_path), max_size=1024)
+
+    # act
+    first_path = store.get_path(code='int main() {}', lang=Lang.CPP)
+    second_path = store.get_path(code='int main() {}', lang=Lang.CPP)
+
+    # assert
+    assert first_path == second_path
+    assert first_path.endswith('.cpp')
+    with open(first_path) as file:
+        assert file.read() == 'int main() {}'
+
+
+def test_input_store__get_path__other_lang__other_path(tmp_path):
+
+    # arrange
+    store = InputStore(directory=str(tmp_path), max_size=1024)
+
+    # act
+    cpp_path = store.get_path(code='class A {}', lang=Lang.CPP)
+    java_path = store.get_path(code='class A {}', lang=Lang.JAVA)
+
+    # assert
+    assert cpp_path != java_path
+    assert java_path.endswith('.java')
+
+
+def test_input_store__get_path__hit__file_not_rewritten(mocker, tmp_path):
+
+    # arrange
+    store = InputStore(directory=str(tmp_path), max_size=1024)
+    store.get_path(code='int main() {}', lang=Lang.CPP)
+    write_mock = mocker.patch.object(store, '_write')
+
+    # act
+    store.get_path(code='int main() {}', lang=Lang.CPP)
+
+    # assert
+    write_mock.assert_not_called()
+
+
+def test_input_store__evict__least_recently_used_removed(tmp_path):
+
+    # arrange
+    store = InputStore(directory=str(tmp_path), max_size=25)
+    store.min_age = 0
+    old_path = store.get_path(code='a' * 10, lang=Lang.CPP)
+    new_path = store.get_path(code='b' * 10, lang=Lang.CPP)
+    os.utime(old_path, (1, 1))
+    os.utime(new_path, (2, 2))
+    store.get_path(code='c' * 10, lang=Lang.CPP)
+
+    # act
+    store.evict()
+
+    # assert
+    assert not os.path.exists(old_path)
+    assert os.path.exists(new_path)
+
+
+def test_input_store__evict__recently_used_kept(tmp_path):
+
+    # arrange
+    store = InputStore(directory=str(tmp_path), max_size=15)
+    first_path = store.get_path(code='a' * 10, lang=Lang.CPP)
+    second_path = store.get_path(code='b' * 10, lang=Lang.CPP)
+
+    # act
+    store.evict()
+
+    # assert
+    assert os.path.exists(first_path)
+    assert os.path.exists(second_path)
+
+
+def test_input_store__refresh__used_file_kept(tmp_path):
+
+    # arrange
+    store = InputStore(directory=str(tmp_path), max_size=15)
+    used_path = store.get_path(code='a' * 10, lang=Lang.CPP)
+    unused_path = store.get_path(code='b' * 10, lang=Lang.CPP)
+    os.utime(used_path, (1, 1))
+    os.utime(unused_path, (1, 1))
+
+    # act
+    store.refresh([('a' * 10, Lang.CPP)])
+    store.evict()
+
+    # assert
+    assert os.path.exists(used_path)
+    assert not os.path.exists(unused_path)
+
+
+def test_input_store__refresh__evicted_file_written(tmp_path):
+
+    # arrange
+    store = InputStore(directory=str(tmp_path), max_size=1024)
+    path = store.get_path(code='int main() {}', lang=Lang.CPP)
+    os.unlink(path)
+
+    # act
+    store.refresh([('int main() {}', Lang.CPP)])
+
+    # assert
+    with open(path) as file:
+        assert file.read() == 'int main() {}'
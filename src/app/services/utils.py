@@ -1,24 +1,210 @@
+import fcntl
 import os
-import uuid
+import shutil
+import tempfile
+import time
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
+from app.services.cache import get_hash
 from app.services.enums import Lang
-from app.config import TEMP_DIR
+from app.config import (
+    SIM_STORE_DIR,
+    SIM_STORE_MAX_SIZE,
+    SIM_TIMEOUT,
+    WORKSPACE_DIR,
+)
 
+SOURCE_EXTENSIONS = {
+    Lang.CPP: '.cpp',
+    Lang.JAVA: '.java',
+}
 
-class PlagFile:
 
-    """ Описывает файлы, используемые детектором плагиата SIM для
-    проверки исходного кода задач на наличие в нем плагиата. """
+class InputWorkspace:
 
-    def __init__(self, code: str, lang: str):
-        if lang == Lang.CPP:
-            self.filename = f'{uuid.uuid4()}.cpp'
-        elif lang == Lang.JAVA:
-            self.filename = f'{uuid.uuid4()}.java'
-        self.filepath = os.path.join(TEMP_DIR, self.filename)
-        with open(self.filepath, 'w') as file:
-            file.write(code)
-            file.close()
+    """ Описывает рабочий каталог запроса, в котором размещаются файлы,
+    используемые детектором плагиата SIM для проверки исходного кода
+    задач на наличие в нем плагиата.
+
+    Каталог создается в хранилище в оперативной памяти (по умолчанию
+    /dev/shm), файлы записываются одним пакетом методом flush(), а при
+    выходе из контекста каталог удаляется целиком, в том числе если
+    при проверке возникло исключение. """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or WORKSPACE_DIR
+        self.path: Optional[str] = None
+        self._pending: List[Tuple[str, str]] = []
+        self._files_count = 0
+
+    def __enter__(self) -> 'InputWorkspace':
+        self.path = tempfile.mkdtemp(prefix='antiplag-', dir=self.directory)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.remove()
+
+    def add(self, code: str, lang: str) -> str:
+
+        """ Регистрирует файл с исходным кодом и возвращает путь к нему.
+        Сам файл будет записан при вызове flush(). """
+
+        filename = f'{self._files_count}{SOURCE_EXTENSIONS[lang]}'
+        self._files_count += 1
+        filepath = os.path.join(self.path, filename)
+        self._pending.append((filepath, code))
+        return filepath
+
+    def flush(self):
+
+        """ Записывает на диск все зарегистрированные файлы. """
+
+        for filepath, code in self._pending:
+            with open(filepath, 'w') as file:
+                file.write(code)
+        self._pending.clear()
 
     def remove(self):
-        os.remove(self.filepath)
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
+
+
+class InputStore:
+
+    """ Описывает хранилище входных файлов SIM, адресуемых по содержимому
+    и общих для всех запросов и воркеров.
+
+    Имя файла - sha256 от языка и исходного кода, поэтому повторно
+    встречающийся код не записывается заново, а находится по имени.
+    Файл записывается во временный файл и атомарно переименовывается,
+    так что параллельные воркеры никогда не видят его частично
+    записанным. При превышении max_size удаляются файлы, к которым
+    дольше всего не обращались (время обращения хранится в mtime).
+
+    Перед каждым запуском SIM время обращения к его файлам обновляется
+    (refresh), поэтому файлы длительной проверки из многих запусков
+    не удаляются, пока выполняется любой из них. """
+
+    # Файлы, к которым обращались за последние min_age секунд, не удаляются:
+    # они могут читаться SIM в текущих запросах. Значение должно быть больше
+    # времени одного запуска SIM (SIM_TIMEOUT)
+    min_age = 120
+    # Доля max_size, до которой сокращается хранилище при очистке
+    shrink_ratio = 0.8
+
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.max_size = max_size
+        self._written_size = 0
+        self._lock_path = os.path.join(directory, '.lock')
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def get_key(code: str, lang: str) -> str:
+        return get_hash(lang, code)
+
+    def get_path(self, code: str, lang: str) -> str:
+
+        """ Возвращает путь к файлу с исходным кодом,
+        записывая его только при отсутствии в хранилище. """
+
+        key = self.get_key(code=code, lang=lang)
+        filepath = os.path.join(
+            self.directory,
+            key[:2],
+            f'{key}{SOURCE_EXTENSIONS[lang]}'
+        )
+        try:
+            os.utime(filepath)
+        except FileNotFoundError:
+            self._write(filepath=filepath, code=code)
+        return filepath
+
+    def refresh(self, sources: List[Tuple[str, str]]):
+
+        """ Обновляет время обращения к файлам с исходным кодом
+        (code, lang) из sources и заново записывает файлы, удаленные
+        очисткой. Выполняется под разделяемой блокировкой, поэтому
+        не пересекается с очисткой (evict): либо очистка увидит новое
+        время обращения, либо файл будет записан после нее. """
+
+        with open(self._lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            for code, lang in sources:
+                self.get_path(code=code, lang=lang)
+
+    def _write(self, filepath: str, code: str):
+        directory = os.path.dirname(filepath)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                file.write(code)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._written_size += os.path.getsize(filepath)
+        # Размер хранилища проверяется не после каждой записи,
+        # а после записи заметной его доли
+        if self._written_size > self.max_size * (1 - self.shrink_ratio):
+            self._written_size = 0
+            self.evict()
+
+    def evict(self):
+
+        """ Сокращает хранилище до shrink_ratio от max_size, удаляя
+        файлы в порядке давности последнего обращения. Одновременно
+        очистку выполняет только один воркер. Пока файлы обновляются
+        (refresh), очистка не выполняется. """
+
+        with open(self._lock_path, 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            files = []
+            total_size = 0
+            for entry in os.scandir(self.directory):
+                if not entry.is_dir():
+                    continue
+                for file_entry in os.scandir(entry.path):
+                    try:
+                        stat = file_entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    total_size += stat.st_size
+                    files.append(
+                        (stat.st_mtime, stat.st_size, file_entry.path)
+                    )
+            if total_size <= self.max_size:
+                return
+            target_size = self.max_size * self.shrink_ratio
+            deadline = time.time() - self.min_age
+            for _, size, filepath in sorted(files):
+                if total_size <= target_size:
+                    break
+                try:
+                    # mtime перечитывается: файл мог быть использован
+                    # другим воркером во время обхода хранилища
+                    if os.stat(filepath).st_mtime > deadline:
+                        continue
+                    os.unlink(filepath)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+
+
+@lru_cache(maxsize=None)
+def get_input_store() -> Optional[InputStore]:
+
+    """ Возвращает хранилище входных файлов SIM
+    или None, если оно отключено. """
+
+    if not SIM_STORE_DIR:
+        return None
+    store = InputStore(directory=SIM_STORE_DIR, max_size=SIM_STORE_MAX_SIZE)
+    store.min_age = max(store.min_age, 2 * SIM_TIMEOUT)
+    return store
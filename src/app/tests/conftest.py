@@ -2,9 +2,21 @@ import pytest
 from fastapi.testclient import TestClient
 
 from app.main import create_app
+from app.services.store import JobStore
 
 
 @pytest.fixture()
-def client():
+def client(mocker, tmp_path):
+    # Процессы пула не запускаются для каждого тестового приложения
+    mocker.patch('app.services.base.POOL_WARM_UP', False)
+    # Асинхронные проверки хранятся во временном каталоге теста
+    mocker.patch(
+        'app.services.jobs.get_job_store',
+        return_value=JobStore(
+            path=str(tmp_path / 'jobs.db'),
+            ttl=60,
+            job_timeout=30
+        )
+    )
     with TestClient(create_app()) as test_client:
         yield test_client
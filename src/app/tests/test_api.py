@@ -1,11 +1,16 @@
+import json
+import time
+
+from app.main import create_app, preload
 from app.services.entities import (
     Candidate,
+    CheckEvent,
     CheckInput,
     CheckResult
 )
 from app.services.exceptions import ServiceException, UnsupportedQueryException
 from app.services import messages
-from app.services.enums import Lang
+from app.services.enums import CheckEventType, Engine, JobStatus, Lang
 
 
 def test_check__ok(client, mocker):
@@ -227,3 +232,531 @@ def test_check__unsupported_sql_query__internal_error(client, mocker):
     assert 'application/json' in response.headers['content-type']
     assert response.json()['error'] == messages.MSG_5
     assert response.json()['details'] is None
+
+
+def test_check__engine__passed_to_service(client, mocker):
+
+    # arrange
+    check_result = CheckResult(
+        uuid='abc987',
+        percent=0.75
+    )
+    check_mock = mocker.patch(
+        'app.services.main.AntiplagService.check',
+        return_value=check_result
+    )
+
+    # act
+    response = client.post(
+        '/check/',
+        json={
+            "lang": Lang.CPP,
+            "engine": Engine.GST,
+            "ref_code": "some code",
+            "candidates": [
+                {
+                    "uuid": 'abc987',
+                    "code": "some code"
+                }
+            ]
+        }
+    )
+
+    # assert
+    assert response.status_code == 200
+    check_mock.assert_called_once_with(
+        data=CheckInput(
+            lang=Lang.CPP,
+            engine=Engine.GST,
+            ref_code="some code",
+            candidates=[
+                Candidate(
+                    uuid='abc987',
+                    code="some code"
+                )
+            ]
+        )
+    )
+
+
+def test_check__not_allowed_engine__bad_request(client, mocker):
+
+    # arrange
+    service_mock = mocker.patch('app.services.main.AntiplagService.check')
+
+    # act
+    response = client.post(
+        '/check/',
+        json={
+            "lang": Lang.CPP,
+            "engine": "some engine",
+            "ref_code": "some code",
+            "candidates": [
+                {
+                    "uuid": 'abc987',
+                    "code": "some code"
+                }
+            ]
+        }
+    )
+
+    # assert
+    assert response.status_code == 400
+    assert list(response.json()['details']) == ['engine']
+    service_mock.assert_not_called()
+
+
+def test_check__engine_not_for_lang__bad_request(client, mocker):
+
+    # arrange
+    service_mock = mocker.patch('app.services.main.AntiplagService.check')
+
+    # act
+    response = client.post(
+        '/check/',
+        json={
+            "lang": Lang.PYTHON,
+            "engine": Engine.SIM,
+            "ref_code": "some code",
+            "candidates": [
+                {
+                    "uuid": 'abc987',
+                    "code": "some code"
+                }
+            ]
+        }
+    )
+
+    # assert
+    assert response.status_code == 400
+    assert response.json()['details'] == {
+        'engine': ['Not allowed for python, must be one of: pycode, winnow.']
+    }
+    service_mock.assert_not_called()
+
+
+def test_check__prefilter__passed_to_service(client, mocker):
+
+    # arrange
+    check_mock = mocker.patch(
+        'app.services.main.AntiplagService.check',
+        return_value=CheckResult(uuid=None, percent=0)
+    )
+
+    # act
+    response = client.post(
+        '/check/',
+        json={
+            "lang": Lang.PYTHON,
+            "ref_code": "some code",
+            "candidates": [],
+            "prefilter": {"top_k": 10}
+        }
+    )
+
+    # assert
+    assert response.status_code == 200
+    check_mock.assert_called_once_with(
+        data=CheckInput(
+            lang=Lang.PYTHON,
+            ref_code="some code",
+            candidates=[],
+            prefilter={'top_k': 10}
+        )
+    )
+
+
+def test_check__invalid_prefilter__bad_request(client, mocker):
+
+    # arrange
+    service_mock = mocker.patch('app.services.main.AntiplagService.check')
+
+    # act
+    response = client.post(
+        '/check/',
+        json={
+            "lang": Lang.PYTHON,
+            "ref_code": "some code",
+            "candidates": [],
+            "prefilter": {"top_k": 0, "floor": 2}
+        }
+    )
+
+    # assert
+    assert response.status_code == 400
+    assert sorted(response.json()['details']) == [
+        'prefilter.floor',
+        'prefilter.top_k',
+    ]
+    service_mock.assert_not_called()
+
+
+def test_check__threshold__passed_to_service(client, mocker):
+
+    # arrange
+    check_mock = mocker.patch(
+        'app.services.main.AntiplagService.check',
+        return_value=CheckResult(uuid=None, percent=0)
+    )
+
+    # act
+    response = client.post(
+        '/check/',
+        json={
+            "lang": Lang.PYTHON,
+            "ref_code": "some code",
+            "candidates": [],
+            "threshold": 0.8
+        }
+    )
+
+    # assert
+    assert response.status_code == 200
+    check_mock.assert_called_once_with(
+        data=CheckInput(
+            lang=Lang.PYTHON,
+            ref_code="some code",
+            candidates=[],
+            threshold=0.8
+        )
+    )
+
+
+def test_check__invalid_threshold__bad_request(client, mocker):
+
+    # arrange
+    service_mock = mocker.patch('app.services.main.AntiplagService.check')
+
+    # act
+    response = client.post(
+        '/check/',
+        json={
+            "lang": Lang.PYTHON,
+            "ref_code": "some code",
+            "candidates": [],
+            "threshold": 1.5
+        }
+    )
+
+    # assert
+    assert response.status_code == 400
+    assert list(response.json()['details']) == ['threshold']
+    service_mock.assert_not_called()
+
+
+def test_check_batch__ok(client, mocker):
+
+    # arrange
+    check_batch_mock = mocker.patch(
+        'app.services.main.AntiplagService.check_batch',
+        return_value=[
+            CheckResult(uuid='dfgh432', percent=0.5),
+            CheckResult(uuid=None, percent=0),
+        ]
+    )
+
+    # act
+    response = client.post(
+        '/check/batch/',
+        json={
+            'lang': Lang.PYTHON,
+            'ref_codes': ['a = 1', 'b = 2'],
+            'candidates': [{'uuid': 'dfgh432', 'code': 'c = 3'}],
+            'threshold': 0.9,
+        }
+    )
+
+    # assert
+    assert response.status_code == 200
+    assert response.json() == [
+        {'uuid': 'dfgh432', 'percent': 0.5},
+        {'uuid': None, 'percent': 0},
+    ]
+    check_batch_mock.assert_called_once_with(
+        data={
+            'lang': Lang.PYTHON,
+            'ref_codes': ['a = 1', 'b = 2'],
+            'candidates': [{'uuid': 'dfgh432', 'code': 'c = 3'}],
+            'threshold': 0.9,
+        }
+    )
+
+
+def test_check_batch__no_references__bad_request(client):
+
+    # act
+    response = client.post(
+        '/check/batch/',
+        json={
+            'lang': Lang.PYTHON,
+            'ref_codes': [],
+            'candidates': [{'uuid': 'dfgh432', 'code': 'c = 3'}],
+        }
+    )
+
+    # assert
+    assert response.status_code == 400
+    assert 'ref_codes' in response.json()['details']
+
+
+def test_check_pairs__ok(client, mocker):
+
+    # arrange
+    check_pairs_mock = mocker.patch(
+        'app.services.main.AntiplagService.check_pairs',
+        return_value={
+            'edges': [{'first': 'a', 'second': 'b', 'percent': 0.9}],
+            'clusters': [['a', 'b']],
+        }
+    )
+    submissions = [
+        {'uuid': 'a', 'code': 'x = 1'},
+        {'uuid': 'b', 'code': 'y = 1'},
+    ]
+
+    # act
+    response = client.post(
+        '/pairs/',
+        json={'lang': Lang.PYTHON, 'submissions': submissions}
+    )
+
+    # assert
+    assert response.status_code == 200
+    assert response.json() == check_pairs_mock.return_value
+    check_pairs_mock.assert_called_once_with(
+        data={'lang': Lang.PYTHON, 'submissions': submissions}
+    )
+
+
+def test_check_pairs__duplicate_uuids__bad_request(client):
+
+    # act
+    response = client.post(
+        '/pairs/',
+        json={
+            'lang': Lang.PYTHON,
+            'submissions': [
+                {'uuid': 'a', 'code': 'x = 1'},
+                {'uuid': 'a', 'code': 'y = 1'},
+            ],
+        }
+    )
+
+    # assert
+    assert response.status_code == 400
+    assert response.json()['details'] == {
+        'submissions': ['Uuids must be unique.']
+    }
+
+
+def test_check_stream__ndjson(client, mocker):
+
+    # arrange
+    events = [
+        CheckEvent(type=CheckEventType.SCORE, uuid='abc987', percent=0.3),
+        CheckEvent(type=CheckEventType.RESULT, uuid='abc987', percent=0.3),
+    ]
+    check_stream_mock = mocker.patch(
+        'app.services.main.AntiplagService.check_stream',
+        return_value=iter(events)
+    )
+
+    # act
+    response = client.post(
+        '/check/stream/',
+        json={
+            'lang': Lang.PYTHON,
+            'ref_code': 'a = 1',
+            'candidates': [{'uuid': 'abc987', 'code': 'b = 2'}],
+        }
+    )
+
+    # assert
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert [
+        json.loads(line) for line in response.text.splitlines()
+    ] == events
+    check_stream_mock.assert_called_once_with(
+        data=CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='a = 1',
+            candidates=[Candidate(uuid='abc987', code='b = 2')]
+        )
+    )
+
+
+def wait_for_job(client, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while True:
+        response = client.get(f'/jobs/{job_id}')
+        if response.json()['status'] in (JobStatus.DONE, JobStatus.FAILED):
+            return response
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_check_job__ok(client, mocker):
+
+    # arrange
+    check_mock = mocker.patch(
+        'app.services.main.AntiplagService.check',
+        return_value=CheckResult(uuid='abc987', percent=0.5)
+    )
+
+    # act
+    response = client.post(
+        '/jobs/check/',
+        json={
+            'lang': Lang.PYTHON,
+            'ref_code': 'a = 1',
+            'candidates': [{'uuid': 'abc987', 'code': 'b = 2'}],
+        }
+    )
+    job_id = response.json()['id']
+    job_response = wait_for_job(client, job_id)
+
+    # assert
+    assert response.status_code == 202
+    assert response.json()['status'] == JobStatus.QUEUED
+    assert job_response.status_code == 200
+    job = job_response.json()
+    assert job['id'] == job_id
+    assert job['status'] == JobStatus.DONE
+    assert job['progress'] == 1
+    assert job['result'] == {'uuid': 'abc987', 'percent': 0.5}
+    assert job['error'] is None
+    check_mock.assert_called_once_with(
+        data=CheckInput(
+            lang=Lang.PYTHON,
+            ref_code='a = 1',
+            candidates=[Candidate(uuid='abc987', code='b = 2')]
+        )
+    )
+
+
+def test_check_job__service_exception__failed(client, mocker):
+
+    # arrange
+    mocker.patch(
+        'app.services.main.AntiplagService.check',
+        side_effect=UnsupportedQueryException(details='query')
+    )
+
+    # act
+    response = client.post(
+        '/jobs/check/',
+        json={
+            'lang': Lang.SQL,
+            'ref_code': 'DROP TABLE a',
+            'candidates': [{'uuid': 'abc987', 'code': 'DROP TABLE b'}],
+        }
+    )
+    job = wait_for_job(client, response.json()['id']).json()
+
+    # assert
+    assert job['status'] == JobStatus.FAILED
+    assert job['result'] is None
+    assert job['error'] == {'error': messages.MSG_5, 'details': 'query'}
+
+
+def test_check_job__invalid_callback_url__bad_request(client):
+
+    # act
+    response = client.post(
+        '/jobs/check/',
+        json={
+            'lang': Lang.PYTHON,
+            'ref_code': 'a = 1',
+            'candidates': [],
+            'callback_url': 'file:///etc/passwd',
+        }
+    )
+
+    # assert
+    assert response.status_code == 400
+    assert response.json()['details'] == {
+        'callback_url': ['Must be an http or https URL.']
+    }
+
+
+def test_get_job__not_found(client):
+
+    # act
+    response = client.get('/jobs/unknown')
+
+    # assert
+    assert response.status_code == 404
+    assert response.json() == {'error': messages.MSG_7, 'details': 'unknown'}
+
+
+def test_metrics__ok(client):
+
+    # act
+    response = client.get('/metrics/')
+
+    # assert
+    assert response.status_code == 200
+    assert 'cache.pycode_ast' in response.json()
+    assert 'prefilter' in response.json()
+    assert 'cache.scores' in response.json()
+    assert 'single_flight' in response.json()
+
+
+def test_metrics__engine_loaded__boot_time_reported(client):
+
+    # arrange
+    client.app.state.registry.get_service(Lang.SQL)
+
+    # act
+    response = client.get('/metrics/')
+
+    # assert
+    assert response.status_code == 200
+    assert set(response.json()['engines'][Engine.SQLPLAG]) == {
+        'import_time',
+        'boot_time',
+    }
+
+
+def test_preload__engines_loaded_and_frozen(mocker):
+
+    # arrange
+    app = create_app()
+    freeze_mock = mocker.patch('app.main.gc.freeze')
+
+    # act
+    preload(app)
+
+    # assert
+    freeze_mock.assert_called_once_with()
+    assert set(app.state.registry.get_stats()) == set(Engine.VALUES)
+
+
+def test_check__engine_registered_on_app__used(client, mocker):
+
+    # arrange
+    service_mock = mocker.Mock(engine=Engine.WINNOW)
+    service_mock.check_plagiarism_many.return_value = [
+        CheckResult(uuid='abc987', percent=0.3)
+    ]
+    registry = client.app.state.registry
+    mocker.patch.dict(
+        registry._services[Lang.PYTHON],
+        {Engine.WINNOW: service_mock}
+    )
+
+    # act
+    response = client.post(
+        '/check/',
+        json={
+            'lang': Lang.PYTHON,
+            'engine': Engine.WINNOW,
+            'ref_code': 'a = 1',
+            'candidates': [{'uuid': 'abc987', 'code': 'b = 2'}],
+        }
+    )
+
+    # assert
+    assert response.status_code == 200
+    assert response.json() == {'uuid': 'abc987', 'percent': 0.3}
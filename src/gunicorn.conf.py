@@ -0,0 +1,14 @@
+from app.config import PRELOAD_ENGINES
+
+# Приложение и детекторы загружаются в главном процессе один раз,
+# воркеры получают их при fork
+preload_app = PRELOAD_ENGINES
+
+
+def when_ready(server):
+
+    """ Вызывается в главном процессе до запуска воркеров. """
+
+    if PRELOAD_ENGINES:
+        from app.main import app, preload
+        preload(app)
@@ -1,2 +1,8 @@
 #!/bin/bash
-gunicorn app.main:app --bind 0.0.0.0:9020 --workers ${UVICORN_WORKERS:=1} --worker-class uvicorn.workers.UvicornWorker --log-level debug --timeout 60 --reload
\ No newline at end of file
+# START_MODE=production: без --reload, детекторы загружаются в главном
+# процессе gunicorn до запуска воркеров (PRELOAD_ENGINES, gunicorn.conf.py)
+if [ "${START_MODE:=development}" = "production" ]; then
+    export PRELOAD_ENGINES=${PRELOAD_ENGINES:=1}
+    exec gunicorn app.main:app --bind 0.0.0.0:9020 --workers ${UVICORN_WORKERS:=1} --worker-class uvicorn.workers.UvicornWorker --log-level info --timeout 60
+fi
+gunicorn app.main:app --bind 0.0.0.0:9020 --workers ${UVICORN_WORKERS:=1} --worker-class uvicorn.workers.UvicornWorker --log-level debug --timeout 60 --reload